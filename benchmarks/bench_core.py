@@ -0,0 +1,291 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""Benchmarks for ingest, query parsing and payload encoding."""
+import json
+from unittest import mock
+
+import cbor
+import requests
+
+from oisp import Client, DataQuery, Device, WindowAggregator
+from oisp import utils
+from oisp.binary import CborBody
+from oisp.data_query import QueryResponse
+from benchmarks import fixtures
+from benchmarks.fixtures import PASSWORD, USERNAME
+from benchmarks.harness import benchmark
+
+
+# Ingest
+
+@benchmark("ingest.add_sample", items=lambda ctx: ctx.size(10000))
+def add_sample(ctx):
+    """Add samples to the buffer of a device, without submitting."""
+    count = ctx.size(10000)
+    device = fixtures.offline_device()
+
+    def run():
+        device.unsent_data = []
+        for i in range(count):
+            device.add_sample("c0", i, on=fixtures.START + i)
+    return run
+
+
+@benchmark("ingest.add_sample_aggregated", items=lambda ctx: ctx.size(10000))
+def add_sample_aggregated(ctx):
+    """Add samples to one-second windows of a device."""
+    count = ctx.size(10000)
+    device = fixtures.offline_device()
+    device.aggregators["c0"] = WindowAggregator(1000)
+
+    def run():
+        device.unsent_data = []
+        for i in range(count):
+            device.add_sample("c0", i, on=fixtures.START + i)
+    return run
+
+
+@benchmark("ingest.submit_data", items=lambda ctx: ctx.size(2000),
+           needs_server=True)
+def submit_data(ctx):
+    """Add and submit samples to the mock server."""
+    count = ctx.size(2000)
+    _, device, cid = fixtures.server_device(ctx)
+    offset = [0]
+
+    def run():
+        for i in range(count):
+            device.add_sample(cid, i, on=fixtures.START + offset[0] + i)
+        offset[0] += count
+        device.submit_data()
+    return run
+
+
+@benchmark("ingest.submit_arrays", items=lambda ctx: ctx.size(20000),
+           needs_server=True)
+def submit_arrays(ctx):
+    """Submit column oriented data to the mock server."""
+    count = ctx.size(20000)
+    _, device, cid = fixtures.server_device(ctx)
+    offset = [0]
+
+    def run():
+        timestamps = range(offset[0], offset[0] + count)
+        offset[0] += count
+        device.submit_arrays(timestamps, {cid: [float(i) for i in
+                                                range(count)]})
+    return run
+
+
+# Query
+
+@benchmark("query.parse_samples", items=lambda ctx: ctx.size(50000))
+def parse_samples(ctx):
+    """Create Sample objects from a search response."""
+    response = fixtures.search_response(samples=ctx.size(50000) // 50)
+    account = fixtures.account()
+
+    def run():
+        return QueryResponse(account, response).samples
+    return run
+
+
+@benchmark("query.to_pandas", items=lambda ctx: ctx.size(50000))
+def to_pandas(ctx):
+    """Convert a search response to a DataFrame."""
+    response = fixtures.search_response(samples=ctx.size(50000) // 50)
+    account = fixtures.account()
+
+    def run():
+        return QueryResponse(account, response).to_pandas()
+    return run
+
+
+@benchmark("query.search_data", items=lambda ctx: ctx.size(20000),
+           needs_server=True)
+def search_data(ctx):
+    """Search synthetic data on the mock server."""
+    ctx.server.populate(USERNAME, PASSWORD, num_devices=4, num_components=5,
+                        samples_per_component=ctx.size(20000) // 20)
+    client = Client(ctx.server.api_url)
+    client.auth(USERNAME, PASSWORD)
+    account = client.get_accounts()[-1]
+
+    def run():
+        return account.search_data(DataQuery()).samples
+    return run
+
+
+@benchmark("query.search_data_stream", items=lambda ctx: ctx.size(20000),
+           needs_server=True)
+def search_data_stream(ctx):
+    """Search synthetic data on the mock server, parsing incrementally."""
+    ctx.server.populate(USERNAME, PASSWORD, num_devices=4, num_components=5,
+                        samples_per_component=ctx.size(20000) // 20)
+    client = Client(ctx.server.api_url)
+    client.auth(USERNAME, PASSWORD)
+    account = client.get_accounts()[-1]
+
+    def run():
+        count = 0
+        for component in account.search_data_stream(DataQuery(),
+                                                    chunk_size=1000):
+            count += len(component.samples)
+        return count
+    return run
+
+
+@benchmark("query.devices_from_json", items=lambda ctx: ctx.size(10000))
+def devices_from_json(ctx):
+    """Create Device objects from a device list response."""
+    devices = [fixtures.device_json(i) for i in range(ctx.size(10000))]
+    account = fixtures.account()
+    account.client = object()
+
+    def run():
+        return [Device.from_json(d, account=account) for d in devices]
+    return run
+
+
+@benchmark("query.get_devices", items=lambda ctx: ctx.size(2000),
+           needs_server=True)
+def get_devices(ctx):
+    """List devices of an account on the mock server."""
+    ctx.server.populate(USERNAME, PASSWORD, num_devices=ctx.size(2000),
+                        num_components=1, samples_per_component=0)
+    client = Client(ctx.server.api_url)
+    client.auth(USERNAME, PASSWORD)
+    account = client.get_accounts()[-1]
+
+    def run():
+        return account.get_devices()
+    return run
+
+
+# Key conversion
+
+def _device_keys(ctx):
+    return [key for i in range(ctx.size(10000))
+            for key in fixtures.device_json(i)]
+
+
+@benchmark("convert.camel_to_underscore",
+           items=lambda ctx: len(_device_keys(ctx)))
+def camel_to_underscore(ctx):
+    """Convert the keys of a device list response."""
+    keys = _device_keys(ctx)
+
+    def run():
+        return [utils.camel_to_underscore(key) for key in keys]
+    return run
+
+
+@benchmark("convert.camel_to_underscore_uncached",
+           items=lambda ctx: len(_device_keys(ctx)))
+def camel_to_underscore_uncached(ctx):
+    """Convert the keys of a device list response, using a regex per key."""
+    keys = _device_keys(ctx)
+
+    def run():
+        # pylint: disable=protected-access
+        # Reference implementation without caching
+        return [utils._camel_to_underscore(key) for key in keys]
+    return run
+
+
+# Encoding
+
+@benchmark("encode.json", items=lambda ctx: ctx.size(10000))
+def encode_json(ctx):
+    """Serialize a data payload as JSON."""
+    payload = fixtures.data_payload(ctx.size(10000))
+
+    def run():
+        return json.dumps(payload)
+    return run
+
+
+@benchmark("encode.cbor", items=lambda ctx: ctx.size(10000))
+def encode_cbor(ctx):
+    """Serialize a data payload as CBOR."""
+    payload = fixtures.data_payload(ctx.size(10000))
+
+    def run():
+        return cbor.dumps(payload)
+    return run
+
+
+def _binary_payload(samples):
+    """Return a data payload with 64 KiB binary values."""
+    frame = bytearray(range(256)) * 256
+    return {"on": fixtures.START, "accountId": fixtures.ACCOUNT_ID,
+            "data": [{"componentId": "img", "value": memoryview(frame),
+                      "on": fixtures.START + i} for i in range(samples)]}
+
+
+@benchmark("encode.cbor_binary", items=lambda ctx: ctx.size(100))
+def encode_cbor_binary(ctx):
+    """Serialize a payload with binary values using cbor.dumps."""
+    payload = _binary_payload(ctx.size(100))
+    for sample in payload["data"]:
+        sample["value"] = bytes(sample["value"])
+
+    def run():
+        return cbor.dumps(payload)
+    return run
+
+
+@benchmark("encode.cbor_body_binary", items=lambda ctx: ctx.size(100))
+def encode_cbor_body_binary(ctx):
+    """Stream a payload with binary values as a request body would."""
+    payload = _binary_payload(ctx.size(100))
+
+    def run():
+        return sum(len(chunk) for chunk in CborBody(payload))
+    return run
+
+
+@benchmark("encode.make_request", items=lambda ctx: ctx.size(10000))
+def make_request(ctx):
+    """Run Client._make_request for a data POST without network."""
+    payload = fixtures.data_payload(ctx.size(10000))
+    # Skip the connection test in the constructor
+    with mock.patch.object(Client, "get_server_info"):
+        client = Client("http://localhost")
+    device = fixtures.offline_device()
+
+    def post(url, **kwargs):
+        # pylint: disable=unused-argument
+        response = requests.models.Response()
+        response.status_code = 201
+        return response
+
+    def run():
+        # pylint: disable=protected-access
+        client._make_request(post, "/data/bench-device", True, device,
+                             expect=201, data=payload)
+    return run
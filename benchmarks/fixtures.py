@@ -0,0 +1,99 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""Synthetic data shared by benchmarks."""
+import math
+
+from oisp import Account, Client, Device
+
+ACCOUNT_ID = "bench-account"
+START = 1577836800000
+# User created on the mock server by online benchmarks
+USERNAME = "bench@example.com"
+PASSWORD = "BenchPassword1"
+
+
+def account():
+    """Return an Account object not connected to any server."""
+    return Account(None, "bench", ACCOUNT_ID, Account.ROLE_ADMIN)
+
+
+def search_response(devices=10, components=5, samples=1000):
+    """Return a search response dictionary as sent by the service."""
+    return {
+        "msgType": "advancedDataInquiryResponse",
+        "accountId": ACCOUNT_ID,
+        "startTimestamp": START,
+        "endTimestamp": START + samples * 1000,
+        "data": [{
+            "deviceId": "device-{}".format(d),
+            "components": [{
+                "componentId": "device-{}-c{}".format(d, c),
+                "dataType": "number",
+                "samplesHeader": ["Timestamp", "Value"],
+                "samples": [[START + i * 1000,
+                             str(round(20 + 10 * math.sin(i / 50), 3))]
+                            for i in range(samples)]
+            } for c in range(components)]
+        } for d in range(devices)]
+    }
+
+
+def data_payload(samples=1000, components=5):
+    """Return a payload for /data/{device_id} with numeric samples."""
+    return {"on": START, "accountId": ACCOUNT_ID,
+            "data": [{"componentId": "c{}".format(i % components),
+                      "value": 20 + i % 10 / 10, "on": START + i}
+                     for i in range(samples)]}
+
+
+def device_json(i):
+    """Return a device dictionary as returned by the device list API."""
+    return {"deviceId": "device-{}".format(i), "gatewayId": "gateway",
+            "name": "Device {}".format(i), "domainId": ACCOUNT_ID,
+            "status": "active", "created": START,
+            "attributes": {"vendor": "bench", "platform": "x86_64"},
+            "tags": ["bench"], "loc": [45.5, 9.2],
+            "components": [{"cid": "c{}".format(c), "name": "c",
+                            "type": "temperature.v1.0"} for c in range(3)],
+            "contact": "bench@example.com", "lastVisit": START}
+
+
+def offline_device():
+    """Return a Device with a token, not connected to any server."""
+    return Device("bench-device", client=object(), device_token="token",
+                  domain_id=ACCOUNT_ID)
+
+
+def server_device(ctx):
+    """Return (account, device, cid) for a device on the mock server."""
+    data = ctx.server.populate(USERNAME, PASSWORD, num_devices=1,
+                               num_components=1, samples_per_component=0)
+    device_id, token, cids = data["devices"][0]
+    client = Client(ctx.server.api_url)
+    client.auth(USERNAME, PASSWORD)
+    device = client.get_device(token, device_id)
+    return client.get_accounts()[-1], device, cids[0]
@@ -0,0 +1,187 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""Registry and measurement of benchmarks.
+
+A benchmark is a function taking a Context and returning a callable,
+which performs one iteration of the measured operation. Setup work done
+before returning the callable is not measured.
+"""
+import gc
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+BENCHMARKS = {}
+
+
+# pylint: disable=too-few-public-methods
+class Benchmark:
+    """A registered benchmark."""
+
+    def __init__(self, name, func, items, needs_server):
+        self.name = name
+        self.func = func
+        self.items = items
+        self.needs_server = needs_server
+
+
+def benchmark(name, items=1, needs_server=False):
+    """Register a benchmark.
+
+    Args:
+    ----------
+    name: Unique name, used in results.
+    items: Number of items (e.g. samples) processed in one iteration,
+    used for throughput. A callable taking the Context is allowed.
+    needs_server: Whether the benchmark uses the mock server.
+    """
+    def decorator(func):
+        BENCHMARKS[name] = Benchmark(name, func, items, needs_server)
+        return func
+    return decorator
+
+
+# pylint: disable=too-few-public-methods
+class Context:
+    """Settings and shared resources passed to benchmarks."""
+
+    def __init__(self, scale=1.0, server=None):
+        self.scale = scale
+        self.server = server
+        self._cleanups = []
+
+    def add_cleanup(self, func):
+        """Call func after the benchmark was measured, e.g. to stop a server.
+
+        Functions are called in reverse order of adding, also if the
+        benchmark failed.
+        """
+        self._cleanups.append(func)
+
+    def cleanup(self):
+        """Call the functions added by add_cleanup."""
+        while self._cleanups:
+            self._cleanups.pop()()
+
+    def size(self, n):
+        """Return n scaled by the scale setting."""
+        return max(1, int(n * self.scale))
+
+
+def percentile(values, pct):
+    """Return nearest-rank percentile of values."""
+    ordered = sorted(values)
+    rank = max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def measure(bench, context, repeat=10, warmup=1):
+    """Run a benchmark and return its result dictionary.
+
+    Timing and peak memory are measured in separate runs, as tracing
+    allocations slows execution down. Cleanup functions added to the
+    context are called afterwards.
+    """
+    try:
+        return _measure(bench, context, repeat, warmup)
+    finally:
+        context.cleanup()
+
+
+def _measure(bench, context, repeat, warmup):
+    run = bench.func(context)
+    items = bench.items(context) if callable(bench.items) else bench.items
+    for _ in range(warmup):
+        run()
+
+    latencies = []
+    gc.collect()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        latencies.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"name": bench.name, "items": items, "repeat": repeat,
+            "mean_ms": statistics.fmean(latencies) * 1e3,
+            "p50_ms": percentile(latencies, 50) * 1e3,
+            "p99_ms": percentile(latencies, 99) * 1e3,
+            "throughput": items * repeat / sum(latencies),
+            "peak_kib": peak / 1024}
+
+
+def metadata():
+    """Return information about the environment of a run."""
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            stderr=subprocess.DEVNULL).decode("utf-8").strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = "unknown"
+    return {"commit": commit, "timestamp": int(time.time()),
+            "python": platform.python_version(),
+            "platform": platform.platform()}
+
+
+def save(path, results):
+    """Save results and metadata as JSON."""
+    with open(path, "w", encoding="utf-8") as result_file:
+        json.dump({"metadata": metadata(), "results": results}, result_file,
+                  indent=2)
+
+
+def load(path):
+    """Load results saved by save, return dict mapping name to result."""
+    with open(path, encoding="utf-8") as result_file:
+        return {r["name"]: r for r in json.load(result_file)["results"]}
+
+
+def format_table(results, baseline=None):
+    """Return results as a text table, compared to baseline if given."""
+    header = "{:<36} {:>14} {:>10} {:>10} {:>11}".format(
+        "benchmark", "items/s", "p50 ms", "p99 ms", "peak KiB")
+    if baseline:
+        header += " {:>9}".format("vs base")
+    lines = [header, "-" * len(header)]
+    for result in results:
+        line = "{:<36} {:>14,.0f} {:>10.3f} {:>10.3f} {:>11,.0f}".format(
+            result["name"], result["throughput"], result["p50_ms"],
+            result["p99_ms"], result["peak_kib"])
+        if baseline and result["name"] in baseline:
+            ratio = (result["throughput"] /
+                     baseline[result["name"]]["throughput"])
+            line += " {:>8.2f}x".format(ratio)
+        lines.append(line)
+    return "\n".join(lines)
@@ -0,0 +1,150 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""End-to-end rule latency, from Device.submit_data to the HTTP action.
+
+A rule with a HTTP action targeting a local RuleSink (see
+test/rule_test_server.py) is created, then samples meeting its
+condition are submitted one at a time and the time until the action
+arrives at the sink is measured. Registered as the rules.end_to_end
+benchmark against the mock server; run against a deployment with
+
+    python -m benchmarks.rule_latency --api-url URL --username USER \
+        --password PASSWORD --device-id ID --device-token TOKEN \
+        --component-id CID --sink-url http://<sink address>:5050/data
+
+where the sink address must be reachable from the rule engine.
+"""
+import argparse
+import sys
+import time
+
+from oisp import Client, Rule
+from benchmarks.fixtures import server_device
+from benchmarks.harness import benchmark, percentile
+
+
+def create_rule(account, device, component_id, target, threshold):
+    """Create a rule triggering for values of component above threshold."""
+    name = next(component["name"] for component in device.components
+                if component["cid"] == component_id)
+    rule = Rule("latency-{}".format(int(time.time())),
+                [Rule.condition(name, ">", threshold)],
+                [Rule.http_action(target)],
+                device_ids=[device.device_id],
+                priority=Rule.PRIORITY_LOW)
+    return account.create_rule(rule)
+
+
+def submit_and_wait(device, component_id, sink, value, timeout=30):
+    """Submit one sample and return seconds until the action arrived."""
+    count = len(sink.received)
+    device.add_sample(component_id, value)
+    start = time.perf_counter()
+    device.submit_data()
+    if not sink.wait(count + 1, timeout):
+        raise TimeoutError("No rule action within {} s".format(timeout))
+    return sink.received[count][0] - start
+
+
+# pylint: disable=too-many-arguments
+# All arguments are measurement settings
+def measure_latency(account, device, component_id, sink, samples=20,
+                    threshold=50, target=None, timeout=30):
+    """Return a list of end-to-end latencies in seconds.
+
+    The rule is deleted afterwards. target is the URL used in the rule
+    action, defaults to sink.url.
+    """
+    rule = create_rule(account, device, component_id, target or sink.url,
+                       threshold)
+    try:
+        return [submit_and_wait(device, component_id, sink,
+                                threshold + 1 + i, timeout)
+                for i in range(samples)]
+    finally:
+        account.delete_rule(rule)
+
+
+@benchmark("rules.end_to_end", needs_server=True)
+def end_to_end(ctx):
+    """Latency from submit_data to the rule action on the mock server."""
+    # pylint: disable=import-outside-toplevel
+    # Flask is only required for online benchmarks
+    from test.rule_test_server import RuleSink
+    account, device, cid = server_device(ctx)
+    sink = RuleSink().start()
+    ctx.add_cleanup(sink.stop)
+    rule = create_rule(account, device, cid, sink.url, 50)
+    ctx.add_cleanup(lambda: account.delete_rule(rule))
+    values = iter(range(51, sys.maxsize))
+
+    def run():
+        submit_and_wait(device, cid, sink, next(values))
+    return run
+
+
+def main(argv=None):
+    """Measure rule latency against a deployment and print percentiles."""
+    # pylint: disable=import-outside-toplevel
+    # Flask is only required for the sink
+    from test.rule_test_server import RuleSink
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--api-url", required=True)
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--device-id", required=True)
+    parser.add_argument("--device-token", required=True)
+    parser.add_argument("--component-id", required=True)
+    parser.add_argument("--sink-host", default="0.0.0.0",
+                        help="address the sink listens on")
+    parser.add_argument("--sink-port", type=int, default=5050)
+    parser.add_argument("--sink-url",
+                        help="URL of the sink as reachable by the rule "
+                             "engine (default: local URL)")
+    parser.add_argument("--samples", type=int, default=20)
+    parser.add_argument("--threshold", type=float, default=50)
+    parser.add_argument("--timeout", type=float, default=30)
+    args = parser.parse_args(argv)
+
+    client = Client(args.api_url)
+    client.auth(args.username, args.password)
+    device = client.get_device(args.device_token, args.device_id)
+    account = next(account for account in client.get_accounts()
+                   if account.account_id == device.domain_id)
+    with RuleSink(args.sink_host, args.sink_port) as sink:
+        latencies = measure_latency(account, device, args.component_id,
+                                    sink, args.samples, args.threshold,
+                                    args.sink_url, args.timeout)
+    print("samples: {}".format(len(latencies)))
+    for pct in [50, 95, 99, 100]:
+        print("p{:<3} {:10.1f} ms".format(
+            pct, percentile(latencies, pct) * 1e3))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
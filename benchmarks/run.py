@@ -0,0 +1,109 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""Run benchmarks and save or compare results.
+
+Examples:
+    python -m benchmarks.run
+    python -m benchmarks.run --filter query --repeat 20
+    python -m benchmarks.run --compare benchmarks/results/abc1234.json
+"""
+import argparse
+import os
+import sys
+
+from benchmarks import harness
+from benchmarks.server import MockServerProcess
+# Modules register their benchmarks on import
+from benchmarks import bench_core, rule_latency, transport  # noqa: F401 pylint: disable=unused-import
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           "results")
+
+
+def parse_args(argv):
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filter", default="",
+                        help="only run benchmarks containing this string")
+    parser.add_argument("--repeat", type=int, default=10,
+                        help="measured iterations per benchmark")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="multiply input sizes by this factor")
+    parser.add_argument("--offline", action="store_true",
+                        help="skip benchmarks using the mock server")
+    parser.add_argument("--output",
+                        help="result file (default: results/<commit>.json)")
+    parser.add_argument("--compare", help="result file to compare with")
+    parser.add_argument("--list", action="store_true",
+                        help="list benchmarks and exit")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run selected benchmarks, print and save results."""
+    args = parse_args(argv)
+    selected = [b for name, b in sorted(harness.BENCHMARKS.items())
+                if args.filter in name and
+                not (args.offline and b.needs_server)]
+    if args.list:
+        for bench in selected:
+            print(bench.name)
+        return 0
+
+    server = None
+    if any(b.needs_server for b in selected):
+        # Not in this process, so peak memory only covers the SDK
+        server = MockServerProcess()
+
+    results = []
+    try:
+        for bench in selected:
+            if server is not None:
+                server.reset()
+            context = harness.Context(scale=args.scale, server=server)
+            print("Running {} ...".format(bench.name), file=sys.stderr)
+            results.append(harness.measure(bench, context,
+                                           repeat=args.repeat))
+    finally:
+        if server is not None:
+            server.stop()
+
+    baseline = harness.load(args.compare) if args.compare else None
+    print(harness.format_table(results, baseline))
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, "{}.json".format(
+            harness.metadata()["commit"]))
+    harness.save(output, results)
+    print("Results saved to {}".format(output), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
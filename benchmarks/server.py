@@ -0,0 +1,98 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""Mock server running in a child process.
+
+Benchmarks measure the peak memory of the whole process, so the mock
+server is run in a separate process to keep its allocations out of the
+results. MockServerProcess provides the parts of MockServer used by
+benchmarks.
+"""
+from multiprocessing.managers import BaseManager
+
+
+class _ServedMockServer:
+    """MockServer started in the manager process, exposed via a proxy."""
+
+    def __init__(self, **kwargs):
+        # pylint: disable=import-outside-toplevel
+        # Flask is only required for online benchmarks
+        from test.mock_server import MockServer
+        self._server = MockServer(**kwargs).start()
+
+    def api_url(self):
+        """Return the URL to pass to oisp.Client."""
+        return self._server.api_url
+
+    def populate(self, email, password, **kwargs):
+        """Add a user and synthetic data, see MockServer.populate."""
+        return self._server.populate(email, password, **kwargs)
+
+    def reset(self):
+        """Reset database and request counters."""
+        self._server.reset()
+
+    def stop(self):
+        """Stop serving."""
+        self._server.stop()
+
+
+class _Manager(BaseManager):
+    """Manager process hosting mock servers."""
+
+
+_Manager.register("MockServer", _ServedMockServer)
+
+
+class MockServerProcess:
+    """Start a MockServer in a child process.
+
+    Arguments are passed to MockServer, e.g. latency or http2.
+    """
+
+    def __init__(self, **kwargs):
+        """Start the child process and the server."""
+        # pylint: disable=consider-using-with
+        # Shut down by stop, or when the benchmark process exits
+        self._manager = _Manager()
+        self._manager.start()
+        # pylint: disable=no-member
+        # Registered above
+        self._server = self._manager.MockServer(**kwargs)
+        self.api_url = self._server.api_url()
+
+    def populate(self, email, password, **kwargs):
+        """Add a user and synthetic data, see MockServer.populate."""
+        return self._server.populate(email, password, **kwargs)
+
+    def reset(self):
+        """Reset database and request counters."""
+        self._server.reset()
+
+    def stop(self):
+        """Stop the server and the child process."""
+        self._server.stop()
+        self._manager.shutdown()
@@ -0,0 +1,104 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""Concurrent requests over the default and the HTTP/2 backend.
+
+The benchmarks send bursts of GET requests from a thread pool to one
+mock server served by Hypercorn with injected latency. With the default
+backend each request opens a connection, with Http2Backend the requests
+are multiplexed over a few connections. Identical requests are only
+coalesced in transport.same_device_coalesced. Requires Hypercorn and
+httpx[http2].
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from oisp import Client
+from oisp.http2 import Http2Backend
+from benchmarks.fixtures import PASSWORD, USERNAME
+from benchmarks.harness import benchmark
+from benchmarks.server import MockServerProcess
+
+LATENCY = 0.005
+THREADS = 32
+_SERVER = []
+
+
+def _http2_server():
+    """Return the shared HTTP/2 mock server, started on first use."""
+    if not _SERVER:
+        _SERVER.append(MockServerProcess(latency=LATENCY, http2=True))
+    server = _SERVER[0]
+    server.reset()
+    return server
+
+
+def _get_devices_concurrently(ctx, backend, same=False, coalesce=False):
+    """Return a run function fetching devices of an account.
+
+    With same, every request is for the first device.
+    """
+    server = _http2_server()
+    data = server.populate(USERNAME, PASSWORD, num_devices=ctx.size(64),
+                           num_components=1, samples_per_component=0)
+    client = Client(server.api_url, backend=backend, coalesce_gets=coalesce)
+    client.auth(USERNAME, PASSWORD)
+    account = client.get_accounts()[-1]
+    device_ids = [device_id for device_id, _, _ in data["devices"]]
+    if same:
+        device_ids = device_ids[:1] * len(device_ids)
+    pool = ThreadPoolExecutor(THREADS)
+
+    def run():
+        return list(pool.map(account.get_device, device_ids))
+    return run
+
+
+@benchmark("transport.requests", items=lambda ctx: ctx.size(64),
+           needs_server=True)
+def transport_requests(ctx):
+    """Concurrent GETs with the default backend."""
+    return _get_devices_concurrently(ctx, None)
+
+
+@benchmark("transport.http2", items=lambda ctx: ctx.size(64),
+           needs_server=True)
+def transport_http2(ctx):
+    """Concurrent GETs multiplexed over HTTP/2 connections."""
+    return _get_devices_concurrently(ctx, Http2Backend(http1=False))
+
+
+@benchmark("transport.same_device", items=lambda ctx: ctx.size(64),
+           needs_server=True)
+def transport_same_device(ctx):
+    """Concurrent GETs of one device, each sent to the server."""
+    return _get_devices_concurrently(ctx, None, same=True)
+
+
+@benchmark("transport.same_device_coalesced", items=lambda ctx: ctx.size(64),
+           needs_server=True)
+def transport_same_device_coalesced(ctx):
+    """Concurrent GETs of one device, sharing requests in flight."""
+    return _get_devices_concurrently(ctx, None, same=True, coalesce=True)
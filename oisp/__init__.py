@@ -28,6 +28,13 @@
 """Python API for connection to Open IOT Connector REST API."""
 
 from oisp.account import Account
+from oisp.alert import Alert, AlertCursor
 from oisp.client import Client, OICException
 from oisp.device import Device
+from oisp.endpoints import EndpointPool
+from oisp.filters import SampleFilter
 from oisp.data_query import DataQuery
+from oisp.incremental import IncrementalQuery
+from oisp.query_cache import QueryCache
+from oisp.rule import Rule
+from oisp.window import WindowAggregator
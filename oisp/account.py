@@ -26,12 +26,31 @@
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """Methods for IoT Analytics account management."""
 
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+
+from oisp import streaming
+from oisp.alert import Alert
 from oisp.data_query import DataQuery, QueryResponse
 from oisp.device import Device
+from oisp.profiling import profiled
+from oisp.rule import Rule
+from oisp.utils import timestamp_in_ms
+
+
+def _map_concurrently(func, items, max_workers):
+    """Return [func(item) for item in items], calling func concurrently.
+
+    The first exception raised by func is raised after all calls
+    finished.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(func, item) for item in items]
+    return [future.result() for future in futures]
 
 
-# pylint: disable=too-many-instance-attributes
-# The attributes match those defined in the REST API
+# pylint: disable=too-many-instance-attributes, too-many-public-methods
+# The attributes and methods match those defined in the REST API
 class Account:
     """Create IoT Account instance."""
 
@@ -94,6 +113,7 @@ class Account:
     # pylint: disable=unused-argument, too-many-arguments
     # Arguments are accessed via locals() and as many as API parameters are
     # necessary
+    @profiled("account.get_devices")
     def get_devices(self, sort=None, order=None, limit=None, skip=None,
                     device_id=None, gateway_id=None, name=None, status=None):
         """Get a list of devices connected to the account.
@@ -126,7 +146,7 @@ class Account:
     def get_device(self, device_id):
         """Get device with given id."""
         endpoint = self.url + "/devices/" + device_id
-        resp = self.client.get(endpoint, 200)
+        resp = self.client.get(endpoint, expect=200)
         return Device.from_json(resp.json(), account=self)
 
     def create_device(self, device_id, name, gateway_id=None, tags=None,
@@ -246,9 +266,13 @@ class Account:
         resp = self.client.get(endpoint, expect=200)
         return resp.json()
 
+    @profiled("account.search_data")
     def search_data(self, query):
         """Search for data accessible to the account.
 
+        Results for settled time windows are answered from the client's
+        query_cache if one is set.
+
         Args:
         ----------
         query: An oisp.DataQuery object or a json dictionary.
@@ -257,6 +281,191 @@ class Account:
             payload = query.json()
         else:
             payload = query
+        cache = getattr(self.client, "query_cache", None)
+        if cache is not None:
+            data_dict = cache.get(payload)
+            if data_dict is not None:
+                return QueryResponse(self, data_dict)
         endpoint = self.url + "/data/search/advanced"
         data_dict = self.client.post(endpoint, data=payload, expect=200).data
+        if cache is not None:
+            cache.put(payload, data_dict)
         return QueryResponse(self, data_dict)
+
+    def search_data_stream(self, query, chunk_size=None):
+        """Search for data, yielding samples while they are downloaded.
+
+        Returns a generator of ComponentSamples objects, one for every
+        component with samples (or several, with at most chunk_size
+        samples each). The response is parsed incrementally if ijson is
+        installed, so large results do not need to fit in memory.
+        The query cache is not used.
+
+        Args:
+        ----------
+        query: An oisp.DataQuery object or a json dictionary.
+        chunk_size (optional): Maximum number of samples per object.
+        """
+        if isinstance(query, DataQuery):
+            query = query.json()
+        endpoint = self.url + "/data/search/advanced"
+        response = self.client.post(endpoint, data=query, expect=200,
+                                    stream=True)
+        return streaming.iter_search_response(self, response, chunk_size)
+
+    def search_aggregates(self, query=None, interval=None):
+        """Return aggregates for data matching query.
+
+        Aggregates are requested from the service so raw samples do not
+        need to be transferred. If the service does not return them, or
+        windowed aggregation is requested using interval, the samples
+        are fetched and aggregated locally.
+
+        Returns a dictionary mapping (device_id, component_id) to an
+        Aggregate, or to a list of Aggregate objects (one for each
+        window) if interval is given.
+
+        Args:
+        ----------
+        query (optional): An oisp.DataQuery object or a json dictionary,
+        its aggregations setting is ignored.
+        interval (int, optional): Window length in milliseconds.
+        """
+        if query is None:
+            query = DataQuery()
+        payload = query.json() if isinstance(query, DataQuery) else query
+        if interval is None:
+            response = self.search_data(dict(
+                payload, aggregations=DataQuery.AGGREGATION_ONLY))
+            if (response.has_server_aggregates() or
+                    not response.json_dict.get("data")):
+                return response.aggregates
+        response = self.search_data(dict(
+            payload, aggregations=DataQuery.AGGREGATION_EXCLUDE))
+        if interval is None:
+            return response.aggregates
+        return response.downsample(interval)
+
+    def get_alerts(self, status=None, since=None, limit=None, skip=None):
+        """Return a list of alerts of the account.
+
+        If since is given, alerts are ordered by the time of their last
+        update. Use an oisp.AlertCursor to fetch new and changed alerts
+        repeatedly.
+
+        Args:
+        ----------
+        status (str, optional): Only return alerts with this status.
+        since (optional): Only return alerts updated at or after this
+        time, as datetime or timestamp in ms.
+        limit (int, optional): Maximum number of alerts to return.
+        skip (int, optional): Skip this many alerts at the beginning.
+
+        """
+        if isinstance(since, datetime.datetime):
+            since = timestamp_in_ms(since)
+        params = {key: value for key, value in [("status", status),
+                                                ("since", since),
+                                                ("limit", limit),
+                                                ("skip", skip)]
+                  if value is not None}
+        resp = self.client.get(self.url + "/alerts", params=params,
+                               expect=200)
+        return [Alert.from_json(alert_json, self)
+                for alert_json in resp.json()]
+
+    def get_alert(self, alert_id):
+        """Get alert with given id."""
+        resp = self.client.get("{}/alerts/{}".format(self.url, alert_id),
+                               expect=200)
+        return Alert.from_json(resp.json(), self)
+
+    def update_alert_status(self, alert, status):
+        """Set the status of an alert (Alert or alert id)."""
+        alert_id = alert.alert_id if isinstance(alert, Alert) else alert
+        self.client.put("{}/alerts/{}/status/{}".format(self.url, alert_id,
+                                                        status),
+                        expect=200)
+
+    def update_alerts_status(self, alerts, status, max_workers=4):
+        """Set the status of many alerts (Alert objects or ids).
+
+        The service only accepts one alert per status update, the
+        requests are sent concurrently.
+        """
+        alerts = list(alerts)
+        _map_concurrently(lambda alert: self.update_alert_status(
+            alert, status), alerts, max_workers)
+        for alert in alerts:
+            if isinstance(alert, Alert):
+                alert.status = status
+
+    def reset_alerts(self, alerts):
+        """Reset (close) many alerts (Alert objects or ids) at once."""
+        payload = [{"alertId": alert.alert_id if isinstance(alert, Alert)
+                    else alert} for alert in alerts]
+        if payload:
+            self.client.put(self.url + "/alerts/bulk/reset", data=payload,
+                            expect=200)
+
+    def get_rules(self):
+        """Return a list of all rules of the account."""
+        resp = self.client.get(self.url + "/rules", expect=200)
+        return [Rule.from_json(rule_json, self) for rule_json in resp.json()]
+
+    def get_rule(self, rule_id):
+        """Get rule with given id."""
+        resp = self.client.get("{}/rules/{}".format(self.url, rule_id),
+                               expect=200)
+        return Rule.from_json(resp.json(), self)
+
+    def create_rule(self, rule):
+        """Create rule on the service, set its rule_id and return it."""
+        resp = self.client.post(self.url + "/rules", data=rule.json(),
+                                expect=201)
+        created = Rule.from_json(resp.json(), self)
+        rule.__dict__.update(created.__dict__)
+        return rule
+
+    def update_rule(self, rule):
+        """Replace the rule with given rule_id by rule."""
+        self.client.put("{}/rules/{}".format(self.url, rule.rule_id),
+                        data=rule.json(), expect=200)
+
+    def set_rule_status(self, rule, status):
+        """Set the status of a rule (Rule or rule id)."""
+        rule_id = rule.rule_id if isinstance(rule, Rule) else rule
+        self.client.put("{}/rules/status/{}".format(self.url, rule_id),
+                        data={"status": status}, expect=200)
+        if isinstance(rule, Rule):
+            rule.status = status
+
+    def delete_rule(self, rule):
+        """Delete a rule (Rule or rule id).
+
+        Active rules can not be deleted, they are deactivated first. For
+        rule ids, the status is fetched from the service.
+        """
+        if not isinstance(rule, Rule):
+            rule = self.get_rule(rule)
+        if rule.status == Rule.STATUS_ACTIVE:
+            self.set_rule_status(rule, Rule.STATUS_ON_HOLD)
+        self.client.delete("{}/rules/{}".format(self.url, rule.rule_id),
+                           expect=204)
+
+    def create_rules(self, rules, max_workers=8):
+        """Create many rules concurrently, return them."""
+        return _map_concurrently(self.create_rule, rules, max_workers)
+
+    def update_rules(self, rules, max_workers=8):
+        """Update many rules concurrently."""
+        _map_concurrently(self.update_rule, rules, max_workers)
+
+    def set_rules_status(self, rules, status, max_workers=8):
+        """Set the status of many rules (Rule objects or ids)."""
+        _map_concurrently(lambda rule: self.set_rule_status(rule, status),
+                          rules, max_workers)
+
+    def delete_rules(self, rules, max_workers=8):
+        """Delete many rules (Rule objects or ids) concurrently."""
+        _map_concurrently(self.delete_rule, rules, max_workers)
@@ -0,0 +1,185 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Alerts triggered by rules, and incremental fetching of alerts.
+
+An AlertCursor remembers the last update time of the alerts it has
+returned, optionally in a local JSON file, so every poll only fetches
+alerts that were created or changed since the previous poll.
+"""
+
+import json
+import os
+
+from oisp.utils import camel_to_underscore, ms_to_datetime
+
+# Service fields clashing with methods of Alert
+_RENAMED = {"reset": "reset_time"}
+
+
+class Alert:
+    """Alert of an account, created when a rule is triggered.
+
+    Attributes are set from the JSON returned by the service, e.g.
+    alert_id, device_id, rule_id, rule_name, priority, status,
+    triggered, last_update_date and reset_time (timestamps in ms).
+    """
+
+    STATUS_NEW = "New"
+    STATUS_OPEN = "Open"
+    STATUS_CLOSED = "Closed"
+
+    def __init__(self, account, alert_id, status=None, triggered=None,
+                 last_update_date=None):
+        """Create an alert object, use from_json for service responses."""
+        self.account = account
+        self.alert_id = alert_id
+        self.status = status
+        self.triggered = triggered
+        self.last_update_date = last_update_date
+
+    @staticmethod
+    def from_json(json_dict, account):
+        """Create an alert from a dictionary returned by the service."""
+        alert = Alert(account, json_dict["alertId"])
+        alert.__dict__.update({_RENAMED.get(key, camel_to_underscore(key)):
+                               value for key, value in json_dict.items()
+                               if value is not None})
+        return alert
+
+    @property
+    def updated(self):
+        """Return time of the last change in ms."""
+        if self.last_update_date is not None:
+            return self.last_update_date
+        return self.triggered
+
+    @property
+    def triggered_on(self):
+        """Return the time the alert was triggered as datetime."""
+        return ms_to_datetime(self.triggered)
+
+    def set_status(self, status):
+        """Set status to one of the STATUS_* values."""
+        self.account.update_alert_status(self, status)
+        self.status = status
+
+    def reset(self):
+        """Reset (close) the alert."""
+        self.account.reset_alerts([self])
+        self.status = Alert.STATUS_CLOSED
+
+    def __eq__(self, other):
+        if not isinstance(other, Alert):
+            return NotImplemented
+        return (self.alert_id, self.updated) == (other.alert_id,
+                                                 other.updated)
+
+    def __repr__(self):
+        return "Alert({}, {}, {})".format(self.alert_id, self.status,
+                                          self.updated)
+
+
+class AlertCursor:
+    """Poll an account for new and changed alerts.
+
+    Alerts are requested ordered by last update time, starting at the
+    update time of the newest alert returned so far. Pages are
+    requested using the update time of the last alert of the previous
+    page, so alerts changing while paging are not skipped.
+    """
+
+    def __init__(self, account, state_file=None, page_size=100,
+                 status=None):
+        """Create a cursor starting at the first alert.
+
+        Args:
+        ----------
+        account: Account to fetch alerts of.
+        state_file (str, optional): Path to a JSON file, the position is
+        loaded from and saved to this file.
+        page_size (int, optional): Maximum number of alerts per request.
+        status (str, optional): Only fetch alerts with this status.
+
+        """
+        self.account = account
+        self.state_file = state_file
+        self.page_size = page_size
+        self.status = status
+        # Update time of the newest alert returned, and ids of alerts
+        # updated at that time
+        self.since = None
+        self.seen = []
+        if state_file is not None and os.path.exists(state_file):
+            self.load()
+
+    def load(self):
+        """Load position from state_file."""
+        with open(self.state_file, encoding="utf-8") as state:
+            state_dict = json.load(state)
+        self.since = state_dict["since"]
+        self.seen = state_dict["seen"]
+
+    def save(self):
+        """Save position to state_file, replacing it atomically."""
+        tmp_file = self.state_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as state:
+            json.dump({"since": self.since, "seen": self.seen}, state)
+        os.replace(tmp_file, self.state_file)
+
+    def _is_new(self, alert):
+        return (self.since is None or alert.updated > self.since or
+                (alert.updated == self.since and
+                 alert.alert_id not in self.seen))
+
+    def _advance(self, alert):
+        if self.since is None or alert.updated > self.since:
+            self.since = alert.updated
+            self.seen = [alert.alert_id]
+        elif alert.updated == self.since:
+            self.seen.append(alert.alert_id)
+
+    def poll(self):
+        """Return a list of alerts created or changed since last poll."""
+        alerts = []
+        skip = 0
+        while True:
+            page = self.account.get_alerts(status=self.status,
+                                           since=self.since,
+                                           limit=self.page_size, skip=skip)
+            new = [alert for alert in page if self._is_new(alert)]
+            for alert in new:
+                self._advance(alert)
+            alerts.extend(new)
+            if len(page) != self.page_size:
+                break
+            # A full page without new alerts consists of alerts updated
+            # at the same time, skip it instead of requesting it again
+            skip = 0 if new else skip + self.page_size
+        if self.state_file is not None:
+            self.save()
+        return alerts
@@ -0,0 +1,328 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Zero-copy CBOR encoding and decoding for binary sample values.
+
+Payloads with binary values are sent as CBOR. CborBody streams the
+encoding into the request body: bytes-like values (bytes, bytearray,
+memoryview or any object supporting the buffer protocol) are passed to
+the connection as memoryviews instead of being copied into an encoded
+blob, and readable file-like values are read in chunks while sending.
+
+loads decodes a CBOR body and can return byte strings as memoryviews
+into the response buffer instead of copies.
+
+Example:
+----------
+    with open("frame.jpg", "rb") as frame:
+        device.add_sample(image_cid, frame)
+        device.submit_data()
+
+"""
+
+import io
+import os
+import struct
+
+CHUNK_SIZE = 1 << 16
+# Smaller binary values are copied into the encoding, sending them
+# separately would cost more than copying
+MIN_VIEW_SIZE = 1024
+
+_BYTES, _TEXT, _ARRAY, _MAP = 2, 3, 4, 5
+_BREAK = b"\xff"
+
+
+def _head(major, length):
+    """Return the head of a CBOR item with major type and length."""
+    if length < 24:
+        return bytes([major << 5 | length])
+    if length < 1 << 8:
+        return struct.pack("!BB", major << 5 | 24, length)
+    if length < 1 << 16:
+        return struct.pack("!BH", major << 5 | 25, length)
+    if length < 1 << 32:
+        return struct.pack("!BI", major << 5 | 26, length)
+    return struct.pack("!BQ", major << 5 | 27, length)
+
+
+def _remaining_size(source):
+    """Return the number of bytes left in a file, None if unknown."""
+    try:
+        position = source.tell()
+        end = source.seek(0, os.SEEK_END)
+        source.seek(position)
+        return end - position
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+
+
+class _FilePart:
+    """A file-like value, read while the body is sent."""
+
+    __slots__ = ["source", "position", "size"]
+
+    def __init__(self, source):
+        self.source = source
+        self.size = _remaining_size(source)
+        self.position = source.tell() if self.size is not None else None
+
+    def __len__(self):
+        return (len(_head(_BYTES, self.size)) + self.size
+                if self.size is not None else 0)
+
+    def chunks(self, chunk_size):
+        """Yield the encoded value, reading chunk_size bytes at a time."""
+        if self.size is None:
+            # Unknown size, use an indefinite length byte string
+            yield b"\x5f"
+            while True:
+                chunk = self.source.read(chunk_size)
+                if not chunk:
+                    break
+                yield _head(_BYTES, len(chunk)) + chunk
+            yield _BREAK
+            return
+        self.source.seek(self.position)
+        try:
+            yield _head(_BYTES, self.size)
+            left = self.size
+            while left:
+                chunk = self.source.read(min(chunk_size, left))
+                if not chunk:
+                    raise ValueError("File ended {} bytes before its "
+                                     "expected size".format(left))
+                left -= len(chunk)
+                yield chunk
+        finally:
+            # Leave the file as found, so the value can be sent again
+            self.source.seek(self.position)
+
+
+class CborBody:
+    """Request body streaming the CBOR encoding of a payload.
+
+    The structure of the payload is encoded when the body is created,
+    binary values are only referenced. The body can be iterated more
+    than once (e.g. for retries) if file-like values are seekable.
+    len() is the body size, or 0 if it contains files of unknown size,
+    in which case requests uses chunked transfer encoding.
+    """
+
+    def __init__(self, payload, chunk_size=CHUNK_SIZE):
+        """Encode payload, raises TypeError for unsupported values."""
+        self.chunk_size = chunk_size
+        self._parts = []
+        self._buffer = bytearray()
+        self._encode(payload)
+        self._flush()
+        self._buffer = None
+        self._length = 0
+        for part in self._parts:
+            if isinstance(part, _FilePart) and part.size is None:
+                self._length = 0
+                break
+            self._length += len(part)
+
+    def _flush(self):
+        if self._buffer:
+            self._parts.append(bytes(self._buffer))
+            self._buffer.clear()
+
+    # pylint: disable=too-many-branches
+    # One branch per type
+    def _encode(self, value):
+        buffer = self._buffer
+        if isinstance(value, str):
+            encoded = value.encode("utf-8")
+            buffer += _head(_TEXT, len(encoded))
+            buffer += encoded
+        elif isinstance(value, bool):
+            buffer.append(0xF5 if value else 0xF4)
+        elif isinstance(value, int):
+            if not -1 << 64 < value < 1 << 64:
+                raise TypeError("Integer {} too large for CBOR".format(value))
+            buffer += _head(0, value) if value >= 0 else _head(1, -1 - value)
+        elif isinstance(value, float):
+            buffer += struct.pack("!Bd", 0xFB, value)
+        elif value is None:
+            buffer.append(0xF6)
+        elif isinstance(value, dict):
+            buffer += _head(_MAP, len(value))
+            for key, item in value.items():
+                self._encode(key)
+                self._encode(item)
+        elif isinstance(value, (list, tuple)):
+            buffer += _head(_ARRAY, len(value))
+            for item in value:
+                self._encode(item)
+        elif hasattr(value, "read"):
+            self._flush()
+            self._parts.append(_FilePart(value))
+        else:
+            try:
+                view = memoryview(value).cast("B")
+            except TypeError as error:
+                raise TypeError("Object of type {} is not CBOR "
+                                "serializable".format(
+                                    type(value).__name__)) from error
+            buffer += _head(_BYTES, len(view))
+            if len(view) < MIN_VIEW_SIZE:
+                buffer += view
+            else:
+                self._flush()
+                self._parts.append(view)
+
+    def __len__(self):
+        return self._length
+
+    def __bool__(self):
+        return True
+
+    def __iter__(self):
+        """Yield the encoded body in chunks, binary values uncopied."""
+        for part in self._parts:
+            if isinstance(part, _FilePart):
+                yield from part.chunks(self.chunk_size)
+            else:
+                yield part
+
+    def getvalue(self):
+        """Return the whole encoding as bytes (copies binary values)."""
+        return b"".join(self)
+
+
+def dumps(payload):
+    """Return the CBOR encoding of payload as bytes."""
+    return CborBody(payload).getvalue()
+
+
+# pylint: disable=too-few-public-methods
+# Used through loads
+class _Decoder:
+    """Decoder for a CBOR buffer, optionally returning memoryviews."""
+
+    def __init__(self, data, views):
+        self.data = memoryview(data).cast("B")
+        self.views = views
+        self.position = 0
+
+    def _read(self, count):
+        start = self.position
+        self.position += count
+        if self.position > len(self.data):
+            raise ValueError("Truncated CBOR data")
+        return self.data[start:self.position]
+
+    def _argument(self, info):
+        if info < 24:
+            return info
+        if info == 31:
+            return None
+        size = 1 << (info - 24)
+        if size > 8:
+            raise ValueError("Invalid CBOR additional information")
+        return int.from_bytes(self._read(size), "big")
+
+    def _indefinite(self, major):
+        chunks = []
+        while self.data[self.position] != 0xFF:
+            chunks.append(self.decode())
+        self.position += 1
+        if major == _TEXT:
+            return "".join(chunks)
+        return b"".join(chunks)
+
+    # pylint: disable=too-many-return-statements, too-many-branches
+    # One branch per major type
+    def decode(self):
+        """Decode and return the next item."""
+        initial = self._read(1)[0]
+        major, info = initial >> 5, initial & 0x1F
+        if major == 7:
+            return self._simple(info)
+        length = self._argument(info)
+        if major == 0:
+            return length
+        if major == 1:
+            return -1 - length
+        if major in (_BYTES, _TEXT):
+            if length is None:
+                return self._indefinite(major)
+            value = self._read(length)
+            if major == _TEXT:
+                return str(value, "utf-8")
+            return value if self.views else value.tobytes()
+        if major == _ARRAY:
+            if length is None:
+                items = []
+                while self.data[self.position] != 0xFF:
+                    items.append(self.decode())
+                self.position += 1
+                return items
+            return [self.decode() for _ in range(length)]
+        if major == _MAP:
+            result = {}
+            if length is None:
+                while self.data[self.position] != 0xFF:
+                    key = self.decode()
+                    result[key] = self.decode()
+                self.position += 1
+            else:
+                for _ in range(length):
+                    key = self.decode()
+                    result[key] = self.decode()
+            return result
+        # Tags are ignored, the tagged item is returned
+        return self.decode()
+
+    def _simple(self, info):
+        if info == 20:
+            return False
+        if info == 21:
+            return True
+        if info in (22, 23):
+            return None
+        if info == 25:
+            return struct.unpack("!e", self._read(2))[0]
+        if info == 26:
+            return struct.unpack("!f", self._read(4))[0]
+        if info == 27:
+            return struct.unpack("!d", self._read(8))[0]
+        if info < 24:
+            return info
+        raise ValueError("Unsupported CBOR simple value {}".format(info))
+
+
+def loads(data, views=False):
+    """Decode CBOR data.
+
+    If views is True, byte strings are returned as memoryviews into
+    data instead of bytes, so data is kept in memory as long as any of
+    them is referenced.
+    """
+    return _Decoder(data, views).decode()
@@ -0,0 +1,224 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""Bulk ingestion of historical data from arrays and data frames.
+
+Backfilling data with Device.add_sample creates a dictionary for every
+datapoint. The methods in this module serialize column oriented data
+(lists, NumPy arrays or a pandas DataFrame) directly into size bounded
+JSON payloads and submit them concurrently.
+
+NumPy and pandas are optional, plain lists are accepted as well.
+"""
+
+from concurrent.futures import (ThreadPoolExecutor, FIRST_COMPLETED,
+                                wait)
+from datetime import datetime
+import json
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from oisp.utils import timestamp_in_ms
+
+# Limits for a single POST to /data/{device_id}
+DEFAULT_MAX_SAMPLES = 1000
+DEFAULT_MAX_BYTES = 512 * 1024
+DEFAULT_MAX_WORKERS = 4
+
+
+def _to_list(values):
+    """Return values as a list of python scalars."""
+    if hasattr(values, "tolist"):
+        return values.tolist()
+    return list(values)
+
+
+def _timestamps_in_ms(timestamps):
+    """Convert timestamps to a list of integers (milliseconds).
+
+    Accepts integers (already in ms), datetime objects, NumPy
+    datetime64 arrays and pandas DatetimeIndex/Series. datetime
+    objects are converted by timestamp_in_ms, datetime64 values
+    (which have no timezone) are UTC like naive datetimes.
+    """
+    if hasattr(timestamps, "to_numpy"):
+        # Object array of Timestamps if the index is timezone aware
+        timestamps = timestamps.to_numpy()
+    if (np is not None and isinstance(timestamps, np.ndarray)
+            and timestamps.dtype.kind != "O"):
+        if timestamps.dtype.kind == "M":
+            timestamps = timestamps.astype("datetime64[ms]").astype(np.int64)
+        return timestamps.astype(np.int64).tolist()
+    return [timestamp_in_ms(ts) if isinstance(ts, datetime) else int(ts)
+            for ts in timestamps]
+
+
+def _encoder_for(values):
+    """Return a function converting a single value to a JSON literal."""
+    kind = getattr(getattr(values, "dtype", None), "kind", None)
+    if kind == "f":
+        return repr
+    if kind in ("i", "u"):
+        return str
+    return json.dumps
+
+
+def _is_missing(value):
+    """Return True for values that can not be submitted (None, NaN, inf)."""
+    return value is None or (isinstance(value, float) and
+                             not math.isfinite(value))
+
+
+# pylint: disable=too-many-locals
+# Splitting this up would cost a function call per datapoint
+def iter_payloads(account_id, timestamps, columns,
+                  max_samples=DEFAULT_MAX_SAMPLES,
+                  max_bytes=DEFAULT_MAX_BYTES):
+    """Yield serialized payloads for the /data/{device_id} endpoint.
+
+    The JSON is written directly from the columns, no dictionary
+    is created per datapoint. Missing values (None, NaN or infinity)
+    are skipped.
+
+    Args:
+    ----------
+    account_id: Account (domain) id of the device.
+    timestamps: Sequence of timestamps, see _timestamps_in_ms.
+    columns: Dictionary mapping component ids to sequences of values,
+    each of the same length as timestamps.
+    max_samples: Maximum number of datapoints in a payload.
+    max_bytes: Approximate maximum size of a payload in bytes.
+
+    Yields (payload, number_of_samples) tuples.
+
+    """
+    ts_list = _timestamps_in_ms(timestamps)
+    head = '{{"on":{},"accountId":{},"data":['.format(timestamp_in_ms(),
+                                                      json.dumps(account_id))
+    tail = "]}"
+    overhead = len(head) + len(tail)
+
+    parts = []
+    size = overhead
+    for component_id, values in columns.items():
+        if len(values) != len(ts_list):
+            raise ValueError("Column {} has {} values, expected {}".format(
+                component_id, len(values), len(ts_list)))
+        encode = _encoder_for(values)
+        prefix = '{{"componentId":{},"value":'.format(
+            json.dumps(component_id))
+        for value, on in zip(_to_list(values), ts_list):
+            if _is_missing(value):
+                continue
+            part = '{}{},"on":{}}}'.format(prefix, encode(value), on)
+            if parts and (len(parts) >= max_samples or
+                          size + len(part) + 1 > max_bytes):
+                yield head + ",".join(parts) + tail, len(parts)
+                parts = []
+                size = overhead
+            parts.append(part)
+            size += len(part) + 1
+    if parts:
+        yield head + ",".join(parts) + tail, len(parts)
+
+
+def submit_payloads(device, payloads, max_workers=DEFAULT_MAX_WORKERS):
+    """Submit serialized payloads concurrently, return number of samples.
+
+    At most 2 * max_workers payloads are kept in memory at a time.
+    If a request fails, pending requests are cancelled and the
+    exception is raised. The requests are sent from several threads
+    through device.client, which relies on Client being safe to share
+    between threads.
+    """
+    if device.auth_as is None:
+        raise Warning("Submitting data without device token is "
+                      "not supported.")
+    url = "/data/{}".format(device.device_id)
+
+    def post(payload):
+        device.client.post(url, data=payload, authorize_as=device.auth_as,
+                           expect=201)
+
+    submitted = 0
+    pending = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            for payload, count in payloads:
+                if len(pending) >= 2 * max_workers:
+                    submitted += _collect(pending, FIRST_COMPLETED)
+                pending[executor.submit(post, payload)] = count
+            submitted += _collect(pending)
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+    return submitted
+
+
+def _collect(pending, return_when="ALL_COMPLETED"):
+    """Wait for pending futures, raise errors and return finished count."""
+    done, _ = wait(list(pending), return_when=return_when)
+    count = 0
+    for future in done:
+        count += pending.pop(future)
+        future.result()
+    return count
+
+
+def submit_dataframe(device, frame, timestamp_column=None, **kwargs):
+    """Submit a pandas DataFrame, return number of samples submitted.
+
+    Every column except the timestamp column is interpreted as
+    a component id. If timestamp_column is None, the index is used.
+    Further keyword arguments are passed to submit_arrays.
+    """
+    if timestamp_column is None:
+        timestamps = frame.index
+        names = list(frame.columns)
+    else:
+        timestamps = frame[timestamp_column]
+        names = [c for c in frame.columns if c != timestamp_column]
+    columns = {name: frame[name].to_numpy() for name in names}
+    return submit_arrays(device, timestamps, columns, **kwargs)
+
+
+# pylint: disable=too-many-arguments
+# Limits are exposed as keyword arguments
+def submit_arrays(device, timestamps, columns,
+                  max_samples=DEFAULT_MAX_SAMPLES, max_bytes=DEFAULT_MAX_BYTES,
+                  max_workers=DEFAULT_MAX_WORKERS):
+    """Submit column oriented data, return number of samples submitted.
+
+    See iter_payloads for the arguments.
+    """
+    payloads = iter_payloads(device.domain_id, timestamps, columns,
+                             max_samples=max_samples, max_bytes=max_bytes)
+    return submit_payloads(device, payloads, max_workers=max_workers)
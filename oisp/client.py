@@ -28,24 +28,67 @@
 
 import json
 import logging
+import re
+import threading
+import time
+import warnings
 try:
     from simplejson.errors import JSONDecodeError
 except ImportError:
     from json.decoder import JSONDecodeError
 import cbor
 import requests
+import urllib3
 from termcolor import colored
 
 from oisp.account import Account
+from oisp.coalesce import RequestCoalescer, request_key
 from oisp.device import Device
+from oisp.endpoints import EndpointPool
+from oisp.metrics import RequestMetrics, body_size
 from oisp.oisp_token import UserToken
 from oisp.oisp_user import User
+from oisp import binary, http2, profiling
 from oisp.utils import pretty_dumps
 
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 logger.setLevel(logging.INFO)
 
+# POSTs not changing resources returned by GETs (data submission and
+# searches), they do not end coalesced GETs in progress
+_READ_ONLY_POST = re.compile(r"^/data/[^/]+$|/data/search(/|$)")
+# Gateway errors, the request may not have reached a working frontend.
+# They eject endpoints, but only GETs are resent, as a write may have
+# been applied before the gateway gave up.
+_FAILOVER_STATUS = (502, 503, 504)
+# Methods resent to another API root after a response or error that
+# leaves open whether the first one processed the request
+_IDEMPOTENT = ("GET",)
+# Request bodies that can be sent again
+_REPEATABLE = (type(None), bytes, bytearray, memoryview, str,
+               binary.CborBody)
+
+
+def _not_sent(error):
+    """Return whether a request failed before it was sent.
+
+    Only connection errors qualify, e.g. refused connections or
+    unresolvable hosts, not errors after the request was written.
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.exceptions.ConnectionError):
+        return False
+    # Raised from the httpx error by Http2Backend
+    if (http2.httpx is not None
+            and isinstance(error.__cause__, http2.httpx.ConnectError)):
+        return True
+    reason = error.args[0] if error.args else None
+    # urllib3 wraps connection errors in MaxRetryError
+    reason = getattr(reason, "reason", reason)
+    return isinstance(reason, urllib3.exceptions.NewConnectionError)
+
 
 class AuthenticationError(Exception):
     """Authentication Error class for Open IOT Connector.
@@ -166,6 +209,19 @@ class OICException(Exception):
         super().__init__(message)
 
 
+# pylint: disable=too-few-public-methods
+# Only provides the request functions
+class RequestsBackend:
+    """Default backend of Client, one connection per request."""
+
+    get = staticmethod(requests.get)
+    post = staticmethod(requests.post)
+    put = staticmethod(requests.put)
+    delete = staticmethod(requests.delete)
+
+
+# pylint: disable=too-many-instance-attributes
+# Settings are stored as attributes
 class Client:
     """IoT Analytics Cloud client class.
 
@@ -173,32 +229,98 @@ class Client:
     user_token (str): access token from IoT Analytics site connection
     user_id (str): user ID for authenticated user
 
+    A client can be shared by multiple threads.
     """
 
-    def __init__(self, api_root, proxies=None, verify_certs=True):
+    # pylint: disable=too-many-arguments
+    def __init__(self, api_root, proxies=None, verify_certs=True,
+                 query_cache=None, request_hooks=None, binary_views=False,
+                 backend=None, coalesce_gets=False):
         """Set up connection.
 
         Args:
         ----------
         api_root (str): IoT Analytics server address (defaults
-        to https://streammyiot.com/v1/api)
+        to https://streammyiot.com/v1/api). A list of addresses of
+        equivalent frontends, or an EndpointPool, spreads requests by
+        latency and fails over to the other ones, see oisp.endpoints.
         proxies (dict, optional): dictionary of proxy server addresses
           (e.g., {"https": "http://proxy-us.mycorp.com:8080"}
         The API will respect system proxy settings if none specified.
         verify_certs (bool, optional): Whether the certificates should
         be verified on each request.
+        query_cache (QueryCache, optional): Cache for data search results
+        of historical time windows.
+        request_hooks (list, optional): Callables receiving a
+        RequestMetrics object after each request, see add_request_hook.
+        binary_views (bool, optional): Whether binary values in CBOR
+        responses are returned as memoryviews into the response body
+        instead of bytes copies.
+        backend (optional): Object with get, post, put and delete
+        functions sending the requests, defaults to RequestsBackend.
+        "http2" creates an oisp.http2.Http2Backend, sharing multiplexed
+        connections between threads (HTTP/1.1 for http:// API roots).
+        coalesce_gets (bool, optional): Whether concurrent identical GET
+        requests share one request and its response, see oisp.coalesce.
+        Shared responses must not be modified.
 
         """
-        self.base_url = api_root
+        if isinstance(api_root, str):
+            api_root = [api_root]
+        if not isinstance(api_root, EndpointPool):
+            api_root = EndpointPool(api_root)
+        self.endpoints = api_root
         self.proxies = proxies
         self.verify_certs = verify_certs
+        self.query_cache = query_cache
+        self.binary_views = binary_views
+        if backend == "http2":
+            scheme = self.base_url.split(":", 1)[0]
+            if scheme == "http":
+                warnings.warn("HTTP/2 is only negotiated over TLS, use "
+                              "Http2Backend(http1=False) for HTTP/2 on "
+                              "http:// API roots", stacklevel=2)
+            backend = http2.Http2Backend(
+                verify=verify_certs, proxy=(proxies or {}).get(scheme))
+        self.backend = backend or RequestsBackend()
+        self.coalescer = RequestCoalescer() if coalesce_gets else None
+        self.request_hooks = list(request_hooks or [])
         self.user_token = None
         self.user_id = None
-        # Contains last reponse
-        self.response = None
+        # Guards changes to user_token, user_id and request_hooks
+        self._lock = threading.Lock()
+        # Last response for each thread, see response property
+        self._local = threading.local()
         # Test connection
         self.get_server_info()
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"], state["_local"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def base_url(self):
+        """First API root, others are used when it fails or is slower.
+
+        Read-only, requests are sent to the API roots of endpoints.
+        """
+        return self.endpoints.endpoints[0].url
+
+    @property
+    def response(self):
+        """Last response received by the calling thread."""
+        return getattr(self._local, "response", None)
+
+    @response.setter
+    def response(self, response):
+        self._local.response = response
+
     def get_headers(self, authorize_as=None, authorize=True):
         """Return a JSON dictionary containing request headers.
 
@@ -215,14 +337,15 @@ class Client:
             return headers
 
         if authorize_as is None:
-            if not self.user_token:
+            user_token = self.user_token
+            if not user_token:
                 raise AuthenticationError("You need to authenticate using "
                                           "the auth method first, or authorize"
                                           "as a device")
             # if self.user_token.is_expired():
             #   raise AuthenticationError("UserToken expired, you need to use "
             #                             "the auth method again.")"""
-            token = self.user_token.value
+            token = user_token.value
         else:
             assert isinstance(authorize_as, Device), """You can only authorize
             as Device, leave authorize_as empty for user authorization."""
@@ -247,8 +370,10 @@ class Client:
                          expect=200)
 
         token_str = resp.json()["token"]
-        self.user_token = self.get_user_token(token_str)
-        self.user_id = self.user_token.user_id
+        user_token = self.get_user_token(token_str)
+        with self._lock:
+            self.user_token = user_token
+            self.user_id = user_token.user_id
 
     def get_user_token(self, token_str=None):
         """Return a UserToken object containing user token information.
@@ -259,8 +384,9 @@ class Client:
         last acquired token will be used.
 
         """
-        if not token_str and self.user_token:
-            return self.user_token
+        user_token = self.user_token
+        if not token_str and user_token:
+            return user_token
         if not token_str:
             raise ValueError("token_str must be specified for first token"
                              "acquisation")
@@ -361,8 +487,129 @@ class Client:
         return Account(self, resp_json["name"], resp_json["id"],
                        Account.ROLE_ADMIN)
 
+    def add_request_hook(self, hook):
+        """Register a callable to be called with metrics of each request.
+
+        The hook receives an oisp.metrics.RequestMetrics object containing
+        method, endpoint template (ids replaced by {id}), status, bytes
+        sent and received, encode/network/decode times, retries and
+        whether the response of a concurrent request was shared.
+        Hooks are called from the thread making the request, exceptions
+        raised by hooks are logged and ignored.
+        """
+        with self._lock:
+            self.request_hooks = self.request_hooks + [hook]
+
+    def remove_request_hook(self, hook):
+        """Unregister a hook added by add_request_hook."""
+        with self._lock:
+            hooks = list(self.request_hooks)
+            hooks.remove(hook)
+            self.request_hooks = hooks
+
+    def _report(self, metrics):
+        """Pass metrics to all request hooks."""
+        metrics.end_ns = time.time_ns()
+        for hook in self.request_hooks:
+            try:
+                hook(metrics)
+            # pylint: disable=broad-except
+            # A failing hook must not break requests
+            except Exception:
+                logger.exception("Request hook %r failed", hook)
+
+    @staticmethod
+    def _encode(payload, headers, debug=False):
+        """Serialize payload as JSON, or CBOR if it contains binary data.
+
+        headers are updated if CBOR is used. CBOR payloads are returned
+        as a binary.CborBody, which streams binary values and files
+        without copying them.
+        """
+        try:
+            if debug:
+                logger.debug("%s \n%s", colored("Payload (JSON):",
+                                                attrs=["bold"]),
+                             pretty_dumps(payload))
+            return json.dumps(payload)
+        # Not json serializable, try CBOR
+        except TypeError:
+            headers["Content-Type"] = "application/cbor"
+            try:
+                return binary.CborBody(payload)
+            except TypeError:
+                return cbor.dumps(payload)
+
+    def _decode(self, response):
+        """Set response.data to the parsed JSON or CBOR body."""
+        cont_type = response.headers.get("Content-Type", "")
+        if cont_type.startswith("application/json"):
+            response.data = response.json()
+        elif cont_type.startswith("application/cbor"):
+            if self.binary_views:
+                response.data = binary.loads(response.content, views=True)
+            else:
+                response.data = cbor.loads(response.content)
+
+    # pylint: disable=too-many-arguments, too-many-locals
+    # Arguments of _make_request are passed through, state of attempts
+    # is kept in locals
+    def _send(self, request_func, endpoint, metrics, headers, args, kwargs):
+        """Send a request, failing over to other API roots.
+
+        Requests failing to connect are sent to the next API root,
+        unless the body can not be sent again. GET requests are also
+        resent after other transport errors and gateway errors.
+        """
+        # Iterators can only be sent once
+        attempts = (len(self.endpoints) if isinstance(
+            kwargs.get("data"), _REPEATABLE) else 1)
+        idempotent = metrics.method in _IDEMPOTENT
+        tried = []
+        while True:
+            api_root = self.endpoints.select(exclude=tried)
+            tried.append(api_root)
+            metrics.api_root = api_root.url
+            url = api_root.url + endpoint
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("%s: %s", colored(metrics.method, "green"),
+                             url)
+            start = time.perf_counter()
+            try:
+                with profiling.stage("client.network"):
+                    response = request_func(url, headers=headers, *args,
+                                            **kwargs)
+            except requests.exceptions.RequestException as exc:
+                metrics.network_time += time.perf_counter() - start
+                # Latency is only tracked for responses
+                self.endpoints.release(api_root, None, failed=True)
+                if len(tried) < attempts and (idempotent or _not_sent(exc)):
+                    logger.debug("Retrying after %r from %s", exc, url)
+                    metrics.retries += 1
+                    continue
+                metrics.error = exc
+                self._report(metrics)
+                raise
+            except Exception as exc:
+                # Not caused by the endpoint, e.g. an unreadable body
+                self.endpoints.release(api_root, None)
+                metrics.error = exc
+                self._report(metrics)
+                raise
+            elapsed = time.perf_counter() - start
+            metrics.network_time += elapsed
+            failed = response.status_code in _FAILOVER_STATUS
+            self.endpoints.release(api_root, elapsed, failed)
+            if not (failed and idempotent) or len(tried) == attempts:
+                return response
+            logger.debug("Retrying after %s from %s",
+                         response.status_code, url)
+            response.close()
+            metrics.retries += 1
+
     # pylint: disable=too-many-arguments
     # All arguments are necessary and this method is not exposed
+    @profiling.profiled("client.request")
     def _make_request(self, request_func, endpoint, authorize, authorize_as,
                       expect=None, *args, **kwargs):
         """Make a request using global settings.
@@ -374,42 +621,41 @@ class Client:
         headers = kwargs.pop("headers",
                              self.get_headers(authorize=authorize,
                                               authorize_as=authorize_as))
-        proxies = kwargs.pop("proxies", self.proxies)
-        verify = kwargs.pop("verify", self.verify_certs)
-
-        url = self.base_url + endpoint
-        logger.debug("%s: %s", colored(request_func.__name__.upper(), "green"),
-                     url)
-
-        if "data" in kwargs and isinstance(kwargs.get("data"), dict):
-            try:
-                logger.debug("%s \n%s", colored("Payload (JSON):",
-                                                attrs=["bold"]),
-                             pretty_dumps(kwargs["data"]))
-                kwargs["data"] = json.dumps(kwargs["data"])
-            # Not json serializable, try CBOR
-            except TypeError:
-                headers["Content-Type"] = "application/cbor"
-                kwargs["data"] = cbor.dumps(kwargs["data"])
-
-        self.response = request_func(url, headers=headers, proxies=proxies,
-                                     verify=verify, *args, **kwargs)
-
-        cont_type = self.response.headers.get("Content-Type", "")
-        if cont_type.startswith("application/json"):
-            self.response.data = self.response.json()
-        elif cont_type.startswith("application/cbor"):
-            self.response.data = cbor.loads(self.response.content)
-
-        if hasattr(self.response, "data"):
+        kwargs.setdefault("proxies", self.proxies)
+        kwargs.setdefault("verify", self.verify_certs)
+        debug = logger.isEnabledFor(logging.DEBUG)
+        metrics = RequestMetrics(request_func.__name__.upper(), endpoint)
+
+        if "data" in kwargs and isinstance(kwargs.get("data"), (dict, list)):
+            start = time.perf_counter()
+            with profiling.stage("client.encode"):
+                kwargs["data"] = self._encode(kwargs["data"], headers,
+                                              debug)
+            metrics.encode_time = time.perf_counter() - start
+        metrics.bytes_sent = body_size(kwargs.get("data"))
+
+        response = self._send(request_func, endpoint, metrics, headers,
+                              args, kwargs)
+        metrics.status = response.status_code
+        self.response = response
+
+        start = time.perf_counter()
+        if not kwargs.get("stream"):
+            with profiling.stage("client.decode"):
+                metrics.bytes_received = body_size(response.content)
+                self._decode(response)
+        metrics.decode_time = time.perf_counter() - start
+
+        if debug and hasattr(response, "data"):
             logger.debug("%s %s \n %s \n",
                          colored("Response:", attrs=["bold"]),
-                         self.response.status_code,
-                         pretty_dumps(self.response.data))
+                         response.status_code,
+                         pretty_dumps(response.data))
+        self._report(metrics)
 
-        if expect and (self.response.status_code != expect):
-            raise OICException(expect, self.response)
-        return self.response
+        if expect and (response.status_code != expect):
+            raise OICException(expect, response)
+        return response
 
     def get(self, endpoint, authorize=True, authorize_as=None,
             *args, **kwargs):
@@ -422,8 +668,41 @@ class Client:
         Other arguments are passed to requests module.
 
         """
-        return self._make_request(requests.get, endpoint, authorize,
-                                  authorize_as, *args, **kwargs)
+        if self.coalescer is None or args or kwargs.get("stream"):
+            return self._make_request(self.backend.get, endpoint, authorize,
+                                      authorize_as, *args, **kwargs)
+        return self._coalesced_get(endpoint, authorize, authorize_as,
+                                   **kwargs)
+
+    def _written(self):
+        """Let GET requests after a write not share earlier responses."""
+        if self.coalescer is not None:
+            self.coalescer.forget()
+
+    def _coalesced_get(self, endpoint, authorize, authorize_as, expect=None,
+                       **kwargs):
+        """Make a GET request, sharing the response of an identical one."""
+        if "headers" not in kwargs:
+            kwargs["headers"] = self.get_headers(authorize=authorize,
+                                                 authorize_as=authorize_as)
+        key = request_key(endpoint, kwargs["headers"], kwargs)
+        if key is None:
+            return self._make_request(self.backend.get, endpoint, authorize,
+                                      authorize_as, expect, **kwargs)
+        start = time.perf_counter()
+        response, shared = self.coalescer.call(key, lambda: (
+            self._make_request(self.backend.get, endpoint, authorize,
+                               authorize_as, **kwargs)))
+        if shared:
+            self.response = response
+            metrics = RequestMetrics("GET", endpoint)
+            metrics.status = response.status_code
+            metrics.network_time = time.perf_counter() - start
+            metrics.coalesced = True
+            self._report(metrics)
+        if expect and (response.status_code != expect):
+            raise OICException(expect, response)
+        return response
 
     def post(self, endpoint, authorize=True, authorize_as=None,
              *args, **kwargs):
@@ -436,8 +715,12 @@ class Client:
         Other arguments are passed to requests module.
 
         """
-        return self._make_request(requests.post, endpoint, authorize,
-                                  authorize_as, *args, **kwargs)
+        try:
+            return self._make_request(self.backend.post, endpoint, authorize,
+                                      authorize_as, *args, **kwargs)
+        finally:
+            if not _READ_ONLY_POST.search(endpoint):
+                self._written()
 
     def put(self, endpoint, authorize=True, authorize_as=None,
             *args, **kwargs):
@@ -450,8 +733,11 @@ class Client:
         Other arguments are passed to requests module.
 
         """
-        return self._make_request(requests.put, endpoint, authorize,
-                                  authorize_as, *args, **kwargs)
+        try:
+            return self._make_request(self.backend.put, endpoint, authorize,
+                                      authorize_as, *args, **kwargs)
+        finally:
+            self._written()
 
     def delete(self, endpoint, authorize=True, authorize_as=None,
                *args, **kwargs):
@@ -464,5 +750,8 @@ class Client:
         Other arguments are passed to requests module.
 
         """
-        return self._make_request(requests.delete, endpoint, authorize,
-                                  authorize_as, *args, **kwargs)
+        try:
+            return self._make_request(self.backend.delete, endpoint, authorize,
+                                      authorize_as, *args, **kwargs)
+        finally:
+            self._written()
@@ -0,0 +1,152 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Coalescing of concurrent identical GET requests (single-flight).
+
+When several threads request the same resource with the same
+credentials at the same time, only the first one (the leader) sends a
+request. The others wait for it and receive the same response object,
+including its parsed body in response.data, which must not be
+modified. Requests sent after a write through the same client start a
+new flight, so a thread reads its own writes.
+"""
+
+import threading
+
+
+def request_key(endpoint, headers, kwargs):
+    """Return a hashable key identifying a GET request, None if unknown.
+
+    Args:
+    ----------
+    endpoint: Endpoint without the API root.
+    headers: Request headers, including the authorization.
+    kwargs: Other arguments for the request, e.g. params.
+
+    """
+    try:
+        key = (endpoint, _freeze(headers), _freeze(kwargs))
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def _freeze(value):
+    """Return value with dictionaries and lists converted to tuples."""
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item))
+                            for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+# pylint: disable=too-few-public-methods
+# Holds the outcome of one request
+class _Flight:
+    """A request in progress and its outcome."""
+
+    __slots__ = ("done", "finished", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        # False if the leader was interrupted, e.g. by KeyboardInterrupt
+        self.finished = False
+        self.result = None
+        self.error = None
+
+
+class RequestCoalescer:
+    """Share the outcome of concurrent calls with equal keys.
+
+    Attributes:
+    ----------
+    calls: Number of calls made by leaders.
+    saved: Number of calls that waited for a leader instead.
+    """
+
+    def __init__(self):
+        """Create coalescer without flights in progress."""
+        self.calls = 0
+        self.saved = 0
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def __getstate__(self):
+        return {"calls": self.calls, "saved": self.saved}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def call(self, key, func):
+        """Return (result, shared) of func, called once per flight of key.
+
+        shared is True if the result of a concurrent call was used.
+        Exceptions raised by func are raised in all waiting threads. If
+        the leader is interrupted by other BaseExceptions, the waiting
+        threads call func again.
+        """
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                if flight is None:
+                    flight = self._flights[key] = _Flight()
+                    self.calls += 1
+                    break
+                self.saved += 1
+            flight.done.wait()
+            if flight.finished:
+                if flight.error is not None:
+                    raise flight.error
+                return flight.result, True
+            with self._lock:
+                self.saved -= 1
+        try:
+            flight.result = func()
+            flight.finished = True
+        except Exception as error:
+            flight.error = error
+            flight.finished = True
+            raise
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.done.set()
+        return flight.result, False
+
+    def forget(self):
+        """Let later calls start new flights instead of joining current ones.
+
+        Called after writes, as flights in progress may have read the
+        state before the write.
+        """
+        with self._lock:
+            self._flights = {}
@@ -28,9 +28,16 @@
 """Tools for building search queries."""
 
 import datetime
+import statistics
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 from oisp.device import Device
-from oisp.utils import underscore_to_camel, timestamp_in_ms
+from oisp.profiling import profiled
+from oisp.utils import underscore_to_camel, timestamp_in_ms, ms_to_datetime
 
 
 # pylint: disable=too-few-public-methods
@@ -90,13 +97,16 @@ class DataQuery:
         if isinstance(self.to, datetime.datetime):
             payload_dict["to"] = timestamp_in_ms(self.to)
         # instead of device_ids device objects can be used
-        for i, dev in enumerate(payload_dict.get("device_ids", [])):
-            if isinstance(dev, Device):
-                payload_dict["device_ids"][i] = dev.device_id
+        if payload_dict.get("deviceIds") is not None:
+            payload_dict["deviceIds"] = [
+                dev.device_id if isinstance(dev, Device) else dev
+                for dev in payload_dict["deviceIds"]]
 
         return payload_dict
 
 
+# pylint: disable=too-many-instance-attributes
+# Timestamps are kept both as milliseconds and as datetime objects
 class QueryResponse:
     """Class to manage data search responses."""
 
@@ -121,40 +131,323 @@ class QueryResponse:
         assert account.account_id == json_dict.get("accountId"), """
         Account ID mismatch."""
 
-        # datetime uses timestamps in seconds, the service in ms
-        start_ts = json_dict.get("startTimestamp") / 1e3
-        end_ts = json_dict.get("endTimestamp") / 1e3
-        self.start_time = datetime.datetime.fromtimestamp(start_ts)
-        self.end_time = datetime.datetime.fromtimestamp(end_ts)
+        self.start_timestamp = int(json_dict.get("startTimestamp"))
+        self.end_timestamp = int(json_dict.get("endTimestamp"))
+        self.start_time = ms_to_datetime(self.start_timestamp)
+        self.end_time = ms_to_datetime(self.end_timestamp)
 
-        self._parse_samples()
+        self._samples = None
+        self._aggregates = None
 
-    def _parse_samples(self):
-        self.samples = []
-        data = self.json_dict.get("data", [])
-        for device_dict in data:
+    @property
+    def samples(self):
+        """List of Sample objects, created when first accessed."""
+        if self._samples is None:
+            self._samples = self._parse_samples()
+        return self._samples
+
+    def _iter_components(self):
+        """Yield raw sample columns for every component with samples.
+
+        Yields (device_id, component_id, data_type, timestamps, values)
+        tuples, timestamps and values are lists as returned by the service.
+        """
+        for device_dict in self.json_dict.get("data", []):
             device_id = device_dict["deviceId"]
             for component_dict in device_dict.get("components"):
                 if "samples" not in component_dict.keys():
                     continue
-                component_id = component_dict["componentId"]
-                date_type = component_dict["dataType"]
-                ts_i = component_dict["samplesHeader"].index("Timestamp")
-                val_i = component_dict["samplesHeader"].index("Value")
-                for sample_list in component_dict.get("samples", []):
-                    timestamp = sample_list[ts_i]
-                    value = sample_list[val_i]
-                    if date_type == QueryResponse.DATATYPE_NUMBER:
-                        value = float(value)
-                    # datetime uses timestamps in seconds, the service in ms
-                    timestamp = float(timestamp)/1e3
-                    on = datetime.datetime.fromtimestamp(timestamp)
-                    sample = Sample(self, device_id, component_id, value, on)
-                    self.samples.append(sample)
+                header = component_dict["samplesHeader"]
+                ts_i = header.index("Timestamp")
+                val_i = header.index("Value")
+                samples = component_dict["samples"]
+                yield (device_id, component_dict["componentId"],
+                       component_dict["dataType"],
+                       [sample_list[ts_i] for sample_list in samples],
+                       [sample_list[val_i] for sample_list in samples])
+
+    @profiled("query.parse_samples")
+    def _parse_samples(self):
+        samples = []
+        for (device_id, component_id, data_type,
+             timestamps, values) in self._iter_components():
+            if data_type == QueryResponse.DATATYPE_NUMBER:
+                values = map(float, values)
+            # Timestamps stay integer milliseconds, Sample.on converts
+            # them to datetime objects when accessed
+            samples.extend(Sample(self, device_id, component_id, value,
+                                  int(timestamp))
+                           for timestamp, value in zip(timestamps, values))
+        return samples
+
+    def rows(self):
+        """Yield (device_id, component_id, timestamp, value) tuples.
+
+        Rows are created directly from the response, without creating
+        Sample objects. Timestamps are in milliseconds, values of numeric
+        components are converted to float.
+        """
+        for (device_id, component_id, data_type,
+             timestamps, values) in self._iter_components():
+            if data_type == QueryResponse.DATATYPE_NUMBER:
+                values = map(float, values)
+            for timestamp, value in zip(timestamps, values):
+                yield device_id, component_id, int(timestamp), value
+
+    @property
+    def aggregates(self):
+        """Dictionary mapping (device_id, component_id) to Aggregate.
+
+        Aggregates returned by the service (see DataQuery aggregations)
+        are used if present, otherwise they are computed from the samples
+        of numeric components.
+        """
+        if self._aggregates is None:
+            self._aggregates = self._parse_aggregates()
+        return self._aggregates
+
+    def has_server_aggregates(self):
+        """Return whether the service included aggregates in the response."""
+        return any(Aggregate.FIELDS[0] in component_dict
+                   for device_dict in self.json_dict.get("data", [])
+                   for component_dict in device_dict.get("components"))
+
+    @profiled("query.parse_aggregates")
+    def _parse_aggregates(self):
+        aggregates = {}
+        for device_dict in self.json_dict.get("data", []):
+            device_id = device_dict["deviceId"]
+            for component_dict in device_dict.get("components"):
+                key = (device_id, component_dict["componentId"])
+                if Aggregate.FIELDS[0] in component_dict:
+                    aggregates[key] = Aggregate.from_json(component_dict)
+        for (device_id, component_id, data_type,
+             timestamps, values) in self._iter_components():
+            key = (device_id, component_id)
+            if (key not in aggregates and
+                    data_type == QueryResponse.DATATYPE_NUMBER):
+                aggregates[key] = Aggregate.from_values(
+                    values, start=min(timestamps, default=None,
+                                      key=float))
+        return aggregates
+
+    def downsample(self, interval):
+        """Aggregate numeric samples in windows of interval milliseconds.
+
+        The service does not provide windowed aggregation, so this is
+        computed locally (vectorized if NumPy is installed).
+        Returns a dictionary mapping (device_id, component_id) to a list
+        of Aggregate objects sorted by start timestamp. Windows without
+        samples are omitted.
+        """
+        windows = {}
+        for (device_id, component_id, data_type,
+             timestamps, values) in self._iter_components():
+            if data_type != QueryResponse.DATATYPE_NUMBER or not values:
+                continue
+            windows[(device_id, component_id)] = _downsample(
+                timestamps, values, interval)
+        return windows
+
+    @profiled("query.columns")
+    def _columns(self, as_datetime):
+        """Return a dictionary of NumPy arrays, one for each column.
+
+        device_id and component_id are returned as (codes, names)
+        tuples to allow building categorical columns.
+        """
+        # pylint: disable=too-many-locals
+        # Building all columns in one pass keeps them aligned
+        if np is None:
+            raise ImportError("NumPy is required for data frame export")
+        components = list(self._iter_components())
+        counts = [len(c[3]) for c in components]
+        columns = {}
+        for i, name in enumerate(["device_id", "component_id"]):
+            categories = sorted({c[i] for c in components})
+            index = {category: j for j, category in enumerate(categories)}
+            columns[name] = (np.repeat(np.array([index[c[i]]
+                                                 for c in components],
+                                                dtype=np.int32), counts),
+                             categories)
+
+        timestamps = np.array([ts for c in components for ts in c[3]],
+                              dtype=np.int64)
+        if as_datetime:
+            timestamps = timestamps.astype("datetime64[ms]")
+        columns["on"] = timestamps
+
+        if all(c[2] == QueryResponse.DATATYPE_NUMBER for c in components):
+            columns["value"] = np.array([v for c in components for v in c[4]],
+                                        dtype=np.float64)
+        else:
+            columns["value"] = np.empty(len(timestamps), dtype=object)
+            start = 0
+            for component, count in zip(components, counts):
+                data_type, values = component[2], component[4]
+                if data_type == QueryResponse.DATATYPE_NUMBER:
+                    values = np.array(values, dtype=np.float64)
+                columns["value"][start:start + count] = values
+                start += count
+        return columns
+
+    def to_pandas(self, as_datetime=True):
+        """Return samples as a pandas DataFrame.
+
+        The frame is built directly from the response, without creating
+        Sample objects. Columns are device_id, component_id (categorical),
+        on (datetime64[ms], or int64 milliseconds if as_datetime is
+        False) and value (float64 if all components are numeric, object
+        otherwise).
+        """
+        # pylint: disable=import-outside-toplevel
+        # pandas is an optional dependency
+        import pandas as pd
+
+        columns = self._columns(as_datetime)
+        for name in ["device_id", "component_id"]:
+            codes, categories = columns[name]
+            columns[name] = pd.Categorical.from_codes(codes, categories)
+        return pd.DataFrame(columns)
+
+    def to_arrow(self, as_datetime=True):
+        """Return samples as a pyarrow Table.
+
+        Columns match those of to_pandas, device_id and component_id are
+        dictionary encoded, on is timestamp[ms] (or int64). Values of
+        non-numeric components are converted to strings if they can not
+        be stored in a single arrow column otherwise.
+        """
+        # pylint: disable=import-outside-toplevel
+        # pyarrow is an optional dependency
+        import pyarrow as pa
 
+        columns = self._columns(as_datetime)
+        for name in ["device_id", "component_id"]:
+            codes, categories = columns[name]
+            columns[name] = pa.DictionaryArray.from_arrays(
+                codes, pa.array(categories, type=pa.string()))
+        try:
+            columns["value"] = pa.array(columns["value"])
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            columns["value"] = pa.array([str(v) for v in columns["value"]],
+                                        type=pa.string())
+        return pa.table(columns)
 
+
+class Aggregate:
+    """Summary statistics for the samples of a component.
+
+    Attributes match the aggregate fields of the service response:
+    count, min, max, average, std (population standard deviation) and
+    summation. start is the timestamp (ms) of the first sample or the
+    beginning of the window, if known.
+    """
+
+    FIELDS = ["count", "min", "max", "average", "std", "summation"]
+
+    # pylint: disable=too-many-arguments
+    # One argument per statistic
+    def __init__(self, count, min_, max_, average, std, summation,
+                 start=None):
+        """Create an Aggregate object."""
+        self.count = count
+        self.min = min_
+        self.max = max_
+        self.average = average
+        self.std = std
+        self.summation = summation
+        self.start = start
+
+    @staticmethod
+    def from_json(component_dict):
+        """Create an Aggregate from a component in a search response."""
+        def number(key):
+            value = component_dict.get(key)
+            return float(value) if value is not None else None
+
+        count = component_dict.get("count")
+        return Aggregate(int(count) if count is not None else None,
+                         number("min"), number("max"), number("average"),
+                         number("std"), number("summation"))
+
+    @staticmethod
+    def from_values(values, start=None):
+        """Compute an Aggregate from a sequence of numeric values."""
+        if np is not None:
+            values = np.asarray(values, dtype=np.float64)
+            if not values.size:
+                return Aggregate(0, None, None, None, None, 0.0, start)
+            return Aggregate(int(values.size), float(values.min()),
+                             float(values.max()), float(values.mean()),
+                             float(values.std()), float(values.sum()),
+                             start)
+        values = [float(v) for v in values]
+        if not values:
+            return Aggregate(0, None, None, None, None, 0.0, start)
+        return Aggregate(len(values), min(values), max(values),
+                         statistics.fmean(values), statistics.pstdev(values),
+                         sum(values), start)
+
+    def json(self):
+        """Return a JSON dictionary with the service's field names."""
+        json_dict = {field: getattr(self, field) for field in self.FIELDS}
+        if self.start is not None:
+            json_dict["start"] = self.start
+        return json_dict
+
+    def __eq__(self, other):
+        if not isinstance(other, Aggregate):
+            return NotImplemented
+        return self.json() == other.json()
+
+    def __str__(self):
+        return "Aggregate | count: {}\tmin: {}\tmax: {}\taverage: {}".format(
+            self.count, self.min, self.max, self.average)
+
+
+# pylint: disable=too-many-locals
+# One array is needed per statistic
+def _downsample(timestamps, values, interval):
+    """Return Aggregate objects for values in windows of interval ms."""
+    if np is None:
+        buckets = {}
+        for timestamp, value in zip(timestamps, values):
+            start = int(float(timestamp)) // interval * interval
+            buckets.setdefault(start, []).append(value)
+        return [Aggregate.from_values(buckets[start], start=start)
+                for start in sorted(buckets)]
+
+    timestamps = np.asarray(timestamps, dtype=np.float64).astype(np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    order = np.argsort(timestamps, kind="stable")
+    starts = timestamps[order] // interval * interval
+    values = values[order]
+    window_starts, first, counts = np.unique(starts, return_index=True,
+                                             return_counts=True)
+    sums = np.add.reduceat(values, first)
+    means = sums / counts
+    deviations = (values - np.repeat(means, counts))**2
+    stds = np.sqrt(np.add.reduceat(deviations, first) / counts)
+    mins = np.minimum.reduceat(values, first)
+    maxs = np.maximum.reduceat(values, first)
+    return [Aggregate(*row) for row in zip(counts.tolist(), mins.tolist(),
+                                           maxs.tolist(), means.tolist(),
+                                           stds.tolist(), sums.tolist(),
+                                           window_starts.tolist())]
+
+
+# pylint: disable=too-many-instance-attributes
+# Attributes match those of a sample in the service response
 class Sample:
-    """Class representing a single datapoint."""
+    """Class representing a single datapoint.
+
+    timestamp holds the time of the sample in milliseconds, the on
+    property the same as a (naive, UTC) datetime object.
+    """
+
+    __slots__ = ["response", "device_id", "component_id", "value",
+                 "timestamp", "loc", "_on", "_device"]
 
     # pylint: disable=too-many-arguments
     def __init__(self, response, device_id, component_id, value, on, loc=None):
@@ -166,19 +459,29 @@ class Sample:
         device_id: As returned by the service.
         component_id: As returned by the service.
         value: Sample value, converted to correct type
-        on: timestamp (in microseconds) or datetime object
+        on: timestamp (in milliseconds) or datetime object
         loc (optional): location as iterable with 2 or 3 elements.
         """
         self.response = response
         self.device_id = device_id
         self.component_id = component_id
         self.value = value
-        if not isinstance(on, datetime.datetime):
-            on = datetime.datetime.fromtimestamp(float(on)/10e6)
-        self.on = on
+        if isinstance(on, datetime.datetime):
+            self.timestamp = timestamp_in_ms(on)
+            self._on = on
+        else:
+            self.timestamp = int(on)
+            self._on = None
         self.loc = loc
         self._device = None
 
+    @property
+    def on(self):
+        """Time of the sample as datetime object, created when accessed."""
+        if self._on is None:
+            self._on = ms_to_datetime(self.timestamp)
+        return self._on
+
     @property
     def device(self):
         """Device object got using device_id.
@@ -192,3 +495,41 @@ class Sample:
 
     def __str__(self):
         return "{}:{}".format(self.on, self.value)
+
+
+class ComponentSamples:
+    """Samples of one component, as yielded by streaming searches.
+
+    timestamps (ms) and values are lists as returned by the service,
+    samples creates Sample objects for them.
+    """
+
+    # pylint: disable=too-many-arguments
+    # Arguments match the component fields of the service response
+    def __init__(self, account, device_id, component_id, data_type,
+                 timestamps, values):
+        """Create ComponentSamples object."""
+        self.account = account
+        self.device_id = device_id
+        self.component_id = component_id
+        self.data_type = data_type
+        self.timestamps = timestamps
+        self.values = values
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def rows(self):
+        """Yield (device_id, component_id, timestamp, value) tuples."""
+        values = self.values
+        if self.data_type == QueryResponse.DATATYPE_NUMBER:
+            values = map(float, values)
+        for timestamp, value in zip(self.timestamps, values):
+            yield self.device_id, self.component_id, int(timestamp), value
+
+    @property
+    def samples(self):
+        """List of Sample objects."""
+        return [Sample(self, device_id, component_id, value, timestamp)
+                for device_id, component_id, timestamp, value
+                in self.rows()]
@@ -26,10 +26,13 @@
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """Methods for IoT Analytics device management and data submission."""
 from datetime import datetime
+import threading
 import uuid
 
+from oisp import bulk
+from oisp.profiling import profiled
 from oisp.utils import (camel_to_underscore, underscore_to_camel,
-                        timestamp_in_ms)
+                        timestamp_in_ms, ms_to_datetime)
 
 
 # pylint: disable=too-many-instance-attributes
@@ -38,7 +41,8 @@ class Device:
     """Class managing device activation, components, and attributes.
 
     To find or filter devices connected to an account, refer to the
-    Account class.
+    Account class. Samples can be added and submitted from multiple
+    threads.
     """
 
     STATUS_CREATED = "created"
@@ -63,7 +67,7 @@ class Device:
         if client is None:
             client = account.client
         if not isinstance(created, datetime) and created is not None:
-            created = datetime.fromtimestamp(created / 1e3)
+            created = ms_to_datetime(created)
 
         self.client = client
         self.account = account
@@ -78,8 +82,27 @@ class Device:
         self.tags = tags
         self.loc = loc
         self.device_token = device_token
+        # Alternative to HTTP for submit_data, e.g. oisp.mqtt.MqttTransport
+        self.transport = None
+        # Component id -> oisp.filters.SampleFilter, see add_sample
+        self.filters = {}
+        # Component id -> oisp.window.WindowAggregator, see add_sample
+        self.aggregators = {}
 
         self.unsent_data = []
+        # Guards swapping unsent_data, see add_sample and submit_data
+        self._data_lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_data_lock"]
+        # Connections can not be copied
+        state["transport"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._data_lock = threading.Lock()
 
     def __eq__(self, other):
         if not isinstance(other, Device):
@@ -107,11 +130,12 @@ class Device:
         device = Device(client=client,
                         account=account,
                         device_token=device_token,
-                        device_id=json_dict.pop("deviceId"))
+                        device_id=json_dict["deviceId"])
         # pylint: disable=protected-access
         device._update_with_json(json_dict)
         return device
 
+    @profiled("device.update_with_json")
     def _update_with_json(self, json_dict):
         """Update attributes according to json_dict.
 
@@ -124,7 +148,7 @@ class Device:
 
         created = py_dict.get("created")
         if not isinstance(created, datetime) and created is not None:
-            py_dict["created"] = datetime.fromtimestamp(created / 1e3)
+            py_dict["created"] = ms_to_datetime(created)
         if "loc" in py_dict:
             py_dict["loc"] = list(map(float, py_dict["loc"]))
         self.__dict__.update(py_dict)
@@ -250,6 +274,7 @@ class Device:
         resp = self.client.get(self.url, authorize_as=authToken, expect=200)
         self._update_with_json(resp.json())
 
+    @profiled("device.add_sample")
     def add_sample(self, component_id, value, on=None, loc=None):
         """Add a single datapoint.
 
@@ -260,34 +285,74 @@ class Device:
         ----------
         component_id: Id of the component datapoint belongs to.
         value: Value of datapoint.
-        on (optional): Timestamp in milliseconds, if this is omitted,
-        current time will be used instead.
+        on (optional): Timestamp in milliseconds or datetime object, if
+        this is omitted, current time will be used instead.
         location (optional): Location of the device as the data
         was recorded.
+
+        If a filter is set for the component in filters, the sample is
+        only added if the filter accepts it. Returns whether the sample
+        was added. If an aggregator is set for the component in
+        aggregators, the sample is added to its current window, and
+        samples of closed windows are added to unsent_data.
         """
         if on is None:
             on = timestamp_in_ms()
-        datapoint = {"componentId": component_id,
-                     "value": value,
-                     "on": on}
-        if loc is not None:
-            datapoint["loc"] = loc
-        self.unsent_data.append(datapoint)
+        elif isinstance(on, datetime):
+            on = timestamp_in_ms(on)
+        with self._data_lock:
+            sample_filter = self.filters.get(component_id)
+            if sample_filter is not None and \
+                    not sample_filter.accept(value, on):
+                return False
+            aggregator = self.aggregators.get(component_id)
+            if aggregator is not None:
+                closed = aggregator.add(value, on)
+                if closed is not None:
+                    self.unsent_data.extend(aggregator.samples(component_id,
+                                                               closed))
+                if not aggregator.forward_raw:
+                    return True
+            datapoint = {"componentId": component_id,
+                         "value": value,
+                         "on": on}
+            if loc is not None:
+                datapoint["loc"] = loc
+            self.unsent_data.append(datapoint)
+        return True
+
+    def flush_aggregators(self):
+        """Add samples of all open aggregation windows to unsent_data.
+
+        Windows are closed before they ended, call this e.g. before
+        submitting data for the last time.
+        """
+        with self._data_lock:
+            self._flush_aggregators()
+
+    def _flush_aggregators(self, now=None):
+        for component_id, aggregator in self.aggregators.items():
+            closed = aggregator.flush(now)
+            if closed is not None:
+                self.unsent_data.extend(aggregator.samples(component_id,
+                                                           closed))
 
+    @profiled("device.submit_data")
     def submit_data(self, on=None):
         """Submit data.
 
         Data needs to be added using the add_datapoint method before.
+        Samples added by other threads while submitting are kept for the
+        next call. If the request fails, the submitted samples are put
+        back into unsent_data.
+        If transport is set, data is published using the transport
+        instead of a HTTP request.
 
         Args:
         ----------
         on (optional): Timestamp in milliseconds, if this is omitted,
         current time will be used instead.
         """
-        payload = {"on": timestamp_in_ms(on),
-                   "accountId": self.domain_id,
-                   "data": self.unsent_data}
-
         # If there is an account, we can POST to device URL
         if self.auth_as is None:
             url = self.url
@@ -295,7 +360,51 @@ class Device:
                           """not supported.""")
         # Otherwise we need to use the alternative /data/.* URL
         url = "/data/{}".format(self.device_id)
-        self.client.post(url, data=payload, authorize_as=self.auth_as,
-                         expect=201)
 
-        self.unsent_data = []
+        with self._data_lock:
+            if self.aggregators:
+                self._flush_aggregators(timestamp_in_ms())
+            data, self.unsent_data = self.unsent_data, []
+        payload = {"on": timestamp_in_ms(on),
+                   "accountId": self.domain_id,
+                   "data": data}
+        try:
+            if self.transport is not None:
+                payload["did"] = self.device_id
+                self.transport.publish(payload)
+            else:
+                self.client.post(url, data=payload,
+                                 authorize_as=self.auth_as, expect=201)
+        except BaseException:
+            with self._data_lock:
+                self.unsent_data[:0] = data
+            raise
+
+    def submit_arrays(self, timestamps, columns, **kwargs):
+        """Submit column oriented data in concurrent chunks.
+
+        This is meant for backfilling large amounts of data, samples are
+        neither added to nor removed from unsent_data.
+        Returns the number of submitted samples.
+
+        Args:
+        ----------
+        timestamps: Sequence or NumPy array of timestamps (in ms,
+        datetime or datetime64).
+        columns: Dictionary mapping component ids to sequences or NumPy
+        arrays of values, missing values (None, NaN) are skipped.
+        max_samples, max_bytes (optional): Limits for a single request.
+        max_workers (optional): Number of concurrent requests.
+        """
+        return bulk.submit_arrays(self, timestamps, columns, **kwargs)
+
+    def submit_dataframe(self, frame, timestamp_column=None, **kwargs):
+        """Submit a pandas DataFrame in concurrent chunks.
+
+        Every column except timestamp_column has to be named after
+        a component id. If timestamp_column is None, the index is used
+        for timestamps. See submit_arrays for further arguments.
+        """
+        return bulk.submit_dataframe(self, frame,
+                                     timestamp_column=timestamp_column,
+                                     **kwargs)
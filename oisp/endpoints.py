@@ -0,0 +1,231 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Health tracking and selection of multiple API roots.
+
+A Client created with a list of API roots sends each request to the
+endpoint with the lowest expected latency, an exponentially weighted
+moving average (EWMA) of its response times multiplied by the number
+of requests in flight plus one. Endpoints without measurements are
+expected to be as fast as the mean of the others. Estimates of idle
+endpoints fade, so they are tried again after a while, but never go
+below min_latency, so requests in flight are always taken into
+account.
+
+Endpoints failing max_failures times in a row (no response or a 502,
+503 or 504 status) are ejected for ejection_time seconds, doubled on
+each further ejection up to max_ejection_time. After that, they are
+selected again and re-admitted on the first success, a single failure
+ejects them again.
+
+Example:
+----------
+    client = oisp.Client(["https://a.example.com/v1/api",
+                          "https://b.example.com/v1/api"])
+    print(client.endpoints.stats())
+
+"""
+
+import math
+import threading
+import time
+
+
+# pylint: disable=too-many-instance-attributes
+# Health state and counters are kept as attributes
+class Endpoint:
+    """Health state of one API root, changed only by EndpointPool."""
+
+    def __init__(self, url):
+        """Create a healthy endpoint without latency estimate."""
+        self.url = url
+        self.ewma = None
+        self.updated = None
+        self.in_flight = 0
+        self.failures = 0
+        self.ejections = 0
+        # Ejections since the last success, doubling the ejection time
+        self.backoff = 0
+        self.ejected_until = None
+        self.requests = 0
+        self.errors = 0
+
+    def ejected(self, now):
+        """Return whether the endpoint is ejected at monotonic time now."""
+        return self.ejected_until is not None and now < self.ejected_until
+
+    def latency(self, now, decay, default, floor):
+        """Return the latency estimate, fading with time since the update.
+
+        default is used without measurements, the estimate is at least
+        floor.
+        """
+        if self.ewma is None:
+            return max(default, floor)
+        return max(self.ewma * math.exp(-(now - self.updated) / decay),
+                   floor)
+
+    def __repr__(self):
+        return "Endpoint({!r})".format(self.url)
+
+
+class EndpointPool:
+    """Select API roots by latency, ejecting failing ones.
+
+    A pool can be shared by multiple threads.
+    """
+
+    # pylint: disable=too-many-arguments
+    # All arguments are tuning parameters
+    def __init__(self, urls, alpha=0.3, decay=30.0, max_failures=3,
+                 ejection_time=10.0, max_ejection_time=300.0,
+                 min_latency=0.001):
+        """Create pool for urls.
+
+        Args:
+        ----------
+        urls: API roots, e.g. "https://oisp.example.com/v1/api".
+        alpha (optional): Weight of a new response time in the EWMA.
+        decay (optional): Seconds after which the estimate of an idle
+        endpoint has faded to 1/e.
+        max_failures (optional): Consecutive failures ejecting an
+        endpoint.
+        ejection_time (optional): Seconds of the first ejection.
+        max_ejection_time (optional): Maximum seconds of an ejection.
+        min_latency (optional): Lower bound of latency estimates in
+        seconds.
+
+        """
+        if not urls:
+            raise ValueError("At least one API root is required")
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.alpha = alpha
+        self.decay = decay
+        self.max_failures = max_failures
+        self.ejection_time = ejection_time
+        self.max_ejection_time = max_ejection_time
+        self.min_latency = min_latency
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    def select(self, exclude=()):
+        """Return the best endpoint not in exclude, counting it in flight.
+
+        If all endpoints are ejected, the one re-admitted next is
+        returned. Every selected endpoint has to be passed to release.
+        """
+        now = time.monotonic()
+        with self._lock:
+            candidates = [e for e in self.endpoints if e not in exclude]
+            healthy = [e for e in candidates if not e.ejected(now)]
+            if healthy:
+                measured = [e.ewma for e in self.endpoints
+                            if e.ewma is not None]
+                default = (sum(measured) / len(measured) if measured
+                           else self.min_latency)
+                endpoint = min(healthy, key=lambda e: (
+                    e.latency(now, self.decay, default, self.min_latency)
+                    * (e.in_flight + 1)))
+            else:
+                endpoint = min(candidates, key=lambda e: e.ejected_until)
+            endpoint.in_flight += 1
+            endpoint.requests += 1
+        return endpoint
+
+    def release(self, endpoint, latency=None, failed=False):
+        """Record the outcome of a request to a selected endpoint.
+
+        Args:
+        ----------
+        endpoint: Endpoint returned by select.
+        latency (optional): Seconds until the response was received,
+        None if there was no response.
+        failed (optional): Whether no response or a gateway error was
+        received. If not failed and latency is None, the request says
+        nothing about the endpoint and is only no longer in flight.
+
+        """
+        now = time.monotonic()
+        with self._lock:
+            endpoint.in_flight -= 1
+            if not failed and latency is None:
+                return
+            if failed:
+                endpoint.errors += 1
+                endpoint.failures += 1
+                if endpoint.failures >= self.max_failures:
+                    self._eject(endpoint, now)
+                return
+            if endpoint.ejected_until is not None:
+                # Re-admitted after the ejection ended
+                endpoint.ejected_until = None
+                endpoint.backoff = 0
+            endpoint.failures = 0
+            if endpoint.ewma is None:
+                endpoint.ewma = latency
+            else:
+                endpoint.ewma += self.alpha * (latency - endpoint.ewma)
+            endpoint.updated = now
+
+    def _eject(self, endpoint, now):
+        duration = min(self.ejection_time * 2 ** endpoint.backoff,
+                       self.max_ejection_time)
+        endpoint.backoff += 1
+        endpoint.ejections += 1
+        endpoint.ejected_until = now + duration
+        # One more failure after re-admission ejects again
+        endpoint.failures = self.max_failures - 1
+
+    def healthy(self):
+        """Return the URLs of endpoints that are not ejected."""
+        now = time.monotonic()
+        with self._lock:
+            return [e.url for e in self.endpoints if not e.ejected(now)]
+
+    def stats(self):
+        """Return a list of dictionaries describing each endpoint."""
+        now = time.monotonic()
+        with self._lock:
+            return [{"url": e.url,
+                     "healthy": not e.ejected(now),
+                     "latency": e.ewma,
+                     "in_flight": e.in_flight,
+                     "requests": e.requests,
+                     "errors": e.errors,
+                     "ejections": e.ejections}
+                    for e in self.endpoints]
@@ -0,0 +1,392 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Export of account data to compressed files, resumable.
+
+Data is searched in time windows (and groups of devices) concurrently,
+every window is written to its own file: gzip compressed CSV or NDJSON,
+or Parquet (requires pyarrow). Finished windows are recorded in a
+checkpoint file, an interrupted export continues with the missing
+windows when started again. Windows are streamed to their files, at
+most one chunk of samples per window in progress is held in memory.
+Run oisp-export --help for options, e.g.
+
+    oisp-export --api-url https://example.com/v1/api \
+        --username user@example.com --password secret \
+        --from 2020-01-01 --to 2020-02-01 --window 1d --format csv \
+        --output-dir export
+
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import csv
+import datetime
+import gzip
+import json
+import os
+import sys
+
+from oisp.client import Client
+from oisp.data_query import ComponentSamples, DataQuery, QueryResponse
+from oisp.utils import timestamp_in_ms
+
+FORMATS = {"csv": ".csv.gz", "ndjson": ".ndjson.gz", "parquet": ".parquet"}
+CHECKPOINT_FILE = "checkpoint.json"
+_CHUNK_SIZE = 10000
+_UNITS = {"ms": 1, "s": 1000, "m": 60 * 1000, "h": 60 * 60 * 1000,
+          "d": 24 * 60 * 60 * 1000}
+
+
+def parse_duration(text):
+    """Return milliseconds for durations like 500ms, 30s, 15m, 6h or 1d.
+
+    Plain numbers are milliseconds.
+    """
+    text = text.strip()
+    for unit in sorted(_UNITS, key=len, reverse=True):
+        if text.endswith(unit) and text[:-len(unit)]:
+            return int(float(text[:-len(unit)]) * _UNITS[unit])
+    return int(text)
+
+
+def parse_time(text):
+    """Return milliseconds for a timestamp in ms or an ISO 8601 date.
+
+    Dates without timezone are interpreted as UTC.
+    """
+    try:
+        return int(text)
+    except ValueError:
+        moment = datetime.datetime.fromisoformat(text)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    return timestamp_in_ms(moment)
+
+
+def _rows(chunks):
+    for chunk in chunks:
+        yield from chunk.rows()
+
+
+def _write_csv(path, search):
+    with gzip.open(path, "wt", encoding="utf-8", newline="") as out:
+        writer = csv.writer(out)
+        writer.writerow(["device_id", "component_id", "timestamp", "value"])
+        count = 0
+        for row in _rows(search()):
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def _write_ndjson(path, search):
+    with gzip.open(path, "wt", encoding="utf-8") as out:
+        count = 0
+        for device_id, component_id, timestamp, value in _rows(search()):
+            if isinstance(value, (bytes, bytearray)):
+                value = value.hex()
+            out.write(json.dumps({"deviceId": device_id,
+                                  "componentId": component_id,
+                                  "on": timestamp, "value": value}))
+            out.write("\n")
+            count += 1
+    return count
+
+
+class _MixedTypes(Exception):
+    """Values of a window do not fit in a single Parquet column."""
+
+
+def _arrow_chunk(chunk, as_string):
+    """Return a pyarrow Table for the samples of a ComponentSamples."""
+    # pylint: disable=import-outside-toplevel, import-error
+    # pyarrow is an optional dependency
+    import pyarrow as pa
+    count = len(chunk.timestamps)
+    codes = pa.array([0] * count, type=pa.int32())
+    columns = {name: pa.DictionaryArray.from_arrays(
+        codes, pa.array([ident], type=pa.string()))
+               for name, ident in [("device_id", chunk.device_id),
+                                   ("component_id", chunk.component_id)]}
+    columns["on"] = pa.array([int(ts) for ts in chunk.timestamps],
+                             type=pa.timestamp("ms"))
+    if as_string:
+        columns["value"] = pa.array([str(row[3]) for row in chunk.rows()],
+                                    type=pa.string())
+    elif chunk.data_type == QueryResponse.DATATYPE_NUMBER:
+        columns["value"] = pa.array([float(v) for v in chunk.values],
+                                    type=pa.float64())
+    else:
+        try:
+            columns["value"] = pa.array(chunk.values)
+        except (pa.ArrowInvalid, pa.ArrowTypeError) as exc:
+            raise _MixedTypes() from exc
+    return pa.table(columns)
+
+
+def _write_parquet_chunks(path, chunks, as_string):
+    # pylint: disable=import-outside-toplevel, import-error
+    # pyarrow is an optional dependency
+    import pyarrow.parquet as pq
+    writer = None
+    count = 0
+    try:
+        for chunk in chunks:
+            table = _arrow_chunk(chunk, as_string)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            elif table.schema != writer.schema:
+                raise _MixedTypes()
+            writer.write_table(table)
+            count += table.num_rows
+        if writer is None:
+            # Empty window, still written so that every window has a file
+            pq.write_table(_arrow_chunk(ComponentSamples(
+                None, None, None, QueryResponse.DATATYPE_NUMBER, [], []),
+                                        as_string), path)
+    finally:
+        if writer is not None:
+            writer.close()
+    return count
+
+
+def _write_parquet(path, search):
+    """Write a window to Parquet, one row group per streamed chunk.
+
+    A Parquet file has a single schema, so if a window mixes value types
+    it is searched again and all values are written as strings.
+    """
+    try:
+        return _write_parquet_chunks(path, search(), as_string=False)
+    except _MixedTypes:
+        return _write_parquet_chunks(path, search(), as_string=True)
+
+
+_WRITERS = {"csv": _write_csv, "ndjson": _write_ndjson,
+            "parquet": _write_parquet}
+
+
+# pylint: disable=too-many-instance-attributes
+# Export parameters are stored as attributes
+class Export:
+    """Export data of an account in windows, resuming from a checkpoint.
+
+    Files are named <window start>_<window end>_<device group>.<ext>
+    in directory. The checkpoint stores the export parameters, the list
+    of devices and the finished windows; it is only used if the
+    parameters match. If to is None, the export ends at the start of
+    the current window; this end is stored in the checkpoint and reused
+    when the export is resumed, also after the window has passed.
+    """
+
+    # pylint: disable=too-many-arguments
+    # All arguments are export parameters
+    def __init__(self, account, directory, from_, to, window=_UNITS["d"],
+                 fmt="csv", device_ids=None, devices_per_query=50,
+                 max_workers=4):
+        """Create an export, call run to start it.
+
+        Args:
+        ----------
+        account: Account to export data from.
+        directory: Output directory, created if necessary.
+        from_, to: Time range in ms (or datetime), to is exclusive.
+            to may be None, see above.
+        window (optional): Length of a window in ms.
+        fmt (optional): One of csv, ndjson or parquet.
+        device_ids (optional): Devices to export, default all.
+        devices_per_query (optional): Devices searched in one request.
+        max_workers (optional): Number of concurrent searches.
+
+        """
+        assert fmt in FORMATS, "Unknown format {}".format(fmt)
+        self.account = account
+        self.directory = directory
+        self.from_ = timestamp_in_ms(from_)
+        self.to = None if to is None else timestamp_in_ms(to)
+        self.window = window
+        self.fmt = fmt
+        self.device_ids = device_ids
+        self.devices_per_query = devices_per_query
+        self.max_workers = max_workers
+        self.checkpoint_file = os.path.join(directory, CHECKPOINT_FILE)
+        self.done = set()
+        self.rows = 0
+
+    def _parameters(self):
+        return {"accountId": self.account.account_id, "from": self.from_,
+                "to": self.to, "window": self.window, "format": self.fmt,
+                "devicesPerQuery": self.devices_per_query}
+
+    def _load_checkpoint(self):
+        """Return the device list of a matching checkpoint, or None."""
+        if not os.path.exists(self.checkpoint_file):
+            return None
+        with open(self.checkpoint_file, encoding="utf-8") as checkpoint:
+            state = json.load(checkpoint)
+        parameters = self._parameters()
+        if self.to is None:
+            parameters["to"] = state["parameters"]["to"]
+        if state["parameters"] != parameters:
+            return None
+        self.to = parameters["to"]
+        self.done = set(state["done"])
+        self.rows = state["rows"]
+        return state["devices"]
+
+    def _save_checkpoint(self, devices):
+        """Save the checkpoint, replacing it atomically."""
+        state = {"parameters": self._parameters(), "devices": devices,
+                 "done": sorted(self.done), "rows": self.rows}
+        tmp_file = self.checkpoint_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as checkpoint:
+            json.dump(state, checkpoint)
+        os.replace(tmp_file, self.checkpoint_file)
+
+    def tasks(self, devices):
+        """Yield (name, DataQuery) for every window and device group."""
+        groups = [devices[i:i + self.devices_per_query]
+                  for i in range(0, len(devices), self.devices_per_query)]
+        for start in range(self.from_, self.to, self.window):
+            end = min(start + self.window, self.to)
+            for i, group in enumerate(groups):
+                name = "{}_{}_{:04d}".format(start, end, i)
+                # Both ends of a search are inclusive
+                yield name, DataQuery(from_=start, to=end - 1,
+                                      device_ids=group)
+
+    def _export_window(self, name, query):
+        """Search data for a window and write it, return the row count.
+
+        Samples are streamed to the file in chunks of _CHUNK_SIZE.
+        """
+        def search():
+            return self.account.search_data_stream(query,
+                                                   chunk_size=_CHUNK_SIZE)
+
+        path = os.path.join(self.directory, name + FORMATS[self.fmt])
+        tmp_path = path + ".tmp"
+        count = _WRITERS[self.fmt](tmp_path, search)
+        os.replace(tmp_path, path)
+        return count
+
+    def run(self):
+        """Export all windows not finished yet.
+
+        Returns the number of rows exported in total, including those of
+        earlier runs.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        devices = self._load_checkpoint()
+        if devices is None:
+            if self.to is None:
+                self.to = timestamp_in_ms() // self.window * self.window
+            devices = sorted(self.device_ids or
+                             [device.device_id for device
+                              in self.account.get_devices()])
+            self.done = set()
+            self.rows = 0
+            self._save_checkpoint(devices)
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            pending = {}
+            for name, query in self.tasks(devices):
+                if name in self.done:
+                    continue
+                # Bound the number of queued windows
+                if len(pending) >= 2 * self.max_workers:
+                    self._finish(next(as_completed(pending)), pending,
+                                 devices)
+                pending[executor.submit(self._export_window, name,
+                                        query)] = name
+            while pending:
+                self._finish(next(as_completed(pending)), pending, devices)
+        return self.rows
+
+    def _finish(self, future, pending, devices):
+        """Record a finished window in the checkpoint."""
+        name = pending.pop(future)
+        count = future.result()
+        self.done.add(name)
+        self.rows += count
+        self._save_checkpoint(devices)
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="oisp-export",
+        description="Export data of an OISP account to files.")
+    parser.add_argument("--api-url", required=True,
+                        help="API root, e.g. http://localhost/v1/api")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--account",
+                        help="Account name or id (default: first account)")
+    # Required, a default of 0 would search every window since 1970
+    parser.add_argument("--from", dest="from_", type=parse_time,
+                        required=True,
+                        help="Start as ms timestamp or ISO date (UTC)")
+    parser.add_argument("--to", type=parse_time, default=None,
+                        help="End (exclusive), default now rounded down "
+                             "to a multiple of window, kept when resuming")
+    parser.add_argument("--window", type=parse_duration, default="1d",
+                        help="Window length, e.g. 6h or 1d")
+    parser.add_argument("--format", dest="fmt", default="csv",
+                        choices=sorted(FORMATS))
+    parser.add_argument("--device", dest="device_ids", action="append",
+                        help="Device to export (repeatable), default all")
+    parser.add_argument("--devices-per-query", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Concurrent searches")
+    parser.add_argument("--output-dir", required=True)
+    parser.add_argument("--no-verify", action="store_true",
+                        help="Do not verify TLS certificates")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run the export command line interface."""
+    args = _parse_args(argv)
+    client = Client(args.api_url, verify_certs=not args.no_verify)
+    client.auth(args.username, args.password)
+    accounts = [account for account in client.get_accounts()
+                if args.account in (None, account.name, account.account_id)]
+    if not accounts:
+        raise SystemExit("No matching account found")
+    export = Export(accounts[0], args.output_dir, args.from_, args.to,
+                    window=args.window, fmt=args.fmt,
+                    device_ids=args.device_ids,
+                    devices_per_query=args.devices_per_query,
+                    max_workers=args.workers)
+    rows = export.run()
+    print("Exported {} rows to {}".format(rows, args.output_dir),
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Filters reducing the number of samples submitted by a device.
+
+A SampleFilter assigned to a component in Device.filters decides in
+add_sample whether a sample is added to the upload buffer. Values are
+compared to the last reported (not the last seen) value, so slow drifts
+are reported once they exceed the dead-band.
+
+Example:
+----------
+    # Report changes larger than 0.5, but at least every 10 minutes
+    device.filters[cid] = SampleFilter(deadband=0.5,
+                                       max_interval=600000)
+
+"""
+
+
+# pylint: disable=too-many-instance-attributes
+# One attribute per policy and counter
+class SampleFilter:
+    """Dead-band, change-of-value and report interval filter.
+
+    Policies are combined: samples within min_interval after the last
+    reported sample are suppressed, samples max_interval or later are
+    reported. Otherwise a sample is reported if its value differs from
+    the last reported one by more than deadband or percent, or at all if
+    change_of_value is set. Without a value policy, only the interval
+    limits apply.
+
+    Attributes:
+    ----------
+    accepted: Number of samples reported.
+    suppressed: Number of samples suppressed.
+    """
+
+    __slots__ = ["deadband", "percent", "change_of_value", "min_interval",
+                 "max_interval", "accepted", "suppressed", "_last_value",
+                 "_last_on"]
+
+    # pylint: disable=too-many-arguments
+    # All arguments are independent policies
+    def __init__(self, deadband=None, percent=None, change_of_value=False,
+                 min_interval=None, max_interval=None):
+        """Create a filter, all policies are disabled by default.
+
+        Args:
+        ----------
+        deadband (optional): Minimum absolute change of numeric values.
+        percent (optional): Minimum change of numeric values, in
+        percent of the last reported value.
+        change_of_value (optional): Report every change of the value,
+        also for non-numeric values.
+        min_interval (optional): Minimum time between reported samples
+        in milliseconds.
+        max_interval (optional): Maximum time between reported samples
+        in milliseconds, unchanged values are reported again after it.
+
+        """
+        self.deadband = deadband
+        self.percent = percent
+        self.change_of_value = change_of_value
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.accepted = 0
+        self.suppressed = 0
+        self._last_value = None
+        self._last_on = None
+
+    def accept(self, value, on):
+        """Return whether a sample is reported, update counters.
+
+        Args:
+        ----------
+        value: Value of the sample.
+        on: Timestamp of the sample in milliseconds.
+
+        """
+        if self._report(value, on):
+            self._last_value = value
+            self._last_on = on
+            self.accepted += 1
+            return True
+        self.suppressed += 1
+        return False
+
+    # pylint: disable=too-many-return-statements
+    # Policies are checked in order of precedence
+    def _report(self, value, on):
+        if self._last_on is None:
+            return True
+        elapsed = on - self._last_on
+        if self.min_interval is not None and elapsed < self.min_interval:
+            return False
+        if self.max_interval is not None and elapsed >= self.max_interval:
+            return True
+        last = self._last_value
+        if self.deadband is None and self.percent is None:
+            return not self.change_of_value or value != last
+        try:
+            change = abs(value - last)
+        except TypeError:
+            # Not numeric, any change is significant
+            return value != last
+        if self.deadband is not None and change > self.deadband:
+            return True
+        if self.percent is not None and change > abs(last) * \
+                self.percent / 100:
+            return True
+        return False
+
+    def reset(self):
+        """Forget the last reported sample, the next one is reported."""
+        self._last_value = None
+        self._last_on = None
+
+    def __repr__(self):
+        return "SampleFilter(accepted={}, suppressed={})".format(
+            self.accepted, self.suppressed)
@@ -0,0 +1,221 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""HTTP/2 backend for Client, multiplexing requests (requires httpx).
+
+By default every request of a Client opens its own connection. With
+Http2Backend, concurrent requests from many threads share a few HTTP/2
+connections, each carrying many requests at a time.
+
+Example:
+----------
+    client = oisp.Client("https://oisp.example.com/v1/api",
+                         backend="http2")
+
+"""
+
+import contextlib
+import json
+
+import requests
+
+from oisp.binary import CborBody
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+def _mapped_error(error):
+    """Return the requests exception corresponding to a httpx error.
+
+    Client and its callers handle the exceptions of requests, e.g.
+    ConnectionError is failed over to other API roots.
+    """
+    exceptions = requests.exceptions
+    mapping = [(httpx.ConnectTimeout, exceptions.ConnectTimeout),
+               # No connection available, the request was not sent
+               (httpx.PoolTimeout, exceptions.ConnectTimeout),
+               (httpx.ReadTimeout, exceptions.ReadTimeout),
+               (httpx.TimeoutException, exceptions.Timeout),
+               (httpx.ConnectError, exceptions.ConnectionError),
+               (httpx.NetworkError, exceptions.ConnectionError),
+               (httpx.ProtocolError, exceptions.ConnectionError),
+               (httpx.InvalidURL, exceptions.InvalidURL),
+               (httpx.UnsupportedProtocol, exceptions.InvalidSchema)]
+    for httpx_type, requests_type in mapping:
+        if isinstance(error, httpx_type):
+            return requests_type(str(error))
+    return exceptions.RequestException(str(error))
+
+
+@contextlib.contextmanager
+def _requests_errors():
+    """Raise httpx errors as the corresponding requests exceptions."""
+    try:
+        yield
+    except (httpx.HTTPError, httpx.InvalidURL, httpx.StreamError) as error:
+        raise _mapped_error(error) from error
+
+
+class Http2Response:
+    """Wrap a httpx response in the interface of requests used by Client."""
+
+    def __init__(self, response):
+        """Wrap response."""
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.http_version = response.http_version
+
+    @property
+    def content(self):
+        """Return the body, reading it first for streamed responses."""
+        with _requests_errors():
+            return self._response.read()
+
+    @property
+    def text(self):
+        """Return the body decoded as text."""
+        with _requests_errors():
+            self._response.read()
+        return self._response.text
+
+    def json(self):
+        """Return the body parsed as JSON, raising like requests."""
+        try:
+            return json.loads(self.content)
+        except ValueError as error:
+            raise requests.exceptions.JSONDecodeError(
+                str(error), self.text, 0) from error
+
+    def iter_content(self, chunk_size=None):
+        """Yield chunks of a streamed body."""
+        with _requests_errors():
+            yield from self._response.iter_bytes(chunk_size)
+
+    def close(self):
+        """Release the connection of a streamed response."""
+        self._response.close()
+
+
+def _body(data, headers):
+    """Return request content for httpx, setting Content-Length."""
+    if isinstance(data, CborBody):
+        if len(data):
+            headers["Content-Length"] = str(len(data))
+        # h2 frames the data, buffers have to be passed as bytes
+        return (bytes(chunk) if isinstance(chunk, memoryview) else chunk
+                for chunk in data)
+    return data
+
+
+class Http2Backend:
+    """Send requests of a Client over shared HTTP/2 connections.
+
+    Provides get, post, put and delete taking the arguments Client
+    passes to requests, and raises the exceptions of requests. Proxies
+    and certificate verification are set when creating the backend,
+    per-request values are ignored.
+    """
+
+    # pylint: disable=too-many-arguments
+    # All arguments are connection settings
+    def __init__(self, max_connections=4, verify=True, proxy=None,
+                 timeout=60, http1=True):
+        """Create backend, connections are opened on first use.
+
+        Args:
+        ----------
+        max_connections (optional): Maximum number of connections per
+        host, each carrying many concurrent requests.
+        verify (optional): Whether certificates are verified, or path
+        of a CA bundle.
+        proxy (optional): URL of a proxy server.
+        timeout (optional): Timeout of a request in seconds.
+        http1 (optional): Whether HTTP/1.1 is allowed. HTTP/2 is
+        negotiated over TLS, set False to use HTTP/2 also for http://
+        URLs (prior knowledge).
+
+        """
+        if httpx is None:
+            raise ImportError("httpx is required for HTTP/2, install it "
+                              "with pip install httpx[http2]")
+        self.settings = {"max_connections": max_connections,
+                         "verify": verify, "proxy": proxy,
+                         "timeout": timeout, "http1": http1}
+        self._client = self._create_client(**self.settings)
+
+    @staticmethod
+    # pylint: disable=too-many-arguments
+    # Arguments are the settings of __init__
+    def _create_client(max_connections, verify, proxy, timeout, http1):
+        return httpx.Client(http2=True, http1=http1, verify=verify,
+                            proxy=proxy, timeout=timeout,
+                            limits=httpx.Limits(
+                                max_connections=max_connections))
+
+    def __getstate__(self):
+        return {"settings": self.settings}
+
+    def __setstate__(self, state):
+        self.settings = state["settings"]
+        self._client = self._create_client(**self.settings)
+
+    # pylint: disable=too-many-arguments, unused-argument
+    # Arguments match those passed to requests, proxies and verify are
+    # set for all requests in the constructor
+    def request(self, method, url, headers=None, data=None, params=None,
+                stream=False, proxies=None, verify=None):
+        """Send a request and return a Http2Response."""
+        headers = dict(headers or {})
+        with _requests_errors():
+            request = self._client.build_request(
+                method, url, headers=headers, params=params,
+                content=_body(data, headers))
+            return Http2Response(self._client.send(request, stream=stream))
+
+    def get(self, url, **kwargs):
+        """Send a GET request."""
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """Send a POST request."""
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        """Send a PUT request."""
+        return self.request("PUT", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        """Send a DELETE request."""
+        return self.request("DELETE", url, **kwargs)
+
+    def close(self):
+        """Close all connections."""
+        self._client.close()
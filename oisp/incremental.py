@@ -0,0 +1,192 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""Incremental data search, fetching only data added since last poll.
+
+The samples returned within the lookback window are remembered for
+every (device, component) pair, optionally persisted to a local JSON
+file, so polling can be resumed after a restart.
+"""
+
+import copy
+import datetime
+import json
+import os
+
+from oisp.data_query import DataQuery, QueryResponse
+from oisp.utils import timestamp_in_ms
+
+
+class IncrementalQuery:
+    """Poll an account for new data, remembering returned samples.
+
+    Every poll searches data from the end of the previous poll (minus
+    lookback) until now. Samples already returned by an earlier poll
+    are removed from the response, so samples submitted late, but
+    within lookback, are returned once.
+    """
+
+    def __init__(self, account, query=None, state_file=None, lookback=0):
+        """Create an incremental query.
+
+        Args:
+        ----------
+        account: Account to search data in.
+        query (DataQuery, optional): Template for the queries, from_ is
+        used for the first poll, to is ignored.
+        state_file (str, optional): Path to a JSON file, the end of the
+        last poll and the samples returned within lookback are loaded
+        from and saved to this file.
+        lookback (int, optional): Milliseconds to search before the end
+        of the last poll, for data that is submitted with a delay.
+
+        """
+        self.account = account
+        self.query = query if query is not None else DataQuery()
+        self.state_file = state_file
+        self.lookback = lookback
+        # End of the last poll in ms
+        self.synced_to = None
+        # Samples before this timestamp are not searched anymore
+        self.seen_from = None
+        # (device_id, component_id) -> {(timestamp, repr(value))} of
+        # samples returned at or after seen_from
+        self.seen = {}
+        if state_file is not None and os.path.exists(state_file):
+            self.load()
+
+    def load(self):
+        """Load returned samples from state_file."""
+        with open(self.state_file, encoding="utf-8") as state:
+            state_dict = json.load(state)
+        self.synced_to = state_dict["syncedTo"]
+        self.seen_from = state_dict["seenFrom"]
+        self.seen = {(device_id, component_id):
+                     {tuple(sample) for sample in samples}
+                     for device_id, component_id, samples
+                     in state_dict["seen"]}
+
+    def save(self):
+        """Save returned samples to state_file, replacing it atomically."""
+        state_dict = {"syncedTo": self.synced_to,
+                      "seenFrom": self.seen_from,
+                      "seen": [[device_id, component_id, sorted(samples)]
+                               for (device_id, component_id), samples
+                               in self.seen.items()]}
+        tmp_file = self.state_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as state:
+            json.dump(state_dict, state)
+        os.replace(tmp_file, self.state_file)
+
+    def next_query(self, to=None):
+        """Return the DataQuery for the next poll.
+
+        Args:
+        ----------
+        to (optional): End of the queried window as datetime or
+        timestamp in ms, defaults to now.
+
+        """
+        if to is None:
+            to = timestamp_in_ms()
+        elif isinstance(to, datetime.datetime):
+            to = timestamp_in_ms(to)
+        # Only from_ and to are changed, a shallow copy is sufficient
+        query = copy.copy(self.query)
+        from_ = query.from_
+        if isinstance(from_, datetime.datetime):
+            from_ = timestamp_in_ms(from_)
+        if self.synced_to is not None:
+            from_ = max(from_ or 0, self.synced_to - self.lookback)
+        query.from_ = from_
+        query.to = to
+        return query
+
+    def poll(self, to=None):
+        """Search for new data and return it as a QueryResponse.
+
+        The response only contains samples which were not returned by an
+        earlier poll. Returned samples are remembered (and saved if a
+        state_file is set) before returning.
+        """
+        query = self.next_query(to)
+        response = self.account.search_data(query)
+        json_dict = dict(response.json_dict)
+        json_dict["data"] = [self._filter_device(device_dict)
+                             for device_dict in json_dict.get("data", [])]
+        self.synced_to = query.to
+        self._prune(query.to - self.lookback)
+        if self.state_file is not None:
+            self.save()
+        return QueryResponse(self.account, json_dict, query)
+
+    def _filter_device(self, device_dict):
+        """Return device_dict without known samples, remember new ones."""
+        device_dict = dict(device_dict)
+        components = []
+        for component_dict in device_dict.get("components", []):
+            if "samples" in component_dict:
+                key = (device_dict["deviceId"], component_dict["componentId"])
+                component_dict = dict(component_dict)
+                component_dict["samples"] = self._filter_samples(
+                    key, component_dict["samplesHeader"],
+                    component_dict["samples"])
+            components.append(component_dict)
+        device_dict["components"] = components
+        return device_dict
+
+    def _filter_samples(self, key, header, samples):
+        """Return samples of key which were not returned before.
+
+        Samples are identified by timestamp and value, as multiple
+        samples can share a timestamp.
+        """
+        ts_i = header.index("Timestamp")
+        val_i = header.index("Value")
+        seen = self.seen.setdefault(key, set())
+        new_samples = []
+        for sample_list in samples:
+            timestamp = int(float(sample_list[ts_i]))
+            if self.seen_from is not None and timestamp < self.seen_from:
+                continue
+            sample = (timestamp, repr(sample_list[val_i]))
+            if sample in seen:
+                continue
+            seen.add(sample)
+            new_samples.append(sample_list)
+        return new_samples
+
+    def _prune(self, seen_from):
+        """Forget samples before seen_from, they are not searched again."""
+        if self.seen_from is not None:
+            seen_from = max(seen_from, self.seen_from)
+        self.seen_from = seen_from
+        for key, seen in list(self.seen.items()):
+            seen = {sample for sample in seen if sample[0] >= seen_from}
+            if seen:
+                self.seen[key] = seen
+            else:
+                del self.seen[key]
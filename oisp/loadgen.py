@@ -0,0 +1,346 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Load generator simulating a fleet of devices.
+
+Devices are provisioned (or loaded from a file written by an earlier
+run) and spread across worker processes. Every worker drives its
+devices from a few threads using Device.add_sample and submit_data at
+the configured rate and reports throughput, latency percentiles and
+errors. Run oisp-loadgen --help for options, e.g.
+
+    oisp-loadgen --api-url http://localhost:4001/v1/api \
+        --username user@example.com --password secret \
+        --devices 1000 --rate 1 --batch 10 --duration 60 --processes 4
+
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import heapq
+import json
+import multiprocessing
+import os
+import random
+import string
+import sys
+import threading
+import time
+import uuid
+
+import requests
+
+from oisp.client import Client, OICException
+from oisp.device import Device
+from oisp.utils import timestamp_in_ms
+
+DEFAULT_COMPONENT_TYPE = "humidity.v1.0"
+
+
+def provision(account, count, components=1,
+              component_type=DEFAULT_COMPONENT_TYPE, max_workers=8):
+    """Create and activate count devices with components.
+
+    Returns a list of device descriptions (dictionaries with deviceId,
+    deviceToken, accountId and componentIds), as expected by
+    run_worker and stored in device files.
+    """
+    run_id = uuid.uuid4().hex[:8]
+    activation_code = account.get_activation_code()
+
+    def create(i):
+        device_id = "loadgen-{}-{}".format(run_id, i)
+        device = account.create_device(device_id, device_id)
+        token = device.activate(activation_code)
+        cids = [device.add_component("c{}".format(j), component_type)["cid"]
+                for j in range(components)]
+        return {"deviceId": device_id, "deviceToken": token,
+                "accountId": account.account_id, "componentIds": cids}
+
+    with ThreadPoolExecutor(max_workers) as executor:
+        return list(executor.map(create, range(count)))
+
+
+def _value_factory(kind, size, rng):
+    """Return a function creating random sample values."""
+    if kind == "string":
+        chars = string.ascii_letters + string.digits
+        return lambda: "".join(rng.choice(chars) for _ in range(size))
+    if kind == "boolean":
+        return lambda: rng.choice((0, 1))
+    return lambda: round(rng.uniform(0, 100), 2)
+
+
+def _new_stats():
+    return {"requests": 0, "samples": 0, "errors": {}, "latencies": [],
+            "elapsed": 0.0}
+
+
+def _merge_stats(target, stats):
+    target["requests"] += stats["requests"]
+    target["samples"] += stats["samples"]
+    for error, count in stats["errors"].items():
+        target["errors"][error] = target["errors"].get(error, 0) + count
+    target["latencies"].extend(stats["latencies"])
+    target["elapsed"] = max(target["elapsed"], stats["elapsed"])
+
+
+def _drive(client, specs, options, stats, lock):
+    """Submit data for devices in specs until options["deadline"]."""
+    # pylint: disable=too-many-locals
+    # Scheduling state is kept in local variables for speed
+    rng = random.Random(options["seed"])
+    new_value = _value_factory(options["value_kind"], options["value_size"],
+                               rng)
+    batch = options["batch"]
+    # Seconds between two submissions of a device, ms between samples
+    interval = batch / options["rate"]
+    step = 1000 / options["rate"]
+    devices = [Device(spec["deviceId"], client=client,
+                      device_token=spec["deviceToken"],
+                      domain_id=spec["accountId"]) for spec in specs]
+    # Start devices at random offsets to avoid bursts
+    start = time.monotonic()
+    queue = [(start + rng.uniform(0, interval), i)
+             for i in range(len(devices))]
+    heapq.heapify(queue)
+    deadline = options["deadline"]
+    local = _new_stats()
+    while queue and queue[0][0] < deadline:
+        due, i = heapq.heappop(queue)
+        delay = due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        device = devices[i]
+        now = timestamp_in_ms()
+        for k in range(batch):
+            on = now - int((batch - 1 - k) * step)
+            for cid in specs[i]["componentIds"]:
+                device.add_sample(cid, new_value(), on=on)
+        request_start = time.perf_counter()
+        try:
+            device.submit_data()
+            local["samples"] += len(specs[i]["componentIds"]) * batch
+        except OICException:
+            error = "HTTP {}".format(client.response.status_code)
+            local["errors"][error] = local["errors"].get(error, 0) + 1
+        except requests.RequestException as exc:
+            error = type(exc).__name__
+            local["errors"][error] = local["errors"].get(error, 0) + 1
+        # Failed samples are dropped instead of being resubmitted
+        device.unsent_data = []
+        local["latencies"].append(time.perf_counter() - request_start)
+        local["requests"] += 1
+        heapq.heappush(queue, (due + interval, i))
+    with lock:
+        _merge_stats(stats, local)
+
+
+def run_worker(api_url, specs, options):
+    """Drive the devices described by specs, return statistics.
+
+    This is run in every worker process. options is a dictionary with
+    rate (samples per second and device), batch (samples per request),
+    duration (seconds), threads, seed, value_kind, value_size and
+    verify_certs.
+    """
+    client = Client(api_url, verify_certs=options["verify_certs"])
+    stats = _new_stats()
+    lock = threading.Lock()
+    start = time.monotonic()
+    deadline = start + options["duration"]
+    threads = []
+    num_threads = max(1, min(options["threads"], len(specs)))
+    for i in range(num_threads):
+        thread_options = dict(options, seed=options["seed"] * 1000 + i,
+                              deadline=deadline)
+        threads.append(threading.Thread(
+            target=_drive, args=(client, specs[i::num_threads],
+                                 thread_options, stats, lock)))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats["elapsed"] = time.monotonic() - start
+    return stats
+
+
+def percentile(values, fraction):
+    """Return the nearest-rank percentile of sorted values."""
+    if not values:
+        return None
+    index = max(0, min(len(values) - 1,
+                       int(round(fraction * len(values))) - 1))
+    return values[index]
+
+
+def generate_load(api_url, specs, processes=None, **options):
+    """Spread specs across worker processes and run them.
+
+    Returns a report dictionary with throughput, latency percentiles
+    (in ms) and errors. See run_worker for options.
+    """
+    processes = max(1, min(processes or os.cpu_count() or 1, len(specs)))
+    options = dict({"rate": 1.0, "batch": 1, "duration": 10.0,
+                    "threads": 4, "seed": 0, "value_kind": "number",
+                    "value_size": 16, "verify_certs": True}, **options)
+    jobs = [(api_url, specs[i::processes], dict(options, seed=i + 1))
+            for i in range(processes)]
+    if processes == 1:
+        results = [run_worker(*jobs[0])]
+    else:
+        # spawn does not inherit threads or locks of the parent process
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(processes) as pool:
+            results = pool.starmap(run_worker, jobs)
+
+    stats = _new_stats()
+    for result in results:
+        _merge_stats(stats, result)
+    # Time of the slowest worker, excluding process start up
+    elapsed = stats["elapsed"] or 1e-9
+    latencies = sorted(stats["latencies"])
+    failed = sum(stats["errors"].values())
+    return {
+        "devices": len(specs), "processes": processes,
+        "elapsed": elapsed, "requests": stats["requests"],
+        "samples": stats["samples"],
+        "requests_per_second": stats["requests"] / elapsed,
+        "samples_per_second": stats["samples"] / elapsed,
+        "error_rate": failed / stats["requests"] if stats["requests"] else 0,
+        "errors": stats["errors"],
+        "latency_ms": {name: (None if percentile(latencies, q) is None
+                              else percentile(latencies, q) * 1e3)
+                       for name, q in [("p50", .5), ("p90", .9),
+                                       ("p99", .99), ("max", 1.0)]}}
+
+
+def format_report(report):
+    """Return report as human readable text."""
+    lines = ["Devices: {devices} in {processes} processes, "
+             "{elapsed:.1f} s".format(**report),
+             "Requests: {requests} ({requests_per_second:.1f}/s)".format(
+                 **report),
+             "Samples: {samples} ({samples_per_second:.1f}/s)".format(
+                 **report),
+             "Error rate: {:.2%}".format(report["error_rate"])]
+    for error, count in sorted(report["errors"].items()):
+        lines.append("  {}: {}".format(error, count))
+    lines.append("Latency (ms): " + ", ".join(
+        "{} {:.1f}".format(name, value) if value is not None else
+        "{} -".format(name) for name, value in report["latency_ms"].items()))
+    return "\n".join(lines)
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="oisp-loadgen",
+        description="Simulate devices submitting data to OISP.")
+    parser.add_argument("--api-url", required=True,
+                        help="API root, e.g. http://localhost/v1/api")
+    parser.add_argument("--username", help="User to provision devices")
+    parser.add_argument("--password")
+    parser.add_argument("--account",
+                        help="Account name or id (default: first account, "
+                             "created if there is none)")
+    parser.add_argument("--device-file",
+                        help="JSON file with devices, written after "
+                             "provisioning if it does not exist")
+    parser.add_argument("--devices", type=int, default=10,
+                        help="Number of devices to provision")
+    parser.add_argument("--components", type=int, default=1,
+                        help="Components per device")
+    parser.add_argument("--component-type", default=DEFAULT_COMPONENT_TYPE)
+    parser.add_argument("--rate", type=float, default=1.0,
+                        help="Samples per second for every component")
+    parser.add_argument("--batch", type=int, default=1,
+                        help="Samples per component in one request")
+    parser.add_argument("--value-kind", default="number",
+                        choices=["number", "string", "boolean"])
+    parser.add_argument("--value-size", type=int, default=16,
+                        help="Length of string values")
+    parser.add_argument("--duration", type=float, default=10.0,
+                        help="Seconds to generate load")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="Worker processes (default: CPU count)")
+    parser.add_argument("--threads", type=int, default=4,
+                        help="Threads in every worker process")
+    parser.add_argument("--no-verify", action="store_true",
+                        help="Do not verify TLS certificates")
+    parser.add_argument("--output", help="Write report as JSON to file")
+    return parser.parse_args(argv)
+
+
+def _load_devices(args):
+    """Return device descriptions from the device file or provision them."""
+    if args.device_file and os.path.exists(args.device_file):
+        with open(args.device_file, encoding="utf-8") as device_file:
+            return json.load(device_file)[:args.devices]
+    if not (args.username and args.password):
+        raise SystemExit("--username and --password are required to "
+                         "provision devices")
+    client = Client(args.api_url, verify_certs=not args.no_verify)
+    client.auth(args.username, args.password)
+    accounts = client.get_accounts()
+    if args.account:
+        accounts = [account for account in accounts
+                    if args.account in (account.name, account.account_id)]
+    if accounts:
+        account = accounts[0]
+    else:
+        account = client.create_account(args.account or "loadgen")
+        # The token has to be renewed to include the new account
+        client.auth(args.username, args.password)
+    specs = provision(account, args.devices, args.components,
+                      args.component_type)
+    if args.device_file:
+        with open(args.device_file, "w", encoding="utf-8") as device_file:
+            json.dump(specs, device_file)
+    return specs
+
+
+def main(argv=None):
+    """Run the load generator command line interface."""
+    args = _parse_args(argv)
+    specs = _load_devices(args)
+    print("Generating load with {} devices ...".format(len(specs)),
+          file=sys.stderr)
+    report = generate_load(args.api_url, specs, processes=args.processes,
+                           rate=args.rate, batch=args.batch,
+                           duration=args.duration, threads=args.threads,
+                           value_kind=args.value_kind,
+                           value_size=args.value_size,
+                           verify_certs=not args.no_verify)
+    print(format_report(report))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2)
+    return 1 if report["requests"] and not report["samples"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,283 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""Per-request metrics reported by the Client.
+
+Register a hook using Client.add_request_hook, it is called with a
+RequestMetrics object after every request. PrometheusExporter and
+OpenTelemetryHook are ready-made hooks.
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
+
+from oisp.binary import CborBody
+
+# Path segments following these are ids, unless listed in _SUB_RESOURCES
+_COLLECTIONS = {"accounts", "devices", "components", "cmpcatalog", "users",
+                "data", "alerts", "rules", "actuations", "invites",
+                "status"}
+_SUB_RESOURCES = {"tags", "attributes", "search", "totals", "bulk", "status",
+                  "forgot_password", "request_user_activation", "draft",
+                  "activationcode", "me"}
+
+
+def endpoint_template(endpoint):
+    """Return endpoint with ids replaced by {id} and query removed.
+
+    Example: /accounts/1234/devices/dev0 -> /accounts/{id}/devices/{id}
+    """
+    segments = endpoint.split("?", 1)[0].split("/")
+    for i in range(1, len(segments)):
+        if (segments[i - 1] in _COLLECTIONS and segments[i] and
+                segments[i] not in _SUB_RESOURCES):
+            segments[i] = "{id}"
+    return "/".join(segments)
+
+
+# pylint: disable=too-many-instance-attributes
+# One attribute per measurement
+class RequestMetrics:
+    """Measurements for a single request.
+
+    Times are in seconds. status is None and error is set if no
+    response was received.
+    """
+
+    def __init__(self, method, endpoint):
+        """Create RequestMetrics for a request to endpoint."""
+        self.method = method
+        self.endpoint = endpoint_template(endpoint)
+        self.status = None
+        self.error = None
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.encode_time = 0.0
+        self.network_time = 0.0
+        self.decode_time = 0.0
+        self.retries = 0
+        # API root that answered, or the last one tried
+        self.api_root = None
+        # Whether the response of a concurrent identical request was used
+        self.coalesced = False
+        # Wall clock in ns, as used by tracing APIs
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    @property
+    def total_time(self):
+        """Return time spent in the request in seconds."""
+        return self.encode_time + self.network_time + self.decode_time
+
+    def __str__(self):
+        return "{} {} {} in {:.1f} ms".format(self.method, self.endpoint,
+                                              self.status,
+                                              self.total_time * 1e3)
+
+
+def body_size(data):
+    """Return the size of a request or response body, 0 if unknown."""
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return len(data)
+    if isinstance(data, str):
+        return len(data.encode("utf-8"))
+    if isinstance(data, CborBody):
+        return len(data)
+    return 0
+
+
+class PrometheusExporter:
+    """Aggregate request metrics in Prometheus text format.
+
+    Use as hook: client.add_request_hook(exporter). The metrics can be
+    read using render() or served over HTTP using serve().
+    """
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+               10.0)
+
+    def __init__(self, prefix="oisp_client"):
+        """Create an exporter, prefix is prepended to metric names."""
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._requests = {}
+        self._duration = {}
+        self._counters = {}
+        self._api_roots = {}
+        self._server = None
+
+    def __call__(self, metrics):
+        """Record a RequestMetrics object."""
+        labels = (metrics.method, metrics.endpoint)
+        status = str(metrics.status) if metrics.status else "error"
+        with self._lock:
+            key = labels + (status,)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            if metrics.api_root is not None:
+                key = (metrics.api_root, status)
+                self._api_roots[key] = self._api_roots.get(key, 0) + 1
+            buckets = self._duration.setdefault(
+                labels, [[0] * len(self.BUCKETS), 0, 0.0])
+            for i, bound in enumerate(self.BUCKETS):
+                if metrics.total_time <= bound:
+                    buckets[0][i] += 1
+            buckets[1] += 1
+            buckets[2] += metrics.total_time
+            for name, value in [("bytes_sent", metrics.bytes_sent),
+                                ("bytes_received", metrics.bytes_received),
+                                ("encode_seconds", metrics.encode_time),
+                                ("network_seconds", metrics.network_time),
+                                ("decode_seconds", metrics.decode_time),
+                                ("retries", metrics.retries),
+                                ("coalesced", int(metrics.coalesced))]:
+                self._counters[(name,) + labels] = (
+                    self._counters.get((name,) + labels, 0) + value)
+
+    def render(self):
+        """Return all metrics in Prometheus text exposition format."""
+        prefix = self.prefix
+        lines = ["# TYPE {}_requests_total counter".format(prefix)]
+        with self._lock:
+            for (method, endpoint, status), count in sorted(
+                    self._requests.items()):
+                lines.append('{}_requests_total{{method="{}",endpoint="{}",'
+                             'status="{}"}} {}'.format(prefix, method,
+                                                       endpoint, status,
+                                                       count))
+            lines.append("# TYPE {}_request_duration_seconds histogram"
+                         .format(prefix))
+            for (method, endpoint), (buckets, count, total) in sorted(
+                    self._duration.items()):
+                labels = 'method="{}",endpoint="{}"'.format(method, endpoint)
+                for bound, value in zip(self.BUCKETS, buckets):
+                    lines.append('{}_request_duration_seconds_bucket{{{},'
+                                 'le="{}"}} {}'.format(prefix, labels, bound,
+                                                       value))
+                lines.append('{}_request_duration_seconds_bucket{{{},'
+                             'le="+Inf"}} {}'.format(prefix, labels, count))
+                lines.append("{}_request_duration_seconds_sum{{{}}} {}"
+                             .format(prefix, labels, total))
+                lines.append("{}_request_duration_seconds_count{{{}}} {}"
+                             .format(prefix, labels, count))
+            names = sorted({key[0] for key in self._counters})
+            for name in names:
+                lines.append("# TYPE {}_{}_total counter".format(prefix, name))
+                for (counter, method, endpoint), value in sorted(
+                        self._counters.items()):
+                    if counter == name:
+                        lines.append('{}_{}_total{{method="{}",endpoint="{}"}}'
+                                     ' {}'.format(prefix, name, method,
+                                                  endpoint, value))
+            lines.extend(self._api_root_lines())
+        return "\n".join(lines) + "\n"
+
+    def _api_root_lines(self):
+        """Return lines counting requests per API root, lock held."""
+        if not self._api_roots:
+            return []
+        lines = ["# TYPE {}_api_root_requests_total counter"
+                 .format(self.prefix)]
+        for (api_root, status), count in sorted(self._api_roots.items()):
+            lines.append('{}_api_root_requests_total{{api_root="{}",'
+                         'status="{}"}} {}'.format(self.prefix, api_root,
+                                                   status, count))
+        return lines
+
+    def serve(self, port, host=""):
+        """Serve metrics at http://host:port/metrics in a daemon thread."""
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """Answer every GET with the rendered metrics."""
+
+            # pylint: disable=invalid-name
+            # Name required by BaseHTTPRequestHandler
+            def do_GET(self):
+                """Send metrics."""
+                body = exporter.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type",
+                                 "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                # pylint: disable=arguments-differ
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever,
+                         daemon=True).start()
+        return self._server.server_address[1]
+
+    def shutdown(self):
+        """Stop serving metrics."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+# pylint: disable=too-few-public-methods
+# Hooks are callables
+class OpenTelemetryHook:
+    """Create an OpenTelemetry span for every request.
+
+    Spans are created after the request finished, using its recorded
+    start and end times. Requires the opentelemetry-api package.
+    """
+
+    def __init__(self, tracer=None):
+        """Create hook, a tracer named "oisp" is used by default."""
+        if tracer is None:
+            # pylint: disable=import-outside-toplevel, import-error
+            # OpenTelemetry is an optional dependency
+            from opentelemetry import trace
+            tracer = trace.get_tracer("oisp")
+        self.tracer = tracer
+
+    def __call__(self, metrics):
+        """Record a RequestMetrics object as span."""
+        span = self.tracer.start_span(
+            "{} {}".format(metrics.method, metrics.endpoint),
+            start_time=metrics.start_ns,
+            attributes={"http.method": metrics.method,
+                        "http.route": metrics.endpoint,
+                        "http.status_code": metrics.status or 0,
+                        "http.request_content_length": metrics.bytes_sent,
+                        "http.response_content_length":
+                        metrics.bytes_received,
+                        "oisp.encode_time": metrics.encode_time,
+                        "oisp.network_time": metrics.network_time,
+                        "oisp.decode_time": metrics.decode_time,
+                        "oisp.retries": metrics.retries,
+                        "oisp.api_root": metrics.api_root or "",
+                        "oisp.coalesced": metrics.coalesced})
+        if metrics.error is not None:
+            span.record_exception(metrics.error)
+        span.end(end_time=metrics.end_ns)
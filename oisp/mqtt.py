@@ -0,0 +1,228 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""MQTT transport for device data submission.
+
+Instead of a HTTP request for every submit_data call, samples are
+published to the MQTT broker of the OISP deployment over a persistent
+session with QoS 1. Messages are queued while the connection is down
+and (re)sent after reconnecting, with exponential backoff between
+attempts. Requires paho-mqtt.
+
+Example:
+----------
+    device.transport = MqttTransport(device, "broker.example.com")
+    device.add_sample(cid, 21.5)
+    device.submit_data()
+    device.transport.flush()
+
+"""
+
+import json
+import threading
+
+try:
+    import paho.mqtt.client as paho
+except ImportError:
+    paho = None
+
+DEFAULT_TOPIC = "server/metric/{account_id}/{device_id}"
+
+
+class MqttError(Exception):
+    """Raised if a message can not be published or acknowledged."""
+
+
+# pylint: disable=too-many-instance-attributes
+# Connection settings and delivery state are stored as attributes
+class MqttTransport:
+    """Publish the data of a device to an MQTT broker.
+
+    The device authenticates with its id as username and its device
+    token as password. Assign the transport to Device.transport to use
+    it in submit_data.
+    """
+
+    # pylint: disable=too-many-arguments
+    # All arguments are connection settings
+    def __init__(self, device, host, port=8883, tls=True, ca_certs=None,
+                 topic=DEFAULT_TOPIC, keepalive=60, max_inflight=20,
+                 max_queued=0, min_backoff=1, max_backoff=120):
+        """Create a transport, the connection is opened on first use.
+
+        Args:
+        ----------
+        device: Activated Device, its id and token are the credentials.
+        host, port: Address of the MQTT broker.
+        tls (optional): Whether to use TLS, ca_certs is passed to
+        ssl if given.
+        topic (optional): Topic template, filled with account_id and
+        device_id.
+        keepalive (optional): Seconds between keep alive messages.
+        max_inflight (optional): Maximum number of unacknowledged
+        messages sent, further messages are queued.
+        max_queued (optional): Maximum number of queued messages,
+        0 for unlimited.
+        min_backoff, max_backoff (optional): Seconds to wait before
+        reconnecting, doubled after every failed attempt.
+
+        """
+        if paho is None:
+            raise ImportError("paho-mqtt is required for MQTT transport")
+        self.device = device
+        self.host = host
+        self.port = port
+        self.topic = topic.format(account_id=device.domain_id,
+                                  device_id=device.device_id)
+        self.keepalive = keepalive
+        self.published = 0
+        self.acknowledged = 0
+        self.connects = 0
+        self._connected = threading.Event()
+        self._condition = threading.Condition()
+        # Message ids waiting for PUBACK, and those acknowledged before
+        # publish returned
+        self._unacked = set()
+        self._acked_early = set()
+        self._started = False
+
+        if hasattr(paho, "CallbackAPIVersion"):
+            self._client = paho.Client(paho.CallbackAPIVersion.VERSION2,
+                                       client_id=device.device_id,
+                                       clean_session=False)
+        else:
+            self._client = paho.Client(client_id=device.device_id,
+                                       clean_session=False)
+        self._client.username_pw_set(device.device_id, device.device_token)
+        if tls:
+            self._client.tls_set(ca_certs=ca_certs)
+        self._client.max_inflight_messages_set(max_inflight)
+        self._client.max_queued_messages_set(max_queued)
+        self._client.reconnect_delay_set(min_backoff, max_backoff)
+        self._client.on_connect = self._on_connect
+        self._client.on_disconnect = self._on_disconnect
+        self._client.on_publish = self._on_publish
+
+    # Callbacks are called from the network thread of paho, with
+    # different signatures in paho-mqtt 1.x and 2.x
+    def _on_connect(self, client, userdata, flags, reason_code, *args):
+        # pylint: disable=unused-argument
+        if reason_code == 0:
+            self.connects += 1
+            self._connected.set()
+
+    def _on_disconnect(self, client, userdata, *args):
+        # pylint: disable=unused-argument
+        self._connected.clear()
+
+    def _on_publish(self, client, userdata, mid, *args):
+        # pylint: disable=unused-argument
+        with self._condition:
+            self.acknowledged += 1
+            if mid in self._unacked:
+                self._unacked.discard(mid)
+            else:
+                self._acked_early.add(mid)
+            self._condition.notify_all()
+
+    @property
+    def connected(self):
+        """Whether the connection to the broker is established."""
+        return self._connected.is_set()
+
+    @property
+    def pending(self):
+        """Number of published messages not acknowledged yet."""
+        with self._condition:
+            return len(self._unacked)
+
+    def connect(self, timeout=10):
+        """Connect to the broker and start the network thread.
+
+        Reconnects happen automatically. Raises MqttError if the first
+        connection is not established within timeout seconds.
+        """
+        if not self._started:
+            self._client.connect_async(self.host, self.port, self.keepalive)
+            self._client.loop_start()
+            self._started = True
+        if not self._connected.wait(timeout):
+            raise MqttError("Could not connect to {}:{}".format(
+                self.host, self.port))
+
+    def publish(self, payload, timeout=None):
+        """Publish a data payload (as sent to /data/{device_id}).
+
+        The message is queued if the connection is down. If timeout is
+        given, wait for the broker to acknowledge it.
+        """
+        if not self._started:
+            self.connect()
+        info = self._client.publish(self.topic, json.dumps(payload), qos=1)
+        if info.rc not in (paho.MQTT_ERR_SUCCESS, paho.MQTT_ERR_NO_CONN):
+            raise MqttError("Publishing failed: {}".format(
+                paho.error_string(info.rc)))
+        with self._condition:
+            self.published += 1
+            if info.mid in self._acked_early:
+                self._acked_early.discard(info.mid)
+            else:
+                self._unacked.add(info.mid)
+            if timeout is not None:
+                self._wait(lambda: info.mid not in self._unacked, timeout)
+
+    def flush(self, timeout=None):
+        """Wait until all published messages are acknowledged."""
+        with self._condition:
+            self._wait(lambda: not self._unacked, timeout)
+
+    def _wait(self, predicate, timeout):
+        if not self._condition.wait_for(predicate, timeout):
+            raise MqttError("{} messages not acknowledged after {} s".format(
+                len(self._unacked), timeout))
+
+    def close(self, timeout=None):
+        """Wait for pending messages (up to timeout) and disconnect."""
+        try:
+            if self._started and timeout != 0:
+                self.flush(timeout)
+        finally:
+            self._client.disconnect()
+            self._client.loop_stop()
+            self._started = False
+            self._connected.clear()
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self):
+        return "MqttTransport({}:{}, {})".format(self.host, self.port,
+                                                 self.topic)
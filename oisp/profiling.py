@@ -0,0 +1,207 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Opt-in profiling of the SDK's internal stages.
+
+While profiling is enabled, the time spent in instrumented stages
+(timestamp conversion, JSON key conversion, encoding, network,
+decoding, response parsing) and the number of calls are recorded
+for every stack of nested stages. When disabled, instrumented
+functions only check a flag.
+
+Enable profiling by calling enable(), or by setting the environment
+variable OISP_PROFILE=1, which prints a summary at exit. If
+OISP_PROFILE_STACKS is set as well, collapsed stacks are written to
+that file at exit.
+
+Example:
+----------
+    oisp.profiling.enable()
+    ...
+    print(oisp.profiling.summary())
+    oisp.profiling.write_collapsed("oisp.folded")
+
+"""
+
+import atexit
+import contextlib
+import functools
+import os
+import sys
+import threading
+import time
+
+_enabled = False
+_lock = threading.Lock()
+_local = threading.local()
+# Stack of stage names -> [calls, total ns, self ns]
+_stats = {}
+
+
+def enable():
+    """Start recording stage timings."""
+    # pylint: disable=global-statement
+    # Module level switch, read by every instrumented function
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    """Stop recording stage timings, recorded data is kept."""
+    # pylint: disable=global-statement
+    # Module level switch, read by every instrumented function
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    """Return True if profiling is enabled."""
+    return _enabled
+
+
+def reset():
+    """Discard all recorded data."""
+    with _lock:
+        _stats.clear()
+
+
+def _push(name):
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    # name, start time, time spent in nested stages
+    stack.append([name, time.perf_counter_ns(), 0])
+
+
+def _pop():
+    end = time.perf_counter_ns()
+    stack = _local.stack
+    path = tuple(frame[0] for frame in stack)
+    name, start, nested = stack.pop()
+    elapsed = end - start
+    if stack:
+        stack[-1][2] += elapsed
+    with _lock:
+        entry = _stats.get(path)
+        if entry is None:
+            entry = _stats[path] = [0, 0, 0]
+        entry[0] += 1
+        entry[1] += elapsed
+        entry[2] += elapsed - nested
+    return name
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Record the time spent in a with block as stage name."""
+    if not _enabled:
+        yield
+        return
+    _push(name)
+    try:
+        yield
+    finally:
+        _pop()
+
+
+def profiled(name):
+    """Record the time spent in the decorated function as stage name."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            _push(name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _pop()
+        return wrapper
+    return decorator
+
+
+def stats():
+    """Return recorded data per stage name.
+
+    Returns a dictionary mapping stage names to (calls, total seconds,
+    self seconds). Total time includes nested stages, self time does
+    not. Time spent in a stage nested in itself is only counted once.
+    """
+    with _lock:
+        items = [(path, list(entry)) for path, entry in _stats.items()]
+    result = {}
+    for path, (calls, total, self_) in items:
+        name = path[-1]
+        calls_, total_, self__ = result.get(name, (0, 0, 0))
+        if name in path[:-1]:
+            # Already counted by the outer call
+            total = 0
+        result[name] = (calls_ + calls, total_ + total, self__ + self_)
+    return {name: (calls, total / 1e9, self_ / 1e9)
+            for name, (calls, total, self_) in result.items()}
+
+
+def summary():
+    """Return a table of recorded stages, sorted by total time."""
+    rows = sorted(stats().items(), key=lambda item: -item[1][1])
+    width = max([len(name) for name, _ in rows] + [len("stage")])
+    lines = ["{:<{w}} {:>10} {:>12} {:>12} {:>10}".format(
+        "stage", "calls", "total (ms)", "self (ms)", "per call", w=width)]
+    for name, (calls, total, self_) in rows:
+        lines.append("{:<{w}} {:>10} {:>12.3f} {:>12.3f} {:>8.1f}us".format(
+            name, calls, total * 1e3, self_ * 1e3, total / calls * 1e6,
+            w=width))
+    return "\n".join(lines)
+
+
+def collapsed():
+    """Return recorded data in collapsed stack format.
+
+    Each line holds the ;-separated stack of stages and the self time
+    in microseconds, as expected by flamegraph.pl and speedscope.
+    """
+    with _lock:
+        items = sorted((path, entry[2]) for path, entry in _stats.items())
+    return "".join("{} {}\n".format(";".join(path), self_ // 1000)
+                   for path, self_ in items)
+
+
+def write_collapsed(path):
+    """Write recorded data in collapsed stack format to path."""
+    with open(path, "w", encoding="utf-8") as stacks_file:
+        stacks_file.write(collapsed())
+
+
+def _report_at_exit(stacks_path):
+    print(summary(), file=sys.stderr)
+    if stacks_path:
+        write_collapsed(stacks_path)
+
+
+if os.environ.get("OISP_PROFILE", "") not in ("", "0"):
+    enable()
+    atexit.register(_report_at_exit, os.environ.get("OISP_PROFILE_STACKS"))
@@ -0,0 +1,245 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""Local cache for search results of closed historical time windows.
+
+Data in a window that ended long enough ago does not change anymore, so
+repeated searches can be answered locally. Results are kept in an in
+memory LRU and optionally in a directory on disk. A search for a sub
+range of a cached window is answered by filtering the cached result.
+"""
+
+from collections import OrderedDict
+import glob
+import hashlib
+import json
+import os
+import threading
+
+from oisp.utils import timestamp_in_ms
+
+# Query parameters that make a result depend on the exact window, so
+# it can not be derived from a larger cached window
+_WINDOW_DEPENDENT = ["componentRowLimit", "componentFirstRow"]
+# Lists in the payload where order does not matter
+_UNORDERED = ["gatewayIds", "deviceIds", "componentIds"]
+
+
+# pylint: disable=too-many-instance-attributes
+# Counters are kept as attributes for easy access
+class QueryCache:
+    """Cache for responses of /data/search/advanced.
+
+    Enable it by passing an instance to the Client:
+    client = Client(api_root, query_cache=QueryCache())
+    """
+
+    def __init__(self, max_entries=128, directory=None,
+                 settle_time=5 * 60 * 1000):
+        """Create a cache.
+
+        Args:
+        ----------
+        max_entries (int): Number of results kept in memory.
+        directory (str, optional): If given, results are stored in this
+        directory as well and survive restarts.
+        settle_time (int): Windows are only cached if they ended at least
+        this many milliseconds ago, as data might still be arriving
+        for more recent windows.
+
+        """
+        self.max_entries = max_entries
+        self.directory = directory
+        self.settle_time = settle_time
+        self.hits = 0
+        self.misses = 0
+        # (base_key, from, to) -> response dictionary
+        self._entries = OrderedDict()
+        # base_key -> set of (from, to)
+        self._windows = {}
+        self._lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def _split(payload):
+        """Return (base_key, from, to) for a query payload.
+
+        base_key is a normalized JSON string of the query without its
+        time window. Returns None if the window is not given in ms.
+        """
+        from_, to = payload.get("from", 0), payload.get("to")
+        if not isinstance(from_, int) or not isinstance(to, int):
+            return None
+        rest = {k: v for k, v in payload.items() if k not in ("from", "to")}
+        for key in _UNORDERED:
+            if isinstance(rest.get(key), list):
+                rest[key] = sorted(rest[key])
+        return (json.dumps(rest, sort_keys=True, separators=(",", ":")),
+                from_, to)
+
+    @staticmethod
+    def _allows_subrange(base_key):
+        """Return whether results for base_key can be filtered by time."""
+        rest = json.loads(base_key)
+        if any(rest.get(key) is not None for key in _WINDOW_DEPENDENT):
+            return False
+        return rest.get("aggregations") in (None, "exclude")
+
+    def _path(self, base_key, from_="*", to="*"):
+        """Return file path for an entry, or a glob pattern for all."""
+        digest = hashlib.sha1(base_key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory,
+                            "{}_{}_{}.json".format(digest, from_, to))
+
+    def get(self, payload):
+        """Return a cached response dictionary for payload or None.
+
+        Dictionaries and lists are copies, callers may modify them.
+        Values are shared, e.g. memoryviews of binary samples.
+        """
+        key = self._split(payload)
+        if key is None:
+            return None
+        base_key, from_, to = key
+        with self._lock:
+            windows = set(self._windows.get(base_key, ()))
+        if self.directory is not None:
+            for path in glob.glob(self._path(base_key)):
+                name = os.path.basename(path)[:-len(".json")]
+                windows.add(tuple(int(t) for t in name.split("_")[1:]))
+
+        if (from_, to) in windows:
+            window = (from_, to)
+        elif self._allows_subrange(base_key):
+            window = next((w for w in windows
+                           if w[0] <= from_ and to <= w[1]), None)
+        else:
+            window = None
+        if window is None:
+            self.misses += 1
+            return None
+
+        json_dict = self._load(base_key, *window)
+        if json_dict is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if window != (from_, to):
+            json_dict = _filter_window(json_dict, from_, to)
+        return _copy_structure(json_dict)
+
+    def _load(self, base_key, from_, to):
+        """Return entry from memory or disk, promoting it to memory."""
+        with self._lock:
+            json_dict = self._entries.get((base_key, from_, to))
+            if json_dict is not None:
+                self._entries.move_to_end((base_key, from_, to))
+                return json_dict
+        if self.directory is None:
+            return None
+        try:
+            with open(self._path(base_key, from_, to),
+                      encoding="utf-8") as cached:
+                json_dict = json.load(cached)
+        except (OSError, ValueError):
+            return None
+        self._store(base_key, from_, to, json_dict)
+        return json_dict
+
+    def put(self, payload, json_dict):
+        """Cache a response if its window is settled.
+
+        The dictionaries and lists of json_dict are copied, so the
+        response can still be modified. Returns whether the response
+        was cached.
+        """
+        key = self._split(payload)
+        if key is None or key[2] > timestamp_in_ms() - self.settle_time:
+            return False
+        self._store(*key, _copy_structure(json_dict))
+        if self.directory is not None:
+            path = self._path(*key)
+            try:
+                with open(path + ".tmp", "w", encoding="utf-8") as cached:
+                    json.dump(json_dict, cached)
+                os.replace(path + ".tmp", path)
+            # Binary (CBOR) data can not be stored as JSON
+            except TypeError:
+                os.remove(path + ".tmp")
+        return True
+
+    def _store(self, base_key, from_, to, json_dict):
+        with self._lock:
+            self._entries[(base_key, from_, to)] = json_dict
+            self._entries.move_to_end((base_key, from_, to))
+            self._windows.setdefault(base_key, set()).add((from_, to))
+            while len(self._entries) > self.max_entries:
+                (old_key, old_from, old_to), _ = self._entries.popitem(
+                    last=False)
+                self._windows[old_key].discard((old_from, old_to))
+                if not self._windows[old_key]:
+                    del self._windows[old_key]
+
+    def clear(self):
+        """Remove all entries from memory and disk."""
+        with self._lock:
+            self._entries.clear()
+            self._windows.clear()
+        if self.directory is not None:
+            for path in glob.glob(os.path.join(self.directory, "*.json")):
+                os.remove(path)
+
+
+def _copy_structure(value):
+    """Return value with its dictionaries and lists copied.
+
+    Other values are shared, they are immutable or (like memoryviews of
+    binary responses) can not be copied.
+    """
+    if isinstance(value, dict):
+        return {key: _copy_structure(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy_structure(item) for item in value]
+    return value
+
+
+def _filter_window(json_dict, from_, to):
+    """Return a copy of a response containing only samples in a window."""
+    json_dict = dict(json_dict, startTimestamp=from_, endTimestamp=to)
+    devices = []
+    for device_dict in json_dict.get("data", []):
+        components = []
+        for component_dict in device_dict.get("components", []):
+            if "samples" in component_dict:
+                ts_i = component_dict["samplesHeader"].index("Timestamp")
+                component_dict = dict(component_dict, samples=[
+                    sample_list for sample_list in component_dict["samples"]
+                    if from_ <= float(sample_list[ts_i]) <= to])
+            components.append(component_dict)
+        devices.append(dict(device_dict, components=components))
+    json_dict["data"] = devices
+    return json_dict
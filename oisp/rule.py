@@ -0,0 +1,171 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Rules evaluated by the rule engine on submitted data.
+
+A rule has conditions on component values and actions (e.g. a HTTP
+request or a mail) executed when the conditions are met. Every
+triggered rule also creates an alert.
+
+Example:
+----------
+    rule = Rule("overheating",
+                [Rule.condition("temperature", ">", 80)],
+                [Rule.http_action("https://example.com/hook")],
+                device_ids=[device.device_id])
+    account.create_rule(rule)
+
+"""
+
+from oisp.utils import camel_to_underscore
+
+
+# pylint: disable=too-many-instance-attributes
+# The attributes match those defined in the REST API
+class Rule:
+    """Rule of an account.
+
+    Rules created by the constructor are local until passed to
+    Account.create_rule, which sets rule_id and account.
+    """
+
+    STATUS_ACTIVE = "Active"
+    STATUS_ON_HOLD = "On-hold"
+    STATUS_ARCHIVED = "Archived"
+    STATUS_DRAFT = "Draft"
+    PRIORITY_LOW = "Low"
+    PRIORITY_MEDIUM = "Medium"
+    PRIORITY_HIGH = "High"
+    RESET_AUTOMATIC = "Automatic"
+    RESET_MANUAL = "Manual"
+
+    # pylint: disable=too-many-arguments
+    # Arguments are rule attributes defined by the REST API
+    def __init__(self, name, conditions, actions, device_ids=None,
+                 priority=PRIORITY_MEDIUM, description="",
+                 reset_type=RESET_AUTOMATIC, status=STATUS_ACTIVE,
+                 operator="OR"):
+        """Create a rule.
+
+        Args:
+        ----------
+        name (str): Name of the rule, shown in alerts.
+        conditions: List of conditions, see Rule.condition.
+        actions: List of actions, see Rule.http_action.
+        device_ids (optional): Devices the rule applies to, all devices
+        of the account if None.
+        priority, reset_type, status (optional): One of the PRIORITY_*,
+        RESET_* and STATUS_* values.
+        operator (optional): "OR" if any, "AND" if all conditions have
+        to be met.
+
+        """
+        self.account = None
+        self.rule_id = None
+        self.name = name
+        self.conditions = list(conditions)
+        self.actions = list(actions)
+        self.device_ids = device_ids
+        self.priority = priority
+        self.description = description
+        self.reset_type = reset_type
+        self.status = status
+        self.operator = operator
+
+    @staticmethod
+    def condition(component, operator, value, data_type="Number"):
+        """Return a basic condition comparing a component to value.
+
+        Args:
+        ----------
+        component (str): Component name.
+        operator (str): One of >, <, >=, <=, =, !=.
+        value: Threshold, converted to a string.
+        data_type (str, optional): Data type of the component.
+
+        """
+        return {"component": {"name": component, "dataType": data_type},
+                "type": "basic", "operator": operator,
+                "values": [str(value)]}
+
+    @staticmethod
+    def http_action(*urls):
+        """Return an action sending a HTTP POST request to urls."""
+        return {"type": "http", "target": list(urls)}
+
+    @staticmethod
+    def mail_action(*addresses):
+        """Return an action sending a mail to addresses."""
+        return {"type": "mail", "target": list(addresses)}
+
+    def json(self):
+        """Return the rule as dictionary in the format of the API."""
+        return {"name": self.name, "description": self.description,
+                "priority": self.priority, "type": "Regular",
+                "status": self.status, "resetType": self.reset_type,
+                "actions": self.actions,
+                "population": {"ids": self.device_ids, "attributes": None,
+                               "tags": None},
+                "conditions": {"operator": self.operator,
+                               "values": self.conditions}}
+
+    @staticmethod
+    def from_json(json_dict, account):
+        """Create a rule from a dictionary returned by the service."""
+        conditions = json_dict.get("conditions") or {}
+        population = json_dict.get("population") or {}
+        rule = Rule(json_dict["name"], conditions.get("values", []),
+                    json_dict.get("actions", []),
+                    device_ids=population.get("ids"),
+                    operator=conditions.get("operator", "OR"))
+        rule.account = account
+        rule.rule_id = json_dict.get("id")
+        for key in ["priority", "description", "resetType", "status",
+                    "creationDate", "lastUpdateDate", "owner"]:
+            if json_dict.get(key) is not None:
+                setattr(rule, camel_to_underscore(key), json_dict[key])
+        return rule
+
+    def update(self):
+        """Send local changes to the service."""
+        self.account.update_rule(self)
+
+    def activate(self):
+        """Set status to active."""
+        self.account.set_rule_status(self, Rule.STATUS_ACTIVE)
+
+    def deactivate(self):
+        """Set status to on-hold, the rule is not evaluated."""
+        self.account.set_rule_status(self, Rule.STATUS_ON_HOLD)
+
+    def delete(self):
+        """Delete the rule, it is deactivated first if necessary."""
+        self.account.delete_rule(self)
+
+    def __repr__(self):
+        return "Rule({}, {}, {})".format(self.rule_id, self.name,
+                                         self.status)
@@ -0,0 +1,190 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Incremental parsing of data search responses.
+
+With ijson installed, the response body is parsed while it is being
+downloaded and the samples of every component are yielded as soon as
+they are complete, so memory use is bounded by the largest component
+(or chunk_size samples) instead of the whole response. Without ijson,
+or for CBOR responses, the body is parsed as a whole.
+"""
+
+import cbor
+
+from oisp.data_query import ComponentSamples, QueryResponse
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+_DEVICE = "data.item"
+_COMPONENT = "data.item.components.item"
+_HEADER = _COMPONENT + ".samplesHeader.item"
+_ROW = _COMPONENT + ".samples.item"
+_CELL = _ROW + ".item"
+
+
+# pylint: disable=too-few-public-methods
+# Only read is needed by ijson
+class _ContentReader:
+    """File-like wrapper around response.iter_content, for ijson."""
+
+    def __init__(self, response, chunk_size):
+        self._chunks = response.iter_content(chunk_size)
+
+    def read(self, size=-1):
+        """Return the next chunk of the body.
+
+        size is ignored (ijson accepts chunks of any size), except that
+        read(0), used to detect the type of the stream, reads nothing.
+        """
+        if size == 0:
+            return b""
+        return next(self._chunks, b"")
+
+
+class _Component:
+    """Component being parsed, see _iter_events."""
+
+    def __init__(self, device_id):
+        self.device_id = device_id
+        self.component_id = None
+        self.data_type = None
+        self.header = []
+        self.rows = []
+
+    def ready(self):
+        """Return whether rows can be converted before the component ends."""
+        return (self.device_id is not None and
+                self.component_id is not None and
+                self.data_type is not None and
+                "Timestamp" in self.header and "Value" in self.header)
+
+    def take(self, account):
+        """Return buffered rows as ComponentSamples and clear them."""
+        ts_i = self.header.index("Timestamp")
+        val_i = self.header.index("Value")
+        component = ComponentSamples(
+            account, self.device_id, self.component_id, self.data_type,
+            [row[ts_i] for row in self.rows],
+            [row[val_i] for row in self.rows])
+        self.rows = []
+        return component
+
+
+def _iter_events(account, events, chunk_size):
+    """Yield ComponentSamples from ijson parse events."""
+    # pylint: disable=too-many-branches
+    # One branch per event of interest
+    device_id = None
+    # Components parsed before the deviceId key of their device
+    pending = []
+    component = None
+    row = None
+    has_samples = False
+    for prefix, event, value in events:
+        if prefix == _CELL:
+            row.append(value)
+        elif prefix == _ROW:
+            if event == "start_array":
+                row = []
+            elif event == "end_array":
+                component.rows.append(row)
+                if (chunk_size and len(component.rows) >= chunk_size and
+                        component.ready()):
+                    yield component.take(account)
+        elif prefix == _COMPONENT:
+            if event == "start_map":
+                component = _Component(device_id)
+                has_samples = False
+            elif event == "end_map" and has_samples and component.rows:
+                if device_id is None:
+                    pending.append(component.take(account))
+                else:
+                    yield component.take(account)
+        elif prefix == _COMPONENT + ".componentId":
+            component.component_id = value
+        elif prefix == _COMPONENT + ".dataType":
+            component.data_type = value
+        elif prefix == _HEADER:
+            component.header.append(value)
+        elif prefix == _COMPONENT + ".samples":
+            has_samples = True
+        elif prefix == _DEVICE:
+            if event == "start_map":
+                device_id = None
+        elif prefix == _DEVICE + ".deviceId":
+            device_id = value
+            for samples in pending:
+                samples.device_id = value
+                yield samples
+            pending = []
+        elif prefix == "accountId":
+            assert value == account.account_id, "Account ID mismatch."
+
+
+def iter_search_response(account, response, chunk_size=None,
+                         read_size=64 * 1024):
+    """Yield ComponentSamples from a streamed search response.
+
+    The response has to be requested with stream=True, it is closed when
+    the generator is exhausted or closed. Components without samples
+    are skipped. If chunk_size is given, large components are yielded
+    in parts of at most chunk_size samples.
+
+    Args:
+    ----------
+    account: Account which made the search.
+    response: requests.Response of the search.
+    chunk_size (optional): Maximum number of samples per yielded object.
+    read_size (optional): Bytes read from the connection at once.
+
+    """
+    try:
+        content_type = response.headers.get("Content-Type", "")
+        if ijson is not None and content_type.startswith("application/json"):
+            events = ijson.parse(_ContentReader(response, read_size),
+                                 use_float=True)
+            yield from _iter_events(account, events, chunk_size)
+            return
+        if content_type.startswith("application/cbor"):
+            json_dict = cbor.loads(response.content)
+        else:
+            json_dict = response.json()
+        # pylint: disable=protected-access
+        # Shares the parsing code of complete responses
+        for columns in QueryResponse(account, json_dict)._iter_components():
+            count = len(columns[3])
+            step = chunk_size or count
+            for start in range(0, count, step or 1):
+                yield ComponentSamples(account, *columns[:3],
+                                       columns[3][start:start + step],
+                                       columns[4][start:start + step])
+    finally:
+        response.close()
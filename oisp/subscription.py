@@ -0,0 +1,393 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Push delivery of actuations and alerts over WebSocket.
+
+A SubscriptionClient keeps a WebSocket connection to the websocket
+server of an OISP deployment. Devices subscribe with their device
+token to receive actuation commands, accounts subscribe with the user
+token to receive alert notifications. Notifications are passed to
+callbacks, or can be consumed by (async) iteration. Lost connections
+are reestablished with exponential backoff and all subscriptions are
+sent again. Idle connections are checked with pings, so connections
+that silently stopped working (e.g. dropped by a NAT) are detected.
+Requires websocket-client.
+
+Messages are JSON objects. Subscriptions are sent as
+{"type": "device", "deviceId": ..., "deviceToken": ...} and
+{"type": "user", "accountId": ..., "userToken": ...}, the server
+replies with {"code": 200} or an error code and pushes
+{"code": 1024, "content": actuation} and
+{"code": 1025, "content": alert}.
+
+Example:
+----------
+    with SubscriptionClient("wss://oisp.example.com/ws") as client:
+        client.subscribe_device(device)
+        client.subscribe_alerts(account)
+        for notification in client:
+            print(notification.kind, notification.content)
+
+"""
+
+import asyncio
+import json
+import logging
+import queue
+import random
+import threading
+
+try:
+    import websocket
+except ImportError:
+    websocket = None
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+CODE_SUBSCRIBED = 200
+CODE_UNAUTHORIZED = 401
+CODE_ACTUATION = 1024
+CODE_ALERT = 1025
+
+_CLOSED = object()
+
+
+# pylint: disable=too-few-public-methods
+# Plain data object
+class Notification:
+    """An actuation or alert pushed by the server.
+
+    Attributes:
+    ----------
+    kind: Notification.ACTUATION or Notification.ALERT.
+    content: Message content as dictionary.
+    device_id: Id of the actuated device (actuations only).
+    account_id: Id of the account of the alert (alerts only).
+    """
+
+    ACTUATION = "actuation"
+    ALERT = "alert"
+
+    def __init__(self, kind, content):
+        """Create notification from the content of a message."""
+        self.kind = kind
+        self.content = content
+        self.device_id = content.get("deviceId")
+        self.account_id = content.get("accountId")
+
+    def __repr__(self):
+        return "Notification({}, {})".format(self.kind, self.content)
+
+
+# pylint: disable=too-many-instance-attributes
+# Connection settings and subscription state are stored as attributes
+class SubscriptionClient:
+    """Receive actuations and alerts over a WebSocket connection.
+
+    Notifications of a kind without callback are queued and can be
+    consumed by iterating over the client, with for or async for.
+    Iteration ends when the client is closed.
+    """
+
+    # pylint: disable=too-many-arguments
+    # All arguments are connection settings and callbacks
+    def __init__(self, url, on_actuation=None, on_alert=None,
+                 on_error=None, min_backoff=1, max_backoff=60, timeout=10,
+                 sslopt=None, ping_interval=30):
+        """Create a client, the connection is opened by start.
+
+        Args:
+        ----------
+        url: WebSocket URL of the server, e.g. wss://host/ws.
+        on_actuation, on_alert (optional): Called with a Notification
+        for every actuation or alert, from the receiving thread.
+        on_error (optional): Called with the exception if connecting
+        fails or the connection is lost.
+        min_backoff, max_backoff (optional): Seconds to wait before
+        reconnecting, doubled after every failed attempt.
+        timeout (optional): Timeout in seconds for connecting.
+        sslopt (optional): SSL options passed to websocket-client.
+        ping_interval (optional): Seconds without messages after which
+        a ping is sent. If nothing arrives within another ping_interval,
+        the connection is considered lost and reestablished.
+
+        """
+        if websocket is None:
+            raise ImportError("websocket-client is required for "
+                              "subscriptions")
+        self.url = url
+        self.on_actuation = on_actuation
+        self.on_alert = on_alert
+        self.on_error = on_error
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.sslopt = sslopt
+        self.ping_interval = ping_interval
+        self.connects = 0
+        self.received = 0
+        # Functions returning subscription messages, called on every
+        # (re)connect so that refreshed tokens are used
+        self._subscriptions = []
+        self._queue = queue.Queue()
+        # (loop, asyncio.Event) of async iterators waiting for the queue
+        self._waiters = set()
+        self._lock = threading.Lock()
+        self._connected = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._ws = None
+
+    @property
+    def connected(self):
+        """Whether the connection to the server is established."""
+        return self._connected.is_set()
+
+    def subscribe_device(self, device):
+        """Receive actuations for device, using its device token."""
+        self._subscribe(lambda: {"type": "device",
+                                 "deviceId": device.device_id,
+                                 "deviceToken": device.device_token})
+
+    def subscribe_alerts(self, account):
+        """Receive alerts of account, using the token of its client."""
+        self._subscribe(lambda: {"type": "user",
+                                 "accountId": account.account_id,
+                                 "userToken":
+                                     account.client.user_token.value})
+
+    def _subscribe(self, message):
+        with self._lock:
+            self._subscriptions.append(message)
+            ws = self._ws if self.connected else None
+        if ws is not None:
+            try:
+                self._send_subscription(ws, message)
+            except (OSError, websocket.WebSocketException):
+                # Sent again after reconnecting
+                pass
+
+    def _send_subscription(self, ws, message):
+        """Send a subscription, skipping it if it can not be built."""
+        try:
+            data = json.dumps(message())
+        except (AttributeError, TypeError, ValueError) as exc:
+            # E.g. the client of an account is not authenticated yet,
+            # the subscription is tried again on the next connect
+            logger.warning("Could not build subscription: %s", exc)
+            self._report(self.on_error, exc)
+            return
+        ws.send(data)
+
+    def start(self, timeout=None):
+        """Start the receiving thread.
+
+        If timeout is given, wait until connected and raise
+        ConnectionError if that takes longer.
+        """
+        if self._thread is None:
+            self._stop.clear()
+            self._drain_closed()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        if timeout is not None and not self._connected.wait(timeout):
+            raise ConnectionError("Could not connect to {}".format(self.url))
+        return self
+
+    def close(self):
+        """Close the connection and end iteration."""
+        self._stop.set()
+        with self._lock:
+            ws = self._ws
+        if ws is not None:
+            ws.abort()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._put(_CLOSED)
+
+    def _drain_closed(self):
+        """Remove end markers left in the queue by an earlier close."""
+        pending = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _CLOSED:
+                pending.append(item)
+        for item in pending:
+            self._queue.put(item)
+
+    def _put(self, item):
+        """Queue item and wake up async iterators."""
+        self._queue.put(item)
+        with self._lock:
+            waiters = list(self._waiters)
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # Event loop closed
+                pass
+
+    def _run(self):
+        backoff = self.min_backoff
+        while not self._stop.is_set():
+            try:
+                self._connect()
+                backoff = self.min_backoff
+                self._receive()
+            except (OSError, ValueError,
+                    websocket.WebSocketException) as exc:
+                if self._stop.is_set():
+                    break
+                self._report(self.on_error, exc)
+            finally:
+                self._disconnect()
+            # Jitter keeps a fleet of clients from reconnecting at once
+            self._stop.wait(backoff * random.uniform(0.5, 1))
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def _connect(self):
+        ws = websocket.create_connection(self.url, timeout=self.timeout,
+                                         sslopt=self.sslopt)
+        # recv times out to send pings, see _receive
+        ws.settimeout(self.ping_interval)
+        with self._lock:
+            self._ws = ws
+            subscriptions = list(self._subscriptions)
+        for message in subscriptions:
+            self._send_subscription(ws, message)
+        self.connects += 1
+        self._connected.set()
+
+    def _disconnect(self):
+        self._connected.clear()
+        with self._lock:
+            ws, self._ws = self._ws, None
+        if ws is not None:
+            ws.abort()
+            ws.close()
+
+    def _receive(self):
+        ping_sent = False
+        while not self._stop.is_set():
+            try:
+                opcode, data = self._ws.recv_data(control_frame=True)
+            except websocket.WebSocketTimeoutException as exc:
+                if ping_sent:
+                    raise ConnectionError("No answer to ping") from exc
+                self._ws.ping()
+                ping_sent = True
+                continue
+            # Any frame, including the pong, shows the connection works
+            ping_sent = False
+            if opcode == websocket.ABNF.OPCODE_CLOSE:
+                raise ConnectionError("Connection closed by server")
+            if opcode != websocket.ABNF.OPCODE_TEXT:
+                continue
+            try:
+                self._dispatch(json.loads(data))
+            except (AttributeError, TypeError, ValueError):
+                # One bad message must not drop the connection
+                logger.warning("Ignoring invalid message: %r", data)
+
+    def _dispatch(self, message):
+        code = message.get("code")
+        if code == CODE_ACTUATION:
+            notification = Notification(Notification.ACTUATION,
+                                        message.get("content", {}))
+            callback = self.on_actuation
+        elif code == CODE_ALERT:
+            notification = Notification(Notification.ALERT,
+                                        message.get("content", {}))
+            callback = self.on_alert
+        else:
+            if code != CODE_SUBSCRIBED:
+                logger.warning("Subscription failed: %s", message)
+            return
+        self.received += 1
+        if callback is None:
+            self._put(notification)
+        else:
+            self._report(callback, notification)
+
+    @staticmethod
+    def _report(callback, argument):
+        if callback is None:
+            return
+        try:
+            callback(argument)
+        # pylint: disable=broad-except
+        # A failing callback must not stop the receiving thread
+        except Exception:
+            logger.exception("Subscription callback %r failed", callback)
+
+    def __iter__(self):
+        """Yield queued notifications until the client is closed."""
+        while True:
+            notification = self._queue.get()
+            if notification is _CLOSED:
+                self._put(_CLOSED)
+                return
+            yield notification
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        # Waits on the event loop, so no executor thread is blocked and
+        # cancelling does not lose a notification
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._waiters.add(waiter)
+        try:
+            while True:
+                try:
+                    notification = self._queue.get_nowait()
+                    break
+                except queue.Empty:
+                    await waiter[1].wait()
+                    waiter[1].clear()
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+        if notification is _CLOSED:
+            self._put(_CLOSED)
+            raise StopAsyncIteration
+        return notification
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self):
+        return "SubscriptionClient({})".format(self.url)
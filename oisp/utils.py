@@ -30,30 +30,77 @@
 These methods are meant to be used within the module.
 """
 
+import datetime
+import functools
 import json
 import time
 import re
 
 from pygments import highlight, lexers, formatters
 
+from oisp.profiling import profiled
 
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_ONE_MS = datetime.timedelta(milliseconds=1)
+
+
+def _camel_to_underscore(camel_str):
+    return re.sub('([a-z0-9])([A-Z])', r'\1_\2', camel_str).lower()
+
+
+def _underscore_to_camel(underscore_str):
+    return ''.join(w.title() if i else w
+                   for i, w in enumerate(underscore_str.split('_')))
+
+
+# Field names used by the REST API, converted once at import time
+_API_FIELDS = ["accountId", "alertId", "attributes", "cid", "componentId",
+               "componentIds", "componentType", "componentTypeId",
+               "components", "conditions", "contact", "created",
+               "description", "deviceId", "deviceIds", "deviceToken",
+               "dimension", "domainId", "gatewayId", "gatewayIds", "id",
+               "lastUpdateDate", "lastVisit", "loc", "name",
+               "naturalLangAlert", "priority", "reset", "resetType",
+               "ruleId", "ruleName", "status", "tags", "triggered", "type",
+               "updated"]
+_API_ATTRIBUTES = ["from_", "to", "gateway_ids", "device_ids",
+                   "component_ids", "returned_measure_attributes",
+                   "show_measure_location", "aggregations",
+                   "dev_comp_attribute_filter", "measurement_attribute_filter",
+                   "value_filter", "component_first_row",
+                   "component_row_limit", "sort", "additional_properties",
+                   "gateway_id", "name", "loc", "tags", "attributes"]
+_TO_UNDERSCORE = {key: _camel_to_underscore(key) for key in _API_FIELDS}
+_TO_CAMEL = {key: _underscore_to_camel(key) for key in _API_ATTRIBUTES}
+_cached_camel_to_underscore = functools.lru_cache(maxsize=1024)(
+    _camel_to_underscore)
+_cached_underscore_to_camel = functools.lru_cache(maxsize=1024)(
+    _underscore_to_camel)
+
+
+@profiled("utils.camel_to_underscore")
 def camel_to_underscore(camel_str):
     """Convert a camelCase string to underscore_notation.
 
     This is useful for converting JSON style variable names
-    to python style variable names.
+    to python style variable names. Results are cached.
     """
-    return re.sub('([a-z0-9])([A-Z])', r'\1_\2', camel_str).lower()
+    converted = _TO_UNDERSCORE.get(camel_str)
+    if converted is None:
+        converted = _cached_camel_to_underscore(camel_str)
+    return converted
 
 
 def underscore_to_camel(underscore_str):
     """Convert a underscore_notation string to camelCase.
 
     This is useful for converting python style variable names
-    to JSON style variable names.
+    to JSON style variable names. Results are cached.
     """
-    return ''.join(w.title() if i else w
-                   for i, w in enumerate(underscore_str.split('_')))
+    converted = _TO_CAMEL.get(underscore_str)
+    if converted is None:
+        converted = _cached_underscore_to_camel(underscore_str)
+    return converted
 
 
 def pretty_dumps(dict_):
@@ -75,14 +122,37 @@ def pretty_print(json_dict):
     print(pretty_dumps(json_dict))
 
 
+@profiled("utils.timestamp_in_ms")
 def timestamp_in_ms(dt=None, dtype=int):
-    """Convert given datetime into UNIX timestamp.
+    """Convert given datetime into UNIX timestamp in milliseconds.
 
-    If dt is None, current time will be used.
+    If dt is None, current time will be used. Naive datetime objects
+    are interpreted as UTC, aware ones are converted exactly
+    (including milliseconds). Numbers are assumed to be timestamps in
+    milliseconds already.
     dtype is the datatype returned (int or float).
     """
     if dt is None:
-        in_ms = time.time()*1e3
-    else:
-        in_ms = time.mktime(dt.timetuple())*1e3
-    return dtype(in_ms)
+        if dtype is int:
+            return time.time_ns() // 1000000
+        return dtype(time.time() * 1e3)
+    if not isinstance(dt, datetime.datetime):
+        return dtype(dt)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    if dtype is int:
+        return (dt - _EPOCH) // _ONE_MS
+    return dtype((dt - _EPOCH) / _ONE_MS)
+
+
+def ms_to_datetime(timestamp, tz=None):
+    """Convert a UNIX timestamp in milliseconds to a datetime object.
+
+    The result is a naive datetime in UTC, or an aware one if a
+    timezone tz (e.g. datetime.timezone.utc) is given. Milliseconds
+    are preserved exactly.
+    """
+    moment = _EPOCH + _ONE_MS * int(timestamp)
+    if tz is None:
+        return moment.replace(tzinfo=None)
+    return moment.astimezone(tz)
@@ -0,0 +1,166 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Tumbling-window aggregation of samples before submission.
+
+A WindowAggregator assigned to a component in Device.aggregators keeps
+count, sum, minimum and maximum of the samples in the current window
+instead of adding every sample to the upload buffer. When a sample of a
+later window arrives, or when submit_data is called after the window
+ended, the window is closed and one sample per statistic is added, to
+separate component ids.
+
+Example:
+----------
+    # Per-minute min/max/mean/count of a 100 Hz component, submitted
+    # to components "<cid>-min", "<cid>-max", ...
+    device.aggregators[cid] = WindowAggregator(60000)
+
+"""
+
+STATISTICS = ("min", "max", "mean", "count", "sum")
+DEFAULT_STATISTICS = ("min", "max", "mean", "count")
+DEFAULT_TARGET = "{component_id}-{statistic}"
+
+
+# pylint: disable=too-many-instance-attributes
+# Window state is kept in slots to avoid allocations per sample
+class WindowAggregator:
+    """Aggregate numeric samples of a component in tumbling windows.
+
+    Windows are aligned to multiples of window since the epoch, the
+    aggregate samples are timestamped with the start of their window.
+    Samples older than the current window are counted in late and
+    added to the current window. Adding a sample takes constant time
+    and allocates no objects.
+
+    Attributes:
+    ----------
+    window: Window length in milliseconds.
+    statistics: Names of the submitted statistics, see STATISTICS.
+    forward_raw: Whether samples are also added unaggregated.
+    late: Number of samples older than the current window.
+    """
+
+    __slots__ = ["window", "statistics", "targets", "forward_raw", "late",
+                 "_start", "_count", "_sum", "_min", "_max"]
+
+    def __init__(self, window, statistics=DEFAULT_STATISTICS, targets=None,
+                 forward_raw=False):
+        """Create an aggregator.
+
+        Args:
+        ----------
+        window (int): Window length in milliseconds.
+        statistics (optional): Statistics to submit, out of min, max,
+        mean, count and sum.
+        targets (optional): Dictionary mapping statistics to the
+        component ids they are submitted to, or a format string with
+        component_id and statistic fields. Defaults to
+        "{component_id}-{statistic}".
+        forward_raw (optional): Also add every sample unaggregated.
+
+        """
+        unknown = set(statistics) - set(STATISTICS)
+        if unknown:
+            raise ValueError("Unknown statistics: {}".format(
+                ", ".join(sorted(unknown))))
+        self.window = window
+        self.statistics = tuple(statistics)
+        self.targets = targets if targets is not None else DEFAULT_TARGET
+        self.forward_raw = forward_raw
+        self.late = 0
+        self._start = None
+        self._count = 0
+        self._sum = 0.0
+        self._min = None
+        self._max = None
+
+    def add(self, value, on):
+        """Add a sample, return the closed window if one was closed.
+
+        Args:
+        ----------
+        value: Numeric value of the sample.
+        on (int): Timestamp of the sample in milliseconds.
+
+        """
+        start = on - on % self.window
+        closed = None
+        if self._count:
+            if start > self._start:
+                closed = self._close()
+            elif start < self._start:
+                self.late += 1
+        if not self._count:
+            self._start = start
+            self._count = 1
+            self._sum = self._min = self._max = value
+            return closed
+        self._count += 1
+        self._sum += value
+        if value < self._min:
+            self._min = value
+        elif value > self._max:
+            self._max = value
+        return closed
+
+    def flush(self, now=None):
+        """Close and return the current window.
+
+        If now (in milliseconds) is given, the window is only closed if
+        it ended before now. Returns None if no window was closed.
+        """
+        if self._count and (now is None or
+                            now >= self._start + self.window):
+            return self._close()
+        return None
+
+    def _close(self):
+        closed = (self._start, self._count, self._sum, self._min, self._max)
+        self._count = 0
+        return closed
+
+    def target(self, component_id, statistic):
+        """Return the component id a statistic is submitted to."""
+        if isinstance(self.targets, dict):
+            return self.targets[statistic]
+        return self.targets.format(component_id=component_id,
+                                   statistic=statistic)
+
+    def samples(self, component_id, closed):
+        """Return datapoints for a window returned by add or flush."""
+        start, count, total, minimum, maximum = closed
+        values = {"min": minimum, "max": maximum, "mean": total / count,
+                  "count": count, "sum": total}
+        return [{"componentId": self.target(component_id, statistic),
+                 "value": values[statistic], "on": start}
+                for statistic in self.statistics]
+
+    def __repr__(self):
+        return "WindowAggregator({} ms, {})".format(
+            self.window, ", ".join(self.statistics))
@@ -45,4 +45,12 @@ setup(name='oisp',
       project_urls={"Source":"https://github.com/Open-IoT-Service-Platform/oisp-sdk-python",
                     "OISP Main":"https://github.com/Open-IoT-Service-Platform/oisp-sdk-python"},
       install_requires=["requests", "pygments", "termcolor", "cbor"],
+      extras_require={"bulk": ["numpy", "pandas"],
+                      "arrow": ["numpy", "pyarrow"],
+                      "stream": ["ijson"],
+                      "mqtt": ["paho-mqtt"],
+                      "websocket": ["websocket-client"],
+                      "http2": ["httpx[http2]"]},
+      entry_points={"console_scripts": ["oisp-loadgen=oisp.loadgen:main",
+                                        "oisp-export=oisp.export:main"]},
       tests_require=["docker", "pyyaml", "flask"])
@@ -39,6 +39,11 @@ ROLE = "admin"
 MAKEFILE_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)),
                             os.pardir)
 
+if config.use_mock_server and utils.mock_server is None:
+    from test.mock_server import MockServer
+    utils.mock_server = MockServer().start()
+    config.api_url = utils.mock_server.api_url
+
 
 class BaseCase(unittest.TestCase):
     """ Test case that creates a connection to server as
@@ -25,10 +25,16 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import os
+
 # IoT Analytics server info
 api_url = "http://localhost:4001/v1/api"
 proxies = None
 
+# Set OISP_MOCK_SERVER=1 to run tests against the in-process stand-in
+# server (test/mock_server.py) instead, api_url is replaced then.
+use_mock_server = os.environ.get("OISP_MOCK_SERVER", "0") == "1"
+
 # user account to use
 username = "oisp@testing.com"
 password = "OispTesting1"
@@ -0,0 +1,1041 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+In-process stand-in for the OISP frontend REST API.
+
+Like rule_test_server.py, this is a small Flask application. It implements
+the endpoints used by the SDK with an in-memory database, so tests and
+benchmarks can run without a Kubernetes deployment. Latency and errors
+(for example 429 or 5xx responses) can be injected, and large synthetic
+datasets can be added without storing every sample. Active rules with
+basic conditions are evaluated on submitted data, creating alerts and
+sending HTTP actions.
+
+Usage:
+    server = MockServer(latency=0.01, error_rate=0.05).start()
+    server.add_user("user@example.com", "password")
+    client = oisp.Client(server.api_url)
+    ...
+    server.stop()
+
+Run "python -m test.mock_server" to start a server on port 4001.
+"""
+import argparse
+import asyncio
+from collections import Counter
+import copy
+import math
+import operator
+import random
+import socket
+import statistics
+import threading
+import time
+import uuid
+
+import cbor
+from flask import Flask, Response, jsonify, request
+import requests
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+API_ROOT = "/v1/api"
+TOKEN_LIFETIME = 3600 * 1000
+
+DEFAULT_COMPONENT_TYPES = [
+    {"dimension": "humidity", "version": "1.0", "type": "sensor",
+     "dataType": "Number", "format": "float", "min": "0", "max": "100",
+     "measureunit": "Percent (%)", "display": "timeSeries"},
+    {"dimension": "powerswitch", "version": "1.0", "type": "actuator",
+     "dataType": "Boolean", "format": "boolean", "measureunit": None,
+     "display": "switcher",
+     "command": {"commandString": "LED.v1.0",
+                 "parameters": [{"name": "LED", "values": "0,1"}]}},
+]
+
+
+_OPERATORS = {">": operator.gt, "<": operator.lt, ">=": operator.ge,
+              "<=": operator.le, "=": operator.eq, "!=": operator.ne}
+
+
+def now_ms():
+    """Return current time in milliseconds."""
+    return int(time.time() * 1e3)
+
+
+class MockError(Exception):
+    """Error response, converted to {"code": ..., "message": ...}."""
+
+    def __init__(self, status, code=None, message="Error"):
+        super().__init__(message)
+        self.status = status
+        self.code = code if code is not None else status
+        self.message = message
+
+
+class SyntheticSeries:
+    """Evenly spaced samples computed on demand instead of stored."""
+
+    def __init__(self, start, interval, count, value=None):
+        self.start = start
+        self.interval = interval
+        self.count = count
+        self.value = value or (lambda i: round(20 + 10 * math.sin(i / 50), 3))
+
+    def rows(self, from_, to):
+        """Return [timestamp, value] rows within [from_, to]."""
+        first = max(0, -(-(from_ - self.start) // self.interval))
+        last = min(self.count - 1, (to - self.start) // self.interval)
+        return [[self.start + i * self.interval, self.value(i)]
+                for i in range(first, last + 1)]
+
+
+# pylint: disable=too-many-instance-attributes, too-many-public-methods
+class MockState:
+    """In-memory database of the stand-in server."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        """Remove all users, accounts, devices and data."""
+        with self.lock:
+            self.users = {}          # user_id -> user dict
+            self.tokens = {}         # token -> token info
+            self.device_tokens = {}  # token -> (account_id, device_id)
+            self.accounts = {}       # account_id -> account dict
+            self.devices = {}        # device_id -> device dict
+            self.catalogs = {}       # account_id -> {type_id: ctype}
+            self.samples = {}        # (device_id, cid) -> {ts: value}
+            self.synthetic = {}      # (device_id, cid) -> SyntheticSeries
+            self.actuations = []
+            self.alerts = {}         # account_id -> {alert_id: alert}
+            self.next_alert_id = 1
+            self.rules = {}          # account_id -> {rule_id: rule}
+
+    # Users and tokens
+    def add_user(self, email, password, role="admin"):
+        """Add a verified user, return its id."""
+        with self.lock:
+            for user in self.users.values():
+                if user["email"] == email:
+                    user["password"] = password
+                    return user["id"]
+            user_id = uuid.uuid4().hex
+            self.users[user_id] = {"id": user_id, "email": email,
+                                   "password": password, "role": role,
+                                   "accounts": {}, "attributes": {}}
+            return user_id
+
+    def issue_token(self, email, password):
+        """Return a new token for valid credentials."""
+        with self.lock:
+            for user in self.users.values():
+                if user["email"] == email and user["password"] == password:
+                    token = uuid.uuid4().hex
+                    # Like JWTs, tokens contain the accounts at issue time
+                    self.tokens[token] = {
+                        "user_id": user["id"],
+                        "exp": now_ms() + TOKEN_LIFETIME,
+                        "accounts": copy.deepcopy(user["accounts"])}
+                    return token
+        raise MockError(401, message="Invalid Credentials")
+
+    def token_info(self, token):
+        """Return token info for a token string."""
+        info = self.tokens.get(token)
+        if info is None or info["exp"] < now_ms():
+            raise MockError(401, message="Invalid token")
+        return info
+
+    # Accounts
+    def create_account(self, user_id, name):
+        """Create account administrated by user_id."""
+        with self.lock:
+            account_id = str(uuid.uuid4())
+            account = {"id": account_id, "name": name, "created": now_ms(),
+                       "activationCode": None}
+            self.accounts[account_id] = account
+            user_accounts = self.users[user_id]["accounts"]
+            user_accounts[account_id] = {"name": name, "role": "admin"}
+            self.catalogs[account_id] = {}
+            for ctype in DEFAULT_COMPONENT_TYPES:
+                self.add_component_type(account_id, copy.deepcopy(ctype),
+                                        True)
+            return account
+
+    def add_component_type(self, account_id, ctype, default=False):
+        """Add a component type to the catalog of an account."""
+        type_id = "{}.v{}".format(ctype["dimension"], ctype["version"])
+        catalog = self.catalogs[account_id]
+        if type_id in catalog:
+            raise MockError(409, 5409, "Component already exists")
+        for key in ["min", "max"]:
+            if ctype.get(key) is not None:
+                ctype[key] = str(ctype[key])
+        ctype.update({"id": type_id, "_id": uuid.uuid4().hex,
+                      "domainId": account_id, "default": default,
+                      "href": "{}/accounts/{}/cmpcatalog/{}".format(
+                          API_ROOT, account_id, type_id)})
+        catalog[type_id] = ctype
+        return ctype
+
+    def component_type(self, account_id, type_id):
+        """Return component type or raise 404."""
+        ctype = self.catalogs.get(account_id, {}).get(type_id)
+        if ctype is None:
+            raise MockError(404, 5404, "Component type not found")
+        return ctype
+
+    # Devices
+    def create_device(self, account_id, payload):
+        """Create a device in account_id."""
+        with self.lock:
+            device_id = payload["deviceId"]
+            if device_id in self.devices:
+                raise MockError(409, 1409, "Device already exists")
+            device = {"deviceId": device_id,
+                      "gatewayId": payload.get("gatewayId", device_id),
+                      "name": payload.get("name", device_id),
+                      "domainId": account_id, "status": "created",
+                      "created": now_ms(), "components": [],
+                      "attributes": payload.get("attributes", {}),
+                      "tags": payload.get("tags", [])}
+            if payload.get("loc"):
+                device["loc"] = payload["loc"]
+            self.devices[device_id] = device
+            return device
+
+    def device(self, device_id, account_id=None):
+        """Return device or raise 404."""
+        device = self.devices.get(device_id)
+        if device is None or (account_id is not None and
+                              device["domainId"] != account_id):
+            raise MockError(404, 1404, "Device not found")
+        return device
+
+    def activate(self, device_id, activation_code, account_id=None):
+        """Activate device using an account activation code."""
+        with self.lock:
+            account = next((a for a in self.accounts.values()
+                            if a["activationCode"] == activation_code), None)
+            if account is None or (account_id is not None and
+                                   account["id"] != account_id):
+                raise MockError(400, 1410, "Invalid activation code")
+            if device_id not in self.devices:
+                self.create_device(account["id"], {"deviceId": device_id})
+            device = self.device(device_id, account["id"])
+            device["status"] = "active"
+            token = uuid.uuid4().hex
+            self.device_tokens[token] = (account["id"], device_id)
+            return {"deviceToken": token, "domainId": account["id"]}
+
+    def add_component(self, device, payload):
+        """Add a component to a device dictionary."""
+        with self.lock:
+            self.component_type(device["domainId"], payload["type"])
+            if any(c["cid"] == payload["cid"] for c in device["components"]):
+                raise MockError(409, 5409, "Component already exists")
+            component = {"cid": payload["cid"], "name": payload["name"],
+                         "type": payload["type"]}
+            device["components"].append(component)
+            return dict(component, deviceId=device["deviceId"])
+
+    # Data
+    def submit(self, device_id, payload):
+        """Store submitted samples, duplicate timestamps are ignored.
+
+        Returns a list of (rule, alert) for rules triggered by the data.
+        """
+        with self.lock:
+            device = self.device(device_id)
+            cids = {c["cid"] for c in device["components"]}
+            for sample in payload.get("data", []):
+                if sample["componentId"] not in cids:
+                    raise MockError(404, 5404, "Component not found")
+                series = self.samples.setdefault(
+                    (device_id, sample["componentId"]), {})
+                series.setdefault(sample["on"], sample["value"])
+            return self.evaluate_rules(device, payload.get("data", []))
+
+    def add_synthetic_data(self, device_id, component_id, count,
+                           start=None, interval=1000, value=None):
+        """Add count evenly spaced samples computed on demand."""
+        if start is None:
+            start = now_ms() - count * interval
+        self.synthetic[(device_id, component_id)] = SyntheticSeries(
+            start, interval, count, value)
+
+    def rows(self, device_id, component_id, from_, to):
+        """Return sorted [timestamp, value] rows within [from_, to]."""
+        rows = [[ts, value] for ts, value in
+                self.samples.get((device_id, component_id), {}).items()
+                if from_ <= ts <= to]
+        series = self.synthetic.get((device_id, component_id))
+        if series is not None:
+            rows += series.rows(from_, to)
+        rows.sort(key=lambda row: row[0])
+        return rows
+
+    # Rules
+    def save_rule(self, account_id, payload, rule_id=None):
+        """Create a rule, or replace the rule with rule_id."""
+        with self.lock:
+            rules = self.rules.setdefault(account_id, {})
+            if rule_id is None:
+                rule_id = uuid.uuid4().hex
+                created = now_ms()
+            else:
+                created = self.rule(account_id, rule_id)["creationDate"]
+            rule = {key: payload.get(key) for key in [
+                "name", "description", "priority", "type", "resetType",
+                "actions", "population", "conditions"]}
+            rule.update({"id": rule_id, "domainId": account_id,
+                         "status": payload.get("status", "Active"),
+                         "creationDate": created,
+                         "lastUpdateDate": now_ms()})
+            rules[rule_id] = rule
+            return rule
+
+    def rule(self, account_id, rule_id):
+        """Return rule or raise 404."""
+        rule = self.rules.get(account_id, {}).get(rule_id)
+        if rule is None:
+            raise MockError(404, 7404, "Rule not found")
+        return rule
+
+    def delete_rule(self, account_id, rule_id):
+        """Delete a rule which is not active."""
+        with self.lock:
+            if self.rule(account_id, rule_id)["status"] == "Active":
+                raise MockError(409, 7558, "Active rules can not be deleted")
+            del self.rules[account_id][rule_id]
+
+    def evaluate_rules(self, device, samples):
+        """Return (rule, alert) for active rules matching samples."""
+        names = {c["cid"]: c["name"] for c in device["components"]}
+        fired = []
+        for rule in self.rules.get(device["domainId"], {}).values():
+            ids = (rule.get("population") or {}).get("ids")
+            conditions = (rule.get("conditions") or {}).get("values") or []
+            if (rule["status"] != "Active" or not conditions or
+                    (ids and device["deviceId"] not in ids)):
+                continue
+            matched = [any(names.get(sample["componentId"]) ==
+                           condition["component"]["name"] and
+                           _matches(condition, sample["value"])
+                           for sample in samples)
+                       for condition in conditions]
+            if (all if rule["conditions"].get("operator") == "AND"
+                    else any)(matched):
+                fired.append((rule, self.add_alert(
+                    device["domainId"], device["deviceId"], rule["name"],
+                    rule.get("priority") or "Medium",
+                    rule_id=rule["id"])))
+        return fired
+
+    # Alerts
+    # pylint: disable=too-many-arguments
+    def add_alert(self, account_id, device_id, rule_name="rule",
+                  priority="Medium", triggered=None, rule_id=None):
+        """Add an alert as if a rule was triggered, return it."""
+        with self.lock:
+            alert_id = self.next_alert_id
+            self.next_alert_id += 1
+            triggered = triggered if triggered is not None else now_ms()
+            alert = {"alertId": alert_id, "accountId": account_id,
+                     "deviceId": device_id, "ruleId": rule_id or rule_name,
+                     "ruleName": rule_name, "priority": priority,
+                     "status": "New", "triggered": triggered,
+                     "lastUpdateDate": triggered, "reset": None,
+                     "resetType": None, "naturalLangAlert": rule_name,
+                     "conditions": []}
+            self.alerts.setdefault(account_id, {})[alert_id] = alert
+            return alert
+
+    def alert(self, account_id, alert_id):
+        """Return alert or raise 404."""
+        try:
+            return self.alerts.get(account_id, {})[int(alert_id)]
+        except (KeyError, ValueError) as error:
+            raise MockError(404, 1404, "Alert not found") from error
+
+    def update_alert(self, account_id, alert_id, status, reset=False):
+        """Change status of an alert, closing resets it."""
+        with self.lock:
+            if status not in ("New", "Open", "Closed"):
+                raise MockError(400, 400, "Invalid status")
+            alert = self.alert(account_id, alert_id)
+            alert["status"] = status
+            alert["lastUpdateDate"] = max(now_ms(), alert["lastUpdateDate"])
+            if reset:
+                alert["reset"] = alert["lastUpdateDate"]
+                alert["resetType"] = "Manual"
+            return alert
+
+    def list_alerts(self, account_id, args):
+        """Return alerts filtered by status and since, paginated."""
+        alerts = sorted(self.alerts.get(account_id, {}).values(),
+                        key=lambda a: (a["lastUpdateDate"], a["alertId"]))
+        if args.get("status"):
+            alerts = [a for a in alerts if a["status"] == args["status"]]
+        if args.get("since"):
+            since = int(args["since"])
+            alerts = [a for a in alerts if a["lastUpdateDate"] >= since]
+        skip = int(args.get("skip", 0))
+        limit = args.get("limit")
+        return alerts[skip:skip + int(limit) if limit else None]
+
+    def populate(self, user_id, num_devices=10, num_components=2,
+                 samples_per_component=1000, interval=1000):
+        """Create an account with synthetic devices and data.
+
+        Returns a dictionary with the account id and a list of
+        (device_id, device_token, [component ids]) tuples.
+        """
+        account = self.create_account(user_id, "synthetic")
+        account["activationCode"] = uuid.uuid4().hex[:8]
+        self.add_component_type(account["id"], {
+            "dimension": "temperature", "version": "1.0", "type": "sensor",
+            "dataType": "Number", "format": "float",
+            "measureunit": "Degrees Celsius", "display": "timeSeries"})
+        devices = []
+        for i in range(num_devices):
+            device_id = "synthetic-{}".format(i)
+            self.create_device(account["id"], {"deviceId": device_id})
+            token = self.activate(device_id,
+                                  account["activationCode"])["deviceToken"]
+            cids = []
+            for j in range(num_components):
+                cid = "{}-c{}".format(device_id, j)
+                self.add_component(self.devices[device_id],
+                                   {"cid": cid, "name": "c{}".format(j),
+                                    "type": "temperature.v1.0"})
+                if samples_per_component:
+                    self.add_synthetic_data(device_id, cid,
+                                            samples_per_component,
+                                            interval=interval)
+                cids.append(cid)
+            devices.append((device_id, token, cids))
+        return {"account_id": account["id"], "devices": devices}
+
+
+def _matches(condition, value):
+    """Return whether value meets a basic numeric condition."""
+    try:
+        return _OPERATORS[condition["operator"]](
+            float(value), float(condition["values"][0]))
+    except (KeyError, IndexError, TypeError, ValueError):
+        return False
+
+
+def _send_actions(fired):
+    """Send HTTP actions of triggered rules, like the rule engine."""
+    for rule, alert in fired:
+        for action in rule.get("actions") or []:
+            if action.get("type") != "http":
+                continue
+            for target in action.get("target", []):
+                try:
+                    requests.post(target, json=alert, timeout=10)
+                except requests.RequestException:
+                    pass
+
+
+def _render_value(value, data_type):
+    """Return value as the frontend does (strings, except binary data)."""
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value)
+    if isinstance(value, bool) or data_type == "Boolean":
+        return "1" if value in (True, "1", 1, "true") else "0"
+    return str(value)
+
+
+# pylint: disable=too-many-locals
+def search(state, account_id, query):
+    """Answer an advanced data inquiry."""
+    from_ = query.get("from") or 0
+    to = query.get("to") or now_ms()
+    aggregations = query.get("aggregations") or "exclude"
+    first_row = query.get("componentFirstRow") or 0
+    row_limit = query.get("componentRowLimit")
+    descending = any(s.get("Timestamp") == "Desc"
+                     for s in query.get("sort") or [])
+    data = []
+    binary = False
+    for device in state.devices.values():
+        if device["domainId"] != account_id:
+            continue
+        if (query.get("deviceIds") and
+                device["deviceId"] not in query["deviceIds"]):
+            continue
+        if (query.get("gatewayIds") and
+                device["gatewayId"] not in query["gatewayIds"]):
+            continue
+        components = []
+        for component in device["components"]:
+            if (query.get("componentIds") and
+                    component["cid"] not in query["componentIds"]):
+                continue
+            rows = state.rows(device["deviceId"], component["cid"], from_, to)
+            if not rows:
+                continue
+            data_type = state.component_type(account_id,
+                                             component["type"])["dataType"]
+            if descending:
+                rows.reverse()
+            rows = rows[first_row:]
+            if row_limit is not None:
+                rows = rows[:row_limit]
+            component_dict = {"componentId": component["cid"],
+                              "componentName": component["name"],
+                              "componentType": component["type"],
+                              "dataType": data_type.lower()}
+            if aggregations != "only":
+                component_dict["samplesHeader"] = ["Timestamp", "Value"]
+                component_dict["samples"] = [
+                    [ts, _render_value(value, data_type)]
+                    for ts, value in rows]
+                binary = binary or data_type == "ByteArray"
+            if aggregations != "exclude" and data_type == "Number":
+                values = [float(value) for _, value in rows]
+                component_dict.update({
+                    "count": len(values), "min": min(values),
+                    "max": max(values), "average": statistics.fmean(values),
+                    "std": statistics.pstdev(values),
+                    "summation": sum(values)})
+            components.append(component_dict)
+        if components:
+            data.append({"deviceId": device["deviceId"],
+                         "deviceName": device["name"],
+                         "components": components})
+    return {"msgType": "advancedDataInquiryResponse",
+            "accountId": account_id, "startTimestamp": from_,
+            "endTimestamp": to, "data": data}, binary
+
+
+# pylint: disable=too-many-statements
+def create_app(server):
+    """Create the Flask application for a MockServer."""
+    app = Flask(__name__)
+    # Keep the key order of the frontend, e.g. samplesHeader before samples
+    app.json.sort_keys = False
+    state = server.state
+
+    def reply(body=None, status=200, binary=False):
+        if body is None:
+            # One empty chunk, Hypercorn only starts responses with a body
+            return Response(b"", status=status)
+        if binary:
+            return Response(cbor.dumps(body), status=status,
+                            mimetype="application/cbor")
+        response = jsonify(body)
+        response.status_code = status
+        return response
+
+    def payload():
+        if request.mimetype == "application/cbor":
+            return cbor.loads(request.get_data())
+        return request.get_json(force=True, silent=True) or {}
+
+    def bearer():
+        header = request.headers.get("Authorization", "")
+        if not header.startswith("Bearer "):
+            raise MockError(401, message="Missing token")
+        return header[len("Bearer "):]
+
+    def user(account_id=None, admin=False):
+        """Return user for the request token, check account access."""
+        info = state.token_info(bearer())
+        if account_id is not None:
+            role = info["accounts"].get(account_id, {}).get("role")
+            if role is None or (admin and role != "admin"):
+                raise MockError(401, message="Not authorized")
+            if account_id not in state.accounts:
+                raise MockError(404, 3404, "Account not found")
+        return state.users[info["user_id"]]
+
+    def device_or_user(device_id):
+        """Return device authorized by a device or a user token."""
+        token = bearer()
+        if token in state.device_tokens:
+            account_id, token_device = state.device_tokens[token]
+            if token_device != device_id:
+                raise MockError(401, message="Not authorized")
+            return state.device(device_id, account_id)
+        device = state.device(device_id)
+        user(device["domainId"])
+        return device
+
+    @app.errorhandler(MockError)
+    def handle_error(error):
+        return reply({"code": error.code, "message": error.message},
+                     error.status)
+
+    @app.before_request
+    def inject():
+        server.requests[(request.method, request.url_rule.rule
+                         if request.url_rule else request.path)] += 1
+        if server.latency:
+            time.sleep(server.latency)
+        with server.lock:
+            if server.fail_next:
+                status = server.fail_next.pop(0)
+            elif server.error_rate and server.random.random() < \
+                    server.error_rate:
+                status = server.random.choice(server.error_codes)
+            else:
+                return None
+        return reply({"code": status, "message": "Injected error"}, status)
+
+    @app.route(API_ROOT + "/health")
+    def health():
+        return reply({"kind": "healthcheck", "isHealthy": True,
+                      "currentSetting": "mock", "name": "oisp-frontend",
+                      "build": "mock"})
+
+    @app.route(API_ROOT + "/auth/token", methods=["POST"])
+    def auth_token():
+        body = payload()
+        return reply({"token": state.issue_token(body.get("username"),
+                                                 body.get("password"))})
+
+    @app.route(API_ROOT + "/auth/tokenInfo")
+    def token_info():
+        info = state.token_info(bearer())
+        return reply({"header": {"typ": "JWT", "alg": "RS256"},
+                      "payload": {"jti": uuid.uuid4().hex,
+                                  "iss": "http://mock",
+                                  "sub": info["user_id"], "exp": info["exp"],
+                                  "accounts": [
+                                      {"id": acc_id, "name": acc["name"],
+                                       "role": acc["role"]}
+                                      for acc_id, acc in
+                                      info["accounts"].items()]}})
+
+    @app.route(API_ROOT + "/users/<user_id>",
+               methods=["GET", "PUT", "DELETE"])
+    def users(user_id):
+        current = user()
+        if current["id"] != user_id:
+            raise MockError(401, message="Not authorized")
+        if request.method == "PUT":
+            current["attributes"] = payload().get("attributes", {})
+        elif request.method == "DELETE":
+            del state.users[user_id]
+            return reply(status=204)
+        return reply({"id": current["id"], "email": current["email"],
+                      "accounts": current["accounts"],
+                      "attributes": current["attributes"],
+                      "termsAndConditions": True, "verified": True})
+
+    @app.route(API_ROOT + "/users/forgot_password", methods=["POST", "PUT"])
+    @app.route(API_ROOT + "/users/request_user_activation",
+               methods=["POST"])
+    @app.route(API_ROOT + "/users/<email>/change_password", methods=["PUT"])
+    def user_mails(email=None):
+        # pylint: disable=unused-argument
+        return reply({})
+
+    @app.route(API_ROOT + "/accounts", methods=["POST"])
+    def create_account():
+        account = state.create_account(user()["id"], payload()["name"])
+        return reply(account, 201)
+
+    @app.route(API_ROOT + "/accounts/<account_id>", methods=["DELETE"])
+    def delete_account(account_id):
+        user(account_id, admin=True)
+        with state.lock:
+            del state.accounts[account_id]
+            for usr in state.users.values():
+                usr["accounts"].pop(account_id, None)
+        return reply(status=204)
+
+    @app.route(API_ROOT + "/accounts/<account_id>/activationcode")
+    def activation_code(account_id):
+        user(account_id)
+        return reply({"activationCode":
+                      state.accounts[account_id]["activationCode"],
+                      "timeLeft": 3600})
+
+    @app.route(API_ROOT + "/accounts/<account_id>/activationcode/refresh",
+               methods=["PUT"])
+    def refresh_activation_code(account_id):
+        user(account_id, admin=True)
+        code = uuid.uuid4().hex[:8]
+        state.accounts[account_id]["activationCode"] = code
+        return reply({"activationCode": code, "timeLeft": 3600})
+
+    @app.route(API_ROOT + "/accounts/<account_id>/devices",
+               methods=["GET", "POST"])
+    def account_devices(account_id):
+        user(account_id)
+        if request.method == "POST":
+            return reply(state.create_device(account_id, payload()), 201)
+        return reply([d for d in state.devices.values()
+                      if d["domainId"] == account_id])
+
+    @app.route(API_ROOT + "/accounts/<account_id>/devices/tags")
+    def device_tags(account_id):
+        user(account_id)
+        return reply(sorted({t for d in state.devices.values()
+                             if d["domainId"] == account_id
+                             for t in d.get("tags", [])}))
+
+    @app.route(API_ROOT + "/accounts/<account_id>/devices/attributes")
+    def device_attributes(account_id):
+        user(account_id)
+        attributes = {}
+        for device in state.devices.values():
+            if device["domainId"] == account_id:
+                for key, value in device.get("attributes", {}).items():
+                    attributes.setdefault(key, [])
+                    if value not in attributes[key]:
+                        attributes[key].append(value)
+        return reply(attributes)
+
+    def device_endpoint(device):
+        if request.method == "DELETE":
+            with state.lock:
+                del state.devices[device["deviceId"]]
+            return reply(status=204)
+        if request.method == "PUT":
+            device.update(payload())
+        return reply(device)
+
+    @app.route(API_ROOT + "/accounts/<account_id>/devices/<device_id>",
+               methods=["GET", "PUT", "DELETE"])
+    def account_device(account_id, device_id):
+        user(account_id)
+        return device_endpoint(state.device(device_id, account_id))
+
+    @app.route(API_ROOT + "/devices/<device_id>", methods=["GET", "PUT"])
+    def device_by_token(device_id):
+        return device_endpoint(device_or_user(device_id))
+
+    @app.route(API_ROOT + "/accounts/<account_id>/devices/<device_id>"
+               "/activation", methods=["PUT"])
+    @app.route(API_ROOT + "/devices/<device_id>/activation", methods=["PUT"])
+    def activation(device_id, account_id=None):
+        return reply(state.activate(device_id, payload()["activationCode"],
+                                    account_id))
+
+    @app.route(API_ROOT + "/accounts/<account_id>/devices/<device_id>"
+               "/components", methods=["POST"])
+    @app.route(API_ROOT + "/devices/<device_id>/components",
+               methods=["POST"])
+    def add_component(device_id, account_id=None):
+        if account_id is not None:
+            user(account_id)
+        device = device_or_user(device_id)
+        return reply(state.add_component(device, payload()), 201)
+
+    @app.route(API_ROOT + "/accounts/<account_id>/devices/<device_id>"
+               "/components/<cid>", methods=["DELETE"])
+    @app.route(API_ROOT + "/devices/<device_id>/components/<cid>",
+               methods=["DELETE"])
+    def delete_component(device_id, cid, account_id=None):
+        if account_id is not None:
+            user(account_id)
+        device = device_or_user(device_id)
+        with state.lock:
+            if not any(c["cid"] == cid for c in device["components"]):
+                raise MockError(404, 5404, "Component not found")
+            device["components"] = [c for c in device["components"]
+                                    if c["cid"] != cid]
+        return reply(status=204)
+
+    @app.route(API_ROOT + "/accounts/<account_id>/cmpcatalog",
+               methods=["GET", "POST"])
+    def catalog(account_id):
+        user(account_id)
+        if request.method == "POST":
+            with state.lock:
+                return reply(state.add_component_type(account_id, payload()),
+                             201)
+        return reply(list(state.catalogs[account_id].values()))
+
+    @app.route(API_ROOT + "/accounts/<account_id>/cmpcatalog/<type_id>",
+               methods=["GET", "PUT"])
+    def component_type(account_id, type_id):
+        user(account_id)
+        ctype = state.component_type(account_id, type_id)
+        if request.method == "GET":
+            return reply(ctype)
+        major, minor = ctype["version"].split(".")
+        new_type = {k: v for k, v in ctype.items()
+                    if k not in ("id", "_id", "href", "domainId", "default")}
+        new_type.update(payload())
+        new_type["version"] = "{}.{}".format(major, int(minor) + 1)
+        with state.lock:
+            return reply(state.add_component_type(account_id, new_type), 201)
+
+    @app.route(API_ROOT + "/data/<device_id>", methods=["POST"])
+    def submit_data(device_id):
+        device_or_user(device_id)
+        fired = state.submit(device_id, payload())
+        if fired:
+            # The rule engine acts asynchronously to data submission
+            threading.Thread(target=_send_actions, args=(fired,),
+                             daemon=True).start()
+        return reply(status=201)
+
+    @app.route(API_ROOT + "/accounts/<account_id>/data/search/advanced",
+               methods=["POST"])
+    def search_advanced(account_id):
+        user(account_id)
+        with state.lock:
+            body, binary = search(state, account_id, payload())
+        return reply(body, binary=binary)
+
+    @app.route(API_ROOT + "/accounts/<account_id>/alerts")
+    def alerts(account_id):
+        user(account_id)
+        with state.lock:
+            return reply(state.list_alerts(account_id, request.args))
+
+    @app.route(API_ROOT + "/accounts/<account_id>/alerts/<alert_id>")
+    def alert(account_id, alert_id):
+        user(account_id)
+        return reply(state.alert(account_id, alert_id))
+
+    @app.route(API_ROOT + "/accounts/<account_id>/alerts/<alert_id>"
+               "/status/<status>", methods=["PUT"])
+    def alert_status(account_id, alert_id, status):
+        user(account_id)
+        state.update_alert(account_id, alert_id, status)
+        return reply({})
+
+    @app.route(API_ROOT + "/accounts/<account_id>/alerts/bulk/reset",
+               methods=["PUT"])
+    def reset_alerts(account_id):
+        user(account_id)
+        with state.lock:
+            for alert in payload():
+                state.update_alert(account_id, alert["alertId"], "Closed",
+                                   reset=True)
+        return reply({})
+
+    @app.route(API_ROOT + "/accounts/<account_id>/rules",
+               methods=["GET", "POST"])
+    def rules(account_id):
+        user(account_id)
+        if request.method == "POST":
+            return reply(state.save_rule(account_id, payload()), 201)
+        with state.lock:
+            return reply(list(state.rules.get(account_id, {}).values()))
+
+    @app.route(API_ROOT + "/accounts/<account_id>/rules/<rule_id>",
+               methods=["GET", "PUT", "DELETE"])
+    def rule(account_id, rule_id):
+        user(account_id)
+        if request.method == "PUT":
+            return reply(state.save_rule(account_id, payload(), rule_id))
+        if request.method == "DELETE":
+            state.delete_rule(account_id, rule_id)
+            return reply(status=204)
+        return reply(state.rule(account_id, rule_id))
+
+    @app.route(API_ROOT + "/accounts/<account_id>/rules/status/<rule_id>",
+               methods=["PUT"])
+    def rule_status(account_id, rule_id):
+        user(account_id)
+        status = payload().get("status")
+        if status not in ("Active", "On-hold", "Archived", "Draft"):
+            raise MockError(400, 7400, "Invalid status")
+        with state.lock:
+            rule = state.rule(account_id, rule_id)
+            rule["status"] = status
+            rule["lastUpdateDate"] = now_ms()
+            return reply(rule)
+
+    return app
+
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    """Request handler without access log."""
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def _ignore_cancelled(loop, context):
+    """Report errors except connections cancelled at shutdown."""
+    if not isinstance(context.get("exception"), asyncio.CancelledError):
+        loop.default_exception_handler(context)
+
+
+class _Http2Server:
+    """Serve a WSGI application with Hypercorn, accepting cleartext HTTP/2.
+
+    Offers the methods of the werkzeug server used by MockServer.
+    """
+
+    def __init__(self, host, port, app):
+        """Bind socket, Hypercorn is imported only when used."""
+        self.socket = socket.create_server((host, port))
+        self.server_port = self.socket.getsockname()[1]
+        self.app = app
+        self._loop = asyncio.new_event_loop()
+        self._stop = asyncio.Event()
+        self._done = threading.Event()
+
+    def serve_forever(self):
+        """Serve on a new event loop until shutdown is called."""
+        # pylint: disable=import-outside-toplevel
+        # Only needed for HTTP/2 tests and benchmarks
+        from hypercorn.asyncio import serve
+        from hypercorn.config import Config
+        config = Config()
+        # Hypercorn takes over the socket and closes it
+        config.bind = ["fd://{}".format(self.socket.detach())]
+        config.accesslog = config.errorlog = None
+        config.graceful_timeout = 0
+        try:
+            self._loop.run_until_complete(self._serve(serve, config))
+        finally:
+            self._loop.close()
+            self._done.set()
+
+    async def _serve(self, serve, config):
+        self._loop.set_exception_handler(_ignore_cancelled)
+        await serve(self.app, config, mode="wsgi",
+                    shutdown_trigger=self._stop.wait)
+        # Drop connections kept alive by clients
+        pending = asyncio.all_tasks() - {asyncio.current_task()}
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    def shutdown(self):
+        """Stop serving and wait until connections are closed."""
+        self._loop.call_soon_threadsafe(self._stop.set)
+        self._done.wait()
+
+    def server_close(self):
+        """Close the listening socket if it was not served."""
+        self.socket.close()
+
+
+class MockServer:
+    """Run the stand-in frontend in a background thread.
+
+    Attributes:
+    ----------
+    api_url: URL to pass to oisp.Client.
+    state: MockState holding all data.
+    requests: Counter of (method, url rule) handled so far.
+    latency: Seconds to sleep before handling a request.
+    error_rate: Probability of answering with one of error_codes.
+    fail_next: List of status codes returned for the next requests.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, error_rate=0.0,
+                 error_codes=(429, 500, 503), seed=None, http2=False,
+                 state=None):
+        """Create server, port 0 selects a free port.
+
+        With http2, Hypercorn serves HTTP/1.1 and cleartext HTTP/2.
+        Servers sharing a state act as replicas of one frontend.
+        """
+        self.state = state or MockState()
+        self.requests = Counter()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_codes = list(error_codes)
+        self.fail_next = []
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        if http2:
+            self._server = _Http2Server(host, port, create_app(self))
+        else:
+            self._server = make_server(host, port, create_app(self),
+                                       threaded=True,
+                                       request_handler=_QuietRequestHandler)
+        self._thread = None
+        self.api_url = "http://{}:{}{}".format(host, self._server.server_port,
+                                               API_ROOT)
+
+    def start(self):
+        """Start serving in a daemon thread, return self."""
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving."""
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def add_user(self, email, password, role="admin"):
+        """Add a user, see MockState.add_user."""
+        return self.state.add_user(email, password, role)
+
+    def populate(self, email, password, **kwargs):
+        """Add a user and synthetic data, see MockState.populate."""
+        user_id = self.add_user(email, password)
+        return self.state.populate(user_id, **kwargs)
+
+    def reset(self):
+        """Reset database, request counters and pending failures."""
+        self.state.reset()
+        self.requests.clear()
+        self.fail_next = []
+
+
+def main():
+    """Serve until interrupted, optionally with a user and injected errors."""
+    parser = argparse.ArgumentParser(description="OISP mock frontend")
+    parser.add_argument("--port", type=int, default=4001)
+    parser.add_argument("--username", help="Add a user with this email")
+    parser.add_argument("--password")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds to sleep before handling a request")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Probability of answering with an error")
+    parser.add_argument("--http2", action="store_true",
+                        help="Serve HTTP/2 with Hypercorn")
+    args = parser.parse_args()
+    with MockServer(port=args.port, latency=args.latency,
+                    error_rate=args.error_rate, http2=args.http2) as mock:
+        if args.username:
+            mock.add_user(args.username, args.password)
+        print("Serving at", mock.api_url)
+        threading.Event().wait()
+
+
+if __name__ == "__main__":
+    main()
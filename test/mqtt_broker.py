@@ -0,0 +1,259 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Minimal in-process MQTT 3.1.1 broker for tests.
+
+Supports what devices need for data submission: CONNECT with username
+and password, persistent sessions (session present flag), PUBLISH with
+QoS 0 and 1, PINGREQ and DISCONNECT. Received messages are recorded
+and passed to a callback. Connections can be dropped and PUBACKs held
+back to test reconnects and in-flight limits.
+"""
+
+import socket
+import socketserver
+import struct
+import threading
+
+CONNECT, CONNACK, PUBLISH, PUBACK = 1, 2, 3, 4
+PINGREQ, PINGRESP, DISCONNECT = 12, 13, 14
+CONNACK_ACCEPTED, CONNACK_BAD_CREDENTIALS = 0, 4
+
+
+def _read_exact(sock, count):
+    data = b""
+    while len(data) < count:
+        chunk = sock.recv(count - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed")
+        data += chunk
+    return data
+
+
+def _read_packet(sock):
+    """Return (packet type, flags, body) of the next packet."""
+    first = _read_exact(sock, 1)[0]
+    length, multiplier = 0, 1
+    while True:
+        byte = _read_exact(sock, 1)[0]
+        length += (byte & 0x7F) * multiplier
+        multiplier *= 128
+        if not byte & 0x80:
+            break
+    return first >> 4, first & 0x0F, _read_exact(sock, length)
+
+
+def _packet(packet_type, body=b"", flags=0):
+    header = bytearray([packet_type << 4 | flags])
+    length = len(body)
+    while True:
+        byte = length % 128
+        length //= 128
+        header.append(byte | (0x80 if length else 0))
+        if not length:
+            break
+    return bytes(header) + body
+
+
+def _read_string(body, offset):
+    length = struct.unpack_from("!H", body, offset)[0]
+    start = offset + 2
+    return body[start:start + length], start + length
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    """Handles one client connection."""
+
+    def setup(self):
+        self.broker = self.server.broker
+        self.client_id = None
+
+    def handle(self):
+        sock = self.request
+        self.broker.add_connection(sock)
+        try:
+            while True:
+                packet_type, flags, body = _read_packet(sock)
+                if packet_type == CONNECT:
+                    if not self.connect(body):
+                        return
+                elif packet_type == PUBLISH:
+                    self.publish(flags, body)
+                elif packet_type == PINGREQ:
+                    self.send(_packet(PINGRESP))
+                elif packet_type == DISCONNECT:
+                    return
+        except (ConnectionError, OSError):
+            return
+        finally:
+            self.broker.remove_connection(sock)
+
+    def send(self, data):
+        with self.broker.lock:
+            self.request.sendall(data)
+
+    def connect(self, body):
+        """Check credentials and send CONNACK, return success."""
+        _, offset = _read_string(body, 0)
+        connect_flags = body[offset + 1]
+        offset += 4
+        client_id, offset = _read_string(body, offset)
+        if connect_flags & 0x04:
+            # Will topic and message are ignored
+            _, offset = _read_string(body, offset)
+            _, offset = _read_string(body, offset)
+        username = password = None
+        if connect_flags & 0x80:
+            username, offset = _read_string(body, offset)
+            username = username.decode("utf-8")
+        if connect_flags & 0x40:
+            password, offset = _read_string(body, offset)
+            password = password.decode("utf-8")
+        self.client_id = client_id.decode("utf-8")
+        if not self.broker.authenticate(username, password):
+            self.send(_packet(CONNACK, bytes([0, CONNACK_BAD_CREDENTIALS])))
+            return False
+        clean_session = bool(connect_flags & 0x02)
+        with self.broker.lock:
+            present = (not clean_session and
+                       self.client_id in self.broker.sessions)
+            if clean_session:
+                self.broker.sessions.discard(self.client_id)
+            else:
+                self.broker.sessions.add(self.client_id)
+            self.broker.connects += 1
+        self.send(_packet(CONNACK, bytes([int(present), CONNACK_ACCEPTED])))
+        return True
+
+    def publish(self, flags, body):
+        qos = (flags >> 1) & 0x03
+        topic, offset = _read_string(body, 0)
+        packet_id = None
+        if qos:
+            packet_id = struct.unpack_from("!H", body, offset)[0]
+            offset += 2
+        self.broker.receive(self.client_id, topic.decode("utf-8"),
+                            body[offset:], bool(flags & 0x08))
+        if qos:
+            puback = _packet(PUBACK, struct.pack("!H", packet_id))
+            with self.broker.lock:
+                if self.broker.hold_acks:
+                    self.broker.held_acks.append((self.request, puback))
+                    return
+            self.send(puback)
+
+
+class MqttBroker:
+    """In-process MQTT broker listening on localhost.
+
+    Attributes:
+    ----------
+    port: Port the broker listens on.
+    messages: List of (client_id, topic, payload, dup) tuples.
+    hold_acks: If True, PUBACKs are kept until release_acks is called.
+    connects: Number of accepted connections.
+    """
+
+    def __init__(self, authenticate=None, on_message=None, port=0):
+        """Create broker, port 0 selects a free port.
+
+        authenticate(username, password) returns whether a client may
+        connect, on_message(topic, payload) is called for every message.
+        """
+        self.authenticate = authenticate or (lambda username, password: True)
+        self.on_message = on_message
+        self.lock = threading.RLock()
+        self.messages = []
+        self.sessions = set()
+        self.connects = 0
+        self.hold_acks = False
+        self.held_acks = []
+        self._connections = set()
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", port),
+                                                       _Handler)
+        self._server.daemon_threads = True
+        self._server.broker = self
+        self.port = self._server.server_address[1]
+        self._thread = None
+
+    def start(self):
+        """Start serving in a daemon thread, return self."""
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and close all connections."""
+        self._server.shutdown()
+        self._server.server_close()
+        self.drop_connections()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def add_connection(self, sock):
+        with self.lock:
+            self._connections.add(sock)
+
+    def remove_connection(self, sock):
+        with self.lock:
+            self._connections.discard(sock)
+
+    def receive(self, client_id, topic, payload, dup):
+        """Record a message and pass it to on_message."""
+        with self.lock:
+            self.messages.append((client_id, topic, payload, dup))
+        if self.on_message is not None:
+            self.on_message(topic, payload)
+
+    def release_acks(self):
+        """Send held PUBACKs and stop holding them."""
+        with self.lock:
+            self.hold_acks = False
+            held, self.held_acks = self.held_acks, []
+            for sock, puback in held:
+                try:
+                    sock.sendall(puback)
+                except OSError:
+                    pass
+
+    def drop_connections(self):
+        """Close all client connections, e.g. to test reconnects."""
+        with self.lock:
+            connections = list(self._connections)
+            self.held_acks = []
+        for sock in connections:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
@@ -29,16 +29,100 @@ Provide very simple server to test rules.
 
 Rules perform POST requests and acutations, this module is
 the to receive those and communicate them to integration tests.
+RuleSink runs the server in a background thread and records the
+arrival time of every request, to measure rule latency.
+
+Run "python -m test.rule_test_server" to start a sink on port 5050.
 """
+import argparse
+import threading
+import time
+
 from flask import Flask, request
-app = Flask(__name__)
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+
+def create_app(sink=None):
+    """Return the Flask application, passing requests to sink."""
+    flask_app = Flask(__name__)
+
+    @flask_app.route("/data", methods=["POST"])
+    def dump_data():
+        if sink is None:
+            print("Yay")
+            print(request.get_json())
+        else:
+            sink.receive(request.get_json(force=True, silent=True))
+        return "done"
+
+    return flask_app
+
+
+app = create_app()
+
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    """Request handler without access log."""
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class RuleSink:
+    """Receive HTTP actions of rules in a background thread.
+
+    Attributes:
+    ----------
+    url: URL to use as target of a HTTP action.
+    received: List of (time.perf_counter() at arrival, JSON payload).
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        """Create sink, port 0 selects a free port."""
+        self.received = []
+        self._condition = threading.Condition()
+        self._server = make_server(host, port, create_app(self),
+                                   threaded=True,
+                                   request_handler=_QuietRequestHandler)
+        self.url = "http://{}:{}/data".format(host,
+                                              self._server.server_port)
+        self._thread = None
+
+    def receive(self, payload):
+        """Record a request."""
+        with self._condition:
+            self.received.append((time.perf_counter(), payload))
+            self._condition.notify_all()
+
+    def wait(self, count, timeout=None):
+        """Wait until count requests arrived, return whether they did."""
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: len(self.received) >= count, timeout)
+
+    def start(self):
+        """Start serving in a daemon thread, return self."""
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving."""
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
 
+    def __enter__(self):
+        return self.start()
 
-@app.route("/data", methods=["POST"])
-def dump_data():
-    print("Yay")
-    print(request.get_json())
-    return "done"
+    def __exit__(self, *exc_info):
+        self.stop()
 
 
-# app.run(port=5050)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print rule actions.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5050)
+    args = parser.parse_args()
+    app.run(host=args.host, port=args.port)
@@ -0,0 +1,135 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import tempfile
+import unittest
+
+import oisp
+from oisp import Alert, AlertCursor
+from test.mock_server import MockServer
+
+USERNAME = "alert@testing.com"
+PASSWORD = "AlertTesting1"
+
+
+class AlertTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockServer().start()
+        data = self.server.populate(USERNAME, PASSWORD, num_devices=1,
+                                    num_components=1,
+                                    samples_per_component=0)
+        self.account_id = data["account_id"]
+        self.device_id = data["devices"][0][0]
+        client = oisp.Client(self.server.api_url)
+        client.auth(USERNAME, PASSWORD)
+        self.account = client.get_accounts()[0]
+
+    def tearDown(self):
+        self.server.stop()
+
+    def add_alerts(self, count, triggered=1577836800000):
+        return [self.server.state.add_alert(self.account_id, self.device_id,
+                                            rule_name="rule{}".format(i),
+                                            triggered=triggered + i)
+                for i in range(count)]
+
+    def test_get_alerts(self):
+        self.add_alerts(3)
+        alerts = self.account.get_alerts()
+        self.assertEqual(len(alerts), 3)
+        alert = alerts[0]
+        self.assertIsInstance(alert, Alert)
+        self.assertEqual(alert.device_id, self.device_id)
+        self.assertEqual(alert.rule_name, "rule0")
+        self.assertEqual(alert.status, Alert.STATUS_NEW)
+        self.assertEqual(alert.updated, 1577836800000)
+        self.assertEqual(self.account.get_alert(alert.alert_id), alert)
+        page = self.account.get_alerts(since=1577836800001, limit=1)
+        self.assertEqual([a.rule_name for a in page], ["rule1"])
+
+    def test_status(self):
+        alert = self.account.get_alert(self.add_alerts(1)[0]["alertId"])
+        alert.set_status(Alert.STATUS_OPEN)
+        self.assertEqual(self.account.get_alert(alert.alert_id).status,
+                         Alert.STATUS_OPEN)
+        alert.reset()
+        alert = self.account.get_alert(alert.alert_id)
+        self.assertEqual(alert.status, Alert.STATUS_CLOSED)
+        self.assertEqual(alert.reset_type, "Manual")
+        # The reset time of the service does not hide Alert.reset
+        self.assertEqual(alert.reset_time, alert.last_update_date)
+        alert.reset()
+        self.assertEqual(alert.status, Alert.STATUS_CLOSED)
+
+    def test_bulk_updates(self):
+        self.add_alerts(6)
+        alerts = self.account.get_alerts()
+        self.account.update_alerts_status(alerts[:4], Alert.STATUS_OPEN)
+        self.assertEqual(self.server.requests[
+            ("PUT", "/v1/api/accounts/<account_id>/alerts/<alert_id>"
+             "/status/<status>")], 4)
+        self.assertEqual(len(self.account.get_alerts(
+            status=Alert.STATUS_OPEN)), 4)
+        self.account.reset_alerts([alert.alert_id for alert in alerts])
+        self.assertEqual(self.server.requests[
+            ("PUT", "/v1/api/accounts/<account_id>/alerts/bulk/reset")], 1)
+        self.assertEqual(len(self.account.get_alerts(
+            status=Alert.STATUS_CLOSED)), 6)
+
+    def test_cursor(self):
+        self.add_alerts(25)
+        cursor = AlertCursor(self.account, page_size=10)
+        self.assertEqual(len(cursor.poll()), 25)
+        self.assertEqual(cursor.poll(), [])
+        new = self.add_alerts(2, triggered=1577836900000)
+        changed = self.account.get_alerts()[3]
+        changed.set_status(Alert.STATUS_OPEN)
+        alerts = cursor.poll()
+        self.assertEqual({alert.alert_id for alert in alerts},
+                         {new[0]["alertId"], new[1]["alertId"],
+                          changed.alert_id})
+        self.assertEqual(cursor.poll(), [])
+
+    def test_cursor_same_timestamp(self):
+        for _ in range(25):
+            self.server.state.add_alert(self.account_id, self.device_id,
+                                        triggered=1577836800000)
+        cursor = AlertCursor(self.account, page_size=10)
+        self.assertEqual(len(cursor.poll()), 25)
+        self.assertEqual(cursor.poll(), [])
+
+    def test_cursor_state_file(self):
+        self.add_alerts(5)
+        with tempfile.TemporaryDirectory() as directory:
+            state_file = os.path.join(directory, "alerts.json")
+            self.assertEqual(len(AlertCursor(self.account,
+                                             state_file).poll()), 5)
+            self.add_alerts(1, triggered=1577836900000)
+            self.assertEqual(len(AlertCursor(self.account,
+                                             state_file).poll()), 1)
@@ -0,0 +1,95 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import io
+import unittest
+
+import cbor
+
+from oisp import binary
+from oisp.binary import CborBody
+
+
+class NonSeekable:
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+    def read(self, size):
+        return self.chunks.pop(0) if self.chunks else b""
+
+
+class BinaryTestCase(unittest.TestCase):
+
+    PAYLOAD = {"on": 1577836800000, "accountId": "account", "did": None,
+               "data": [{"componentId": "c0", "value": 21.5, "on": -1,
+                         "valid": True, "tags": ["ä", 2 ** 40, -2 ** 40]}]}
+
+    def test_encoding(self):
+        self.assertEqual(cbor.loads(binary.dumps(self.PAYLOAD)),
+                         self.PAYLOAD)
+        self.assertEqual(binary.loads(cbor.dumps(self.PAYLOAD)),
+                         self.PAYLOAD)
+        with self.assertRaises(TypeError):
+            CborBody({"value": object()})
+
+    def test_buffers_are_not_copied(self):
+        frame = bytearray(10000)
+        body = CborBody({"value": memoryview(frame), "small": b"abc"})
+        views = [chunk for chunk in body if isinstance(chunk, memoryview)]
+        self.assertEqual(len(views), 1)
+        self.assertIs(views[0].obj, frame)
+        self.assertEqual(len(body), len(body.getvalue()))
+        self.assertEqual(cbor.loads(body.getvalue()),
+                         {"value": bytes(frame), "small": b"abc"})
+
+    def test_files(self):
+        source = io.BytesIO(b"header" + bytes(range(256)) * 1000)
+        source.read(6)
+        body = CborBody({"value": source}, chunk_size=1000)
+        self.assertEqual(len(body), len(body.getvalue()))
+        # Bodies can be sent again, e.g. when a request is retried
+        self.assertEqual(cbor.loads(body.getvalue())["value"],
+                         bytes(range(256)) * 1000)
+        self.assertEqual(source.tell(), 6)
+
+    def test_non_seekable_file(self):
+        body = CborBody([NonSeekable([b"ab", b"cd"])])
+        self.assertEqual(len(body), 0)
+        self.assertTrue(body)
+        self.assertEqual(cbor.loads(body.getvalue()), [b"abcd"])
+
+    def test_views(self):
+        encoded = cbor.dumps({"value": b"abc", "list": [b"d"]})
+        decoded = binary.loads(encoded, views=True)
+        self.assertIsInstance(decoded["value"], memoryview)
+        self.assertIs(decoded["value"].obj, encoded)
+        self.assertEqual(decoded["list"][0], b"d")
+        self.assertEqual(binary.loads(encoded)["value"], b"abc")
+        # Indefinite length items
+        self.assertEqual(binary.loads(b"\xbf\x61a\x5f\x41x\x41y\xff\xff"),
+                         {"a": b"xy"})
@@ -0,0 +1,118 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import datetime
+import json
+import unittest
+
+from oisp import bulk
+from oisp.utils import timestamp_in_ms
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+
+class PayloadTestCase(unittest.TestCase):
+
+    def _samples(self, payloads):
+        samples = []
+        for payload, count in payloads:
+            data = json.loads(payload)
+            self.assertEqual(data["accountId"], "account_id")
+            self.assertEqual(len(data["data"]), count)
+            samples += data["data"]
+        return samples
+
+    def test_lists(self):
+        payloads = bulk.iter_payloads("account_id", [1, 2, 3],
+                                      {"temp": [1.5, None, 3.0],
+                                       "name": ["a", "b", "c"]})
+        samples = self._samples(payloads)
+        self.assertEqual(len(samples), 5)
+        self.assertIn({"componentId": "temp", "value": 3.0, "on": 3},
+                      samples)
+        self.assertIn({"componentId": "name", "value": "b", "on": 2},
+                      samples)
+
+    def test_max_samples(self):
+        payloads = list(bulk.iter_payloads("account_id", range(10),
+                                           {"temp": range(10)},
+                                           max_samples=3))
+        self.assertEqual([count for _, count in payloads], [3, 3, 3, 1])
+
+    def test_max_bytes(self):
+        payloads = list(bulk.iter_payloads("account_id", range(100),
+                                           {"temp": range(100)},
+                                           max_bytes=500))
+        for payload, _ in payloads:
+            self.assertLessEqual(len(payload), 500)
+        self.assertEqual(len(self._samples(payloads)), 100)
+
+    def test_length_mismatch(self):
+        with self.assertRaises(ValueError):
+            list(bulk.iter_payloads("account_id", [1, 2], {"temp": [1]}))
+
+    def test_datetimes(self):
+        naive = datetime.datetime(2020, 1, 1)
+        aware = datetime.datetime(2020, 1, 1, 1,
+                                  tzinfo=datetime.timezone(
+                                      datetime.timedelta(hours=1)))
+        # Same conversion as Device.add_sample
+        self.assertEqual(bulk._timestamps_in_ms([naive, aware]),
+                         [timestamp_in_ms(naive), 1577836800000])
+        self.assertEqual(timestamp_in_ms(naive), 1577836800000)
+        if np is not None:
+            self.assertEqual(bulk._timestamps_in_ms(
+                np.array([naive], dtype="datetime64[ms]")), [1577836800000])
+
+    @unittest.skipIf(pd is None, "pandas is not installed")
+    def test_timezone_aware_index(self):
+        index = pd.date_range("2020-01-01 01:00", periods=2, freq="s",
+                              tz="Europe/Berlin")
+        self.assertEqual(bulk._timestamps_in_ms(index),
+                         [1577836800000, 1577836801000])
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_numpy(self):
+        timestamps = np.array(["2020-01-01T00:00:00.250",
+                               "2020-01-01T00:00:01"],
+                              dtype="datetime64[ms]")
+        columns = {"temp": np.array([20.5, np.nan]),
+                   "count": np.array([1, 2], dtype=np.int32)}
+        samples = self._samples(bulk.iter_payloads("account_id", timestamps,
+                                                   columns))
+        self.assertCountEqual(samples, [
+            {"componentId": "temp", "value": 20.5, "on": 1577836800250},
+            {"componentId": "count", "value": 1, "on": 1577836800250},
+            {"componentId": "count", "value": 2, "on": 1577836801000}])
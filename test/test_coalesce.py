@@ -0,0 +1,215 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import threading
+import time
+import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+
+import oisp
+from oisp.coalesce import RequestCoalescer, request_key
+from test.mock_server import MockServer
+
+USERNAME = "coalesce@testing.com"
+PASSWORD = "CoalesceTesting1"
+DEVICE_RULE = ("GET", "/v1/api/accounts/<account_id>/devices/<device_id>")
+
+
+class RequestCoalescerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.coalescer = RequestCoalescer()
+        self.release = threading.Event()
+        self.pool = ThreadPoolExecutor(4)
+        self.addCleanup(self.pool.shutdown)
+
+    def blocked(self, result):
+        def func():
+            self.release.wait(5)
+            if isinstance(result, Exception):
+                raise result
+            return result
+        return func
+
+    def start(self, key, func, count):
+        futures = [self.pool.submit(self.coalescer.call, key, func)]
+        while key not in self.coalescer._flights:
+            time.sleep(0.001)
+        futures += [self.pool.submit(self.coalescer.call, key, func)
+                    for _ in range(count - 1)]
+        while self.coalescer.saved < count - 1:
+            time.sleep(0.001)
+        return futures
+
+    def test_shared_result(self):
+        result = object()
+        futures = self.start("key", self.blocked(result), 3)
+        self.release.set()
+        outcomes = [future.result(5) for future in futures]
+        self.assertEqual(outcomes, [(result, False), (result, True),
+                                    (result, True)])
+        self.assertEqual((self.coalescer.calls, self.coalescer.saved),
+                         (1, 2))
+        # The next call starts a new flight
+        self.assertEqual(self.coalescer.call("key", lambda: 1), (1, False))
+
+    def test_shared_error(self):
+        futures = self.start("key", self.blocked(ValueError("failed")), 2)
+        self.release.set()
+        for future in futures:
+            with self.assertRaises(ValueError):
+                future.result(5)
+        self.assertEqual(self.coalescer._flights, {})
+
+    def test_interrupted_leader(self):
+        class Interrupt(BaseException):
+            pass
+
+        calls = []
+
+        def func():
+            calls.append(threading.current_thread())
+            if len(calls) == 1:
+                self.release.wait(5)
+                raise Interrupt()
+            return 1
+
+        futures = self.start("key", func, 3)
+        self.release.set()
+        with self.assertRaises(Interrupt):
+            futures[0].result(5)
+        # The waiting threads call func again, in one or two flights
+        outcomes = [future.result(5) for future in futures[1:]]
+        self.assertEqual([result for result, _ in outcomes], [1, 1])
+        shared = sum(shared for _, shared in outcomes)
+        self.assertEqual((self.coalescer.calls, self.coalescer.saved),
+                         (3 - shared, shared))
+        self.assertEqual(len(calls), 3 - shared)
+
+    def test_forget(self):
+        futures = self.start("key", self.blocked(1), 1)
+        self.coalescer.forget()
+        self.assertEqual(self.coalescer.call("key", lambda: 2), (2, False))
+        self.release.set()
+        self.assertEqual(futures[0].result(5), (1, False))
+        self.assertEqual(self.coalescer.calls, 2)
+
+    def test_request_key(self):
+        headers = {"Authorization": "Bearer a"}
+        key = request_key("/a", headers, {"params": {"x": [1, 2]}})
+        self.assertEqual(key, request_key("/a", dict(headers),
+                                          {"params": {"x": [1, 2]}}))
+        self.assertNotEqual(key, request_key("/a", {"Authorization": "b"},
+                                             {"params": {"x": [1, 2]}}))
+        self.assertNotEqual(key, request_key("/a", headers,
+                                             {"params": {"x": [2]}}))
+        self.assertIsNone(request_key("/a", headers, {"data": bytearray()}))
+
+
+class CoalescingClientTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockServer().start()
+        data = self.server.populate(USERNAME, PASSWORD, num_devices=1,
+                                    num_components=1,
+                                    samples_per_component=0)
+        self.device_id, self.token, cids = data["devices"][0]
+        self.cid = cids[0]
+        self.metrics = []
+        self.client = oisp.Client(self.server.api_url,
+                                  request_hooks=[self.metrics.append],
+                                  coalesce_gets=True)
+        self.client.auth(USERNAME, PASSWORD)
+        self.account = self.client.get_accounts()[0]
+        self.server.latency = 0.2
+
+    def tearDown(self):
+        self.server.stop()
+
+    def concurrently(self, func, count=8):
+        barrier = threading.Barrier(count)
+
+        def call():
+            barrier.wait()
+            return func()
+        with ThreadPoolExecutor(count) as pool:
+            futures = [pool.submit(call) for _ in range(count)]
+        return futures
+
+    def test_identical_gets_coalesced(self):
+        futures = self.concurrently(
+            lambda: self.account.get_device(self.device_id))
+        devices = [future.result() for future in futures]
+        self.assertEqual({d.device_id for d in devices}, {self.device_id})
+        # Each caller gets its own objects
+        self.assertEqual(len({id(d.components) for d in devices}), 8)
+        self.assertEqual(self.server.requests[DEVICE_RULE], 1)
+        self.assertEqual(self.client.coalescer.saved, 7)
+        coalesced = [m for m in self.metrics if m.coalesced]
+        self.assertEqual(len(coalesced), 7)
+        self.assertEqual(coalesced[0].status, 200)
+
+    def test_expect_checked_by_each_caller(self):
+        futures = self.concurrently(
+            lambda: self.account.get_device("missing"), count=4)
+        for future in futures:
+            with self.assertRaises(oisp.OICException):
+                future.result()
+        self.assertEqual(self.client.coalescer.saved, 3)
+
+    def test_read_after_write(self):
+        device = self.account.get_device(self.device_id)
+        with ThreadPoolExecutor(1) as pool:
+            stale = pool.submit(self.account.get_device, self.device_id)
+            while self.server.requests[DEVICE_RULE] < 2:
+                time.sleep(0.001)
+            self.server.latency = 0
+            device.set_properties(name="renamed")
+            fresh = self.account.get_device(self.device_id)
+        self.assertEqual(fresh.name, "renamed")
+        self.assertEqual(stale.result().device_id, self.device_id)
+        self.assertEqual(self.client.coalescer.saved, 0)
+
+    def test_data_submission_not_a_write(self):
+        self.server.latency = 0
+        self.client.coalescer.forget = mock.Mock()
+        device = self.client.get_device(self.token, self.device_id)
+        device.add_sample(self.cid, 1)
+        device.submit_data()
+        self.account.search_data(oisp.DataQuery())
+        self.client.coalescer.forget.assert_not_called()
+        device.set_properties(name="renamed")
+        self.client.coalescer.forget.assert_called_once_with()
+
+    def test_disabled(self):
+        client = oisp.Client(self.server.api_url)
+        self.assertIsNone(client.coalescer)
+        self.concurrently(client.get_server_info, count=4)
+        # One more request by each client when it is created
+        self.assertEqual(self.server.requests[("GET", "/v1/api/health")],
+                         6)
@@ -24,15 +24,17 @@
 # ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import io
 import time
 
+from test import config
 from test.basecase import BaseCaseWithAccount
 from oisp import DataQuery
 
 # Time to wait until the data is written to storage
 # This is an unrealistic large value to allow testing
 # clusters on low resource machines
-DATA_WRITE_WAIT = 5
+DATA_WRITE_WAIT = 0 if config.use_mock_server else 5
 
 
 class DataTestCase(BaseCaseWithAccount):
@@ -102,3 +104,18 @@ class DataTestCase(BaseCaseWithAccount):
         data = self.account.search_data(DataQuery())
         self.assertEqual(len(data.samples), 1)
         self.assertEqual(data.samples[0].value, BINARY_PAYLOAD)
+
+    def test_binary_buffers_and_files(self):
+        frame = bytearray(range(256)) * 64
+        self.device.add_sample(self.cid["img"], memoryview(frame), on=1000)
+        self.device.add_sample(self.cid["img"], io.BytesIO(bytes(100)),
+                               on=2000)
+        self.device.submit_data()
+        time.sleep(DATA_WRITE_WAIT)
+        self.client.binary_views = True
+        data = self.account.search_data(DataQuery())
+        values = [s.value for s in sorted(data.samples,
+                                          key=lambda s: s.timestamp)]
+        self.assertIsInstance(values[0], memoryview)
+        self.assertEqual(values[0], frame)
+        self.assertEqual(values[1], bytes(100))
@@ -0,0 +1,270 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import pickle
+import socket
+import unittest
+from unittest import mock
+
+import requests
+
+import oisp
+from oisp.client import RequestsBackend
+from oisp.endpoints import EndpointPool
+from test.mock_server import MockServer
+
+USERNAME = "endpoints@testing.com"
+PASSWORD = "EndpointsTesting1"
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class EndpointPoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch("oisp.endpoints.time.monotonic", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pool = EndpointPool(["a", "b"], max_failures=2,
+                                 ejection_time=10, max_ejection_time=30)
+        self.a, self.b = self.pool.endpoints
+
+    def request(self, latency=0.01, failed=False, exclude=()):
+        endpoint = self.pool.select(exclude)
+        self.pool.release(endpoint, latency, failed)
+        return endpoint
+
+    def test_lowest_latency(self):
+        self.request(0.05, exclude=[self.b])
+        self.request(0.01, exclude=[self.a])
+        self.assertEqual(self.a.ewma, 0.05)
+        self.assertEqual(self.b.ewma, 0.01)
+        self.assertIs(self.pool.select(), self.b)
+        # Requests in flight make b more expensive than a
+        self.assertIs(self.pool.select(), self.b)
+        self.assertIs(self.pool.select(), self.b)
+        self.assertIs(self.pool.select(), self.b)
+        self.assertIs(self.pool.select(), self.a)
+        self.assertIs(self.pool.select(exclude=[self.a]), self.b)
+
+    def test_spread_without_estimates(self):
+        used = [self.pool.select().url for _ in range(6)]
+        self.assertEqual(sorted(used), ["a"] * 3 + ["b"] * 3)
+        for endpoint in self.pool.endpoints:
+            endpoint.in_flight = 0
+        # b is expected to be as fast as a
+        self.pool.release(self.pool.select(exclude=[self.b]), 0.01)
+        used = [self.pool.select().url for _ in range(6)]
+        self.assertEqual(sorted(used), ["a"] * 3 + ["b"] * 3)
+
+    def test_idle_estimate_fades(self):
+        self.request(1.0, exclude=[self.b])
+        self.request(0.01, exclude=[self.a])
+        used = []
+        for _ in range(8):
+            self.clock.now += 30
+            used.append(self.request(0.01).url)
+        # a is tried again once its estimate faded below the one of b
+        self.assertEqual(used[:5], ["b"] * 5)
+        self.assertIn("a", used)
+
+    def test_ejection_and_readmission(self):
+        self.request(failed=True)
+        self.assertEqual(self.pool.healthy(), ["a", "b"])
+        self.request(failed=True)
+        self.assertEqual(self.pool.healthy(), ["b"])
+        self.assertIs(self.request(), self.b)
+        self.clock.now += 10
+        self.assertEqual(self.pool.healthy(), ["a", "b"])
+        # Still failing after the ejection, ejected for longer
+        self.request(failed=True, exclude=[self.b])
+        self.clock.now += 10
+        self.assertEqual(self.pool.healthy(), ["b"])
+        self.clock.now += 10
+        self.assertEqual(self.pool.healthy(), ["a", "b"])
+        self.request(exclude=[self.b])
+        self.assertEqual(self.a.backoff, 0)
+        self.request(failed=True, exclude=[self.b])
+        self.assertEqual(self.pool.healthy(), ["a", "b"])
+        stats = self.pool.stats()[0]
+        self.assertEqual(stats["ejections"], 2)
+        self.assertEqual(stats["errors"], 4)
+
+    def test_all_ejected(self):
+        self.pool.max_failures = 1
+        self.request(failed=True, exclude=[self.b])
+        self.clock.now += 1
+        self.request(failed=True, exclude=[self.a])
+        self.assertEqual(self.pool.healthy(), [])
+        # The endpoint re-admitted next is used
+        self.assertIs(self.pool.select(), self.a)
+
+    def test_pickle(self):
+        self.request(0.02)
+        pool = pickle.loads(pickle.dumps(self.pool))
+        self.assertEqual(pool.endpoints[0].ewma, 0.02)
+        self.assertEqual(len(pool), 2)
+
+
+class FailingBackend(RequestsBackend):
+    """Raise error for requests to one API root."""
+
+    def __init__(self, api_root, error):
+        self.api_root = api_root
+        self.error = error
+
+    def send(self, func, url, **kwargs):
+        if url.startswith(self.api_root):
+            raise self.error
+        return func(url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.send(requests.get, url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.send(requests.post, url, **kwargs)
+
+
+def unused_url():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return "http://127.0.0.1:{}/v1/api".format(sock.getsockname()[1])
+
+
+class FailoverTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockServer().start()
+        self.replica = MockServer(state=self.server.state).start()
+        self.server.populate(USERNAME, PASSWORD, num_devices=1,
+                             num_components=1, samples_per_component=0)
+        self.metrics = []
+
+    def tearDown(self):
+        self.server.stop()
+        self.replica.stop()
+
+    def client(self, *api_roots):
+        client = oisp.Client(list(api_roots),
+                             request_hooks=[self.metrics.append])
+        client.auth(USERNAME, PASSWORD)
+        return client
+
+    def test_unreachable_api_root(self):
+        client = self.client(unused_url(), self.server.api_url)
+        for _ in range(5):
+            self.assertEqual(len(client.get_accounts()), 1)
+        stats = client.endpoints.stats()
+        self.assertGreater(stats[0]["errors"], 0)
+        self.assertEqual(sum(m.retries for m in self.metrics),
+                         stats[0]["errors"])
+        self.assertEqual({m.api_root for m in self.metrics},
+                         {self.server.api_url})
+
+    def test_gateway_error(self):
+        client = self.primed_client()
+        self.server.fail_next = [503]
+        self.replica.fail_next = [503]
+        self.metrics.clear()
+        with self.assertRaises(oisp.OICException):
+            client.get_accounts()
+        self.assertEqual(self.metrics[-1].retries, 1)
+        self.assertEqual(self.metrics[-1].status, 503)
+        self.server.fail_next = [502]
+        self.assertEqual(len(client.get_accounts()), 1)
+        self.assertEqual(self.metrics[-1].retries, 1)
+        self.assertEqual(self.metrics[-1].api_root, self.replica.api_url)
+        # Other errors are not retried
+        self.server.fail_next = [500]
+        self.replica.fail_next = [500]
+        with self.assertRaises(oisp.OICException):
+            client.get_accounts()
+        self.assertEqual(self.metrics[-1].retries, 0)
+
+    def test_writes_fail_over(self):
+        client = self.client(unused_url(), self.server.api_url)
+        account = client.get_accounts()[0]
+        device = account.create_device("failover", "failover")
+        self.assertEqual(self.metrics[-1].api_root, self.server.api_url)
+        self.assertEqual(account.get_device("failover").device_id,
+                         device.device_id)
+
+    def primed_client(self):
+        self.replica.latency = 0.05
+        client = self.client(self.server.api_url, self.replica.api_url)
+        # Both are measured, the slower replica is only used on errors
+        client.get_server_info()
+        client.get_server_info()
+        self.metrics.clear()
+        return client
+
+    def test_writes_not_resent_when_maybe_applied(self):
+        client = self.primed_client()
+        account = client.get_accounts()[0]
+        client.backend = FailingBackend(self.server.api_url,
+                                        requests.exceptions.ReadTimeout())
+        self.assertEqual(len(client.get_accounts()), 1)
+        self.assertEqual(self.metrics[-1].retries, 1)
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            account.create_device("timeout", "timeout")
+        self.assertEqual(self.metrics[-1].retries, 0)
+        client.backend = RequestsBackend()
+        self.server.fail_next = [504]
+        with self.assertRaises(oisp.OICException):
+            account.create_device("gateway", "gateway")
+        self.assertEqual(self.metrics[-1].retries, 0)
+        devices = ("POST", "/v1/api/accounts/<account_id>/devices")
+        self.assertEqual(self.server.requests[devices], 1)
+        self.assertEqual(self.replica.requests[devices], 0)
+
+    def test_client_errors_not_counted(self):
+        client = self.primed_client()
+        client.backend = FailingBackend("", ValueError("bug"))
+        with self.assertRaises(ValueError):
+            client.get_accounts()
+        self.assertEqual(self.metrics[-1].retries, 0)
+        stats = client.endpoints.stats()
+        self.assertEqual([s["errors"] for s in stats], [0, 0])
+        self.assertEqual([s["in_flight"] for s in stats], [0, 0])
+
+    def test_single_api_root(self):
+        client = oisp.Client(self.server.api_url)
+        self.assertEqual(client.base_url, self.server.api_url)
+        # Retargeting a client is not supported
+        with self.assertRaises(AttributeError):
+            client.base_url = "http://localhost:1/v1/api"
+        self.server.fail_next = [503]
+        with self.assertRaises(oisp.OICException):
+            client.get_server_info()
@@ -0,0 +1,174 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import contextlib
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import oisp
+from oisp.export import Export, _parse_args, parse_duration, parse_time
+from oisp.utils import timestamp_in_ms
+from test.mock_server import MockServer
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+USERNAME = "export@testing.com"
+PASSWORD = "ExportTesting1"
+SAMPLES = 100
+
+
+class ExportTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockServer().start()
+        self.server.populate(USERNAME, PASSWORD, num_devices=3,
+                             num_components=2, samples_per_component=SAMPLES)
+        client = oisp.Client(self.server.api_url)
+        client.auth(USERNAME, PASSWORD)
+        self.account = client.get_accounts()[0]
+        self.directory = tempfile.TemporaryDirectory()
+        self.to = timestamp_in_ms() + 1000
+        self.from_ = self.to - 2 * SAMPLES * 1000
+
+    def tearDown(self):
+        self.server.stop()
+        self.directory.cleanup()
+
+    def export(self, fmt="csv", **kwargs):
+        return Export(self.account, self.directory.name, self.from_, self.to,
+                      window=30 * 1000, fmt=fmt, devices_per_query=2,
+                      **kwargs)
+
+    def files(self, extension):
+        return sorted(os.path.join(self.directory.name, name)
+                      for name in os.listdir(self.directory.name)
+                      if name.endswith(extension))
+
+    def test_csv(self):
+        self.assertEqual(self.export().run(), 6 * SAMPLES)
+        rows = []
+        for path in self.files(".csv.gz"):
+            with gzip.open(path, "rt", encoding="utf-8") as csv_file:
+                reader = csv.reader(csv_file)
+                self.assertEqual(next(reader), ["device_id", "component_id",
+                                                "timestamp", "value"])
+                rows.extend(reader)
+        # 7 windows, 2 device groups
+        self.assertEqual(len(self.files(".csv.gz")), 14)
+        self.assertEqual(len(rows), 6 * SAMPLES)
+        self.assertEqual(len({(row[0], row[1], row[2]) for row in rows}),
+                         6 * SAMPLES)
+
+    def test_ndjson(self):
+        self.export(fmt="ndjson", device_ids=["synthetic-0"]).run()
+        records = []
+        for path in self.files(".ndjson.gz"):
+            with gzip.open(path, "rt", encoding="utf-8") as ndjson_file:
+                records.extend(json.loads(line) for line in ndjson_file)
+        self.assertEqual(len(records), 2 * SAMPLES)
+        self.assertEqual({record["deviceId"] for record in records},
+                         {"synthetic-0"})
+        self.assertIsInstance(records[0]["value"], float)
+
+    @unittest.skipIf(pq is None, "pyarrow is not installed")
+    def test_parquet(self):
+        self.export(fmt="parquet").run()
+        rows = sum(pq.read_table(path).num_rows
+                   for path in self.files(".parquet"))
+        self.assertEqual(rows, 6 * SAMPLES)
+
+    def test_resume(self):
+        search_data_stream = self.account.search_data_stream
+        calls = []
+
+        def failing_search(query, chunk_size=None):
+            calls.append(query)
+            if len(calls) == 5 and fail:
+                raise RuntimeError("Interrupted")
+            return search_data_stream(query, chunk_size)
+
+        self.account.search_data_stream = failing_search
+        fail = True
+        with self.assertRaises(RuntimeError):
+            self.export(max_workers=1).run()
+        with open(self.files("checkpoint.json")[0],
+                  encoding="utf-8") as checkpoint:
+            self.assertEqual(len(json.load(checkpoint)["done"]), 4)
+        del calls[:]
+        fail = False
+        self.assertEqual(self.export(max_workers=1).run(), 6 * SAMPLES)
+        self.assertEqual(len(calls), 10)
+        self.assertEqual(len(self.files(".tmp")), 0)
+
+    def test_resume_without_to(self):
+        window = 30 * 1000
+        now = [self.to]
+
+        def clock(moment=None):
+            return now[0] if moment is None else timestamp_in_ms(moment)
+
+        def export():
+            return Export(self.account, self.directory.name, self.from_, None,
+                          window=window, devices_per_query=2)
+
+        with mock.patch("oisp.export.timestamp_in_ms", clock):
+            rows = export().run()
+            # Resumed after the window has passed
+            now[0] += window
+            search = mock.Mock(wraps=self.account.search_data_stream)
+            self.account.search_data_stream = search
+            resumed = export()
+            self.assertEqual(resumed.run(), rows)
+        self.assertEqual(resumed.to, self.to // window * window)
+        self.assertEqual(search.call_count, 0)
+
+    def test_parse(self):
+        self.assertEqual(parse_duration("1d"), 24 * 60 * 60 * 1000)
+        self.assertEqual(parse_duration("500ms"), 500)
+        self.assertEqual(parse_duration("1.5m"), 90 * 1000)
+        self.assertEqual(parse_duration("2000"), 2000)
+        self.assertEqual(parse_time("2020-01-01"), 1577836800000)
+        self.assertEqual(parse_time("2020-01-01T01:00:00+01:00"),
+                         1577836800000)
+        self.assertEqual(parse_time("1577836800000"), 1577836800000)
+
+    def test_from_required(self):
+        argv = ["--api-url", self.server.api_url, "--username", USERNAME,
+                "--password", PASSWORD, "--output-dir", self.directory.name]
+        with contextlib.redirect_stderr(io.StringIO()):
+            with self.assertRaises(SystemExit):
+                _parse_args(argv)
+        self.assertEqual(_parse_args(argv + ["--from", "1000"]).from_, 1000)
@@ -0,0 +1,88 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import math
+import unittest
+
+from oisp import Device, SampleFilter
+
+START = 1577836800000
+
+
+class SampleFilterTestCase(unittest.TestCase):
+
+    def accepted(self, sample_filter, values, interval=1000):
+        return [value for i, value in enumerate(values)
+                if sample_filter.accept(value, START + i * interval)]
+
+    def test_deadband(self):
+        sample_filter = SampleFilter(deadband=0.5)
+        self.assertEqual(self.accepted(sample_filter,
+                                       [20, 20.2, 20.4, 20.6, 20.7, 20.0]),
+                         [20, 20.6, 20.0])
+        self.assertEqual((sample_filter.accepted, sample_filter.suppressed),
+                         (3, 3))
+
+    def test_percent(self):
+        self.assertEqual(self.accepted(SampleFilter(percent=10),
+                                       [100, 105, 111, 100, 99]),
+                         [100, 111, 99])
+
+    def test_change_of_value(self):
+        self.assertEqual(self.accepted(SampleFilter(change_of_value=True),
+                                       ["on", "on", "off", "off", "on"]),
+                         ["on", "off", "on"])
+        # Dead-band falls back to change of value for non-numeric values
+        self.assertEqual(self.accepted(SampleFilter(deadband=1),
+                                       ["a", "a", "b"]), ["a", "b"])
+
+    def test_intervals(self):
+        self.assertEqual(self.accepted(SampleFilter(min_interval=3000),
+                                       list(range(7))), [0, 3, 6])
+        self.assertEqual(self.accepted(SampleFilter(deadband=1,
+                                                    max_interval=2000),
+                                       [5] * 5), [5, 5, 5])
+
+    def test_reset(self):
+        sample_filter = SampleFilter(change_of_value=True)
+        self.assertEqual(self.accepted(sample_filter, [1, 1]), [1])
+        sample_filter.reset()
+        self.assertEqual(self.accepted(sample_filter, [1]), [1])
+
+    def test_device(self):
+        device = Device("device", client=object(), device_token="token")
+        device.filters["c0"] = SampleFilter(deadband=0.5,
+                                            max_interval=60000)
+        # Noisy, slowly changing signal
+        for i in range(1000):
+            value = 20 + 2 * math.sin(i / 200) + 0.1 * math.sin(i * 7)
+            device.add_sample("c0", value, on=START + i * 1000)
+        self.assertFalse(device.add_sample("c0", value, on=START + 999500))
+        self.assertTrue(device.add_sample("c1", 1, on=START))
+        suppressed = device.filters["c0"].suppressed
+        self.assertGreater(suppressed, 900)
+        self.assertEqual(len(device.unsent_data), 1001 - suppressed + 1)
@@ -0,0 +1,152 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import pickle
+import socket
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import oisp
+from oisp import DataQuery, http2
+from oisp.client import OICException, RequestsBackend
+from test.mock_server import MockServer
+
+try:
+    import hypercorn
+except ImportError:
+    hypercorn = None
+
+USERNAME = "http2@testing.com"
+PASSWORD = "Http2Testing1"
+
+
+@unittest.skipIf(http2.httpx is None or hypercorn is None,
+                 "httpx or hypercorn is not installed")
+class Http2TestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockServer(http2=True).start()
+        self.data = self.server.populate(USERNAME, PASSWORD, num_devices=8,
+                                         num_components=1,
+                                         samples_per_component=0)
+        self.client = oisp.Client(
+            self.server.api_url, backend=http2.Http2Backend(http1=False))
+        self.client.auth(USERNAME, PASSWORD)
+        self.account = self.client.get_accounts()[0]
+
+    def tearDown(self):
+        self.client.backend.close()
+        self.server.stop()
+
+    def test_requests(self):
+        device_id = self.data["devices"][0][0]
+        device = self.account.get_device(device_id)
+        self.assertEqual(device.device_id, device_id)
+        self.assertEqual(self.client.response.http_version, "HTTP/2")
+        with self.assertRaises(OICException) as context:
+            self.client.get(self.account.url + "/devices/missing",
+                            expect=200)
+        self.assertEqual(context.exception.code,
+                         OICException.DEVICE_NOT_FOUND)
+
+    def test_concurrent_requests(self):
+        methods = []
+        self.client.add_request_hook(lambda m: methods.append(m.method))
+        device_ids = [device_id for device_id, _, _ in self.data["devices"]]
+        with ThreadPoolExecutor(8) as pool:
+            devices = list(pool.map(self.account.get_device, device_ids))
+        self.assertEqual([d.device_id for d in devices], device_ids)
+        self.assertEqual(methods, ["GET"] * len(device_ids))
+
+    def test_submit_and_search(self):
+        device_id, token, cids = self.data["devices"][0]
+        device = self.client.get_device(token, device_id)
+        for i in range(5):
+            device.add_sample(cids[0], i, on=1000 + i)
+        device.submit_data()
+        data = self.account.search_data(DataQuery())
+        self.assertEqual(sorted(s.value for s in data.samples),
+                         [float(i) for i in range(5)])
+
+    def test_binary_body(self):
+        self.account.create_component_type("image", "1.0", "sensor",
+                                           "ByteArray", "boolean", "pixel",
+                                           "binaryDataRenderer")
+        device_id, token, _ = self.data["devices"][0]
+        device = self.client.get_device(token, device_id)
+        cid = device.add_component("img", "image.v1.0")["cid"]
+        frame = bytearray(range(256)) * 64
+        device.add_sample(cid, memoryview(frame), on=1000)
+        device.submit_data()
+        data = self.account.search_data(DataQuery())
+        self.assertEqual(data.samples[0].value, frame)
+
+    def test_pickle(self):
+        client = pickle.loads(pickle.dumps(self.client))
+        self.assertIsInstance(client.backend, http2.Http2Backend)
+        self.assertEqual(len(client.get_accounts()), 1)
+        client.backend.close()
+
+    def test_backend_selection(self):
+        with self.assertWarns(UserWarning):
+            client = oisp.Client(self.server.api_url, backend="http2")
+        self.assertIsInstance(client.backend, http2.Http2Backend)
+        # HTTP/2 is only negotiated over TLS unless http1 is disabled
+        self.assertEqual(client.response.http_version, "HTTP/1.1")
+        client.backend.close()
+        client = oisp.Client(self.server.api_url)
+        self.assertIsInstance(client.backend, RequestsBackend)
+
+    def test_errors(self):
+        backend = self.client.backend
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            unused_url = "http://127.0.0.1:{}/v1/api".format(
+                sock.getsockname()[1])
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            backend.get(unused_url + "/health")
+        self.server.latency = 0.3
+        backend = http2.Http2Backend(http1=False, timeout=0.1)
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            backend.get(self.server.api_url + "/health")
+        # Let the server finish the request before stopping it
+        time.sleep(0.3)
+        self.server.latency = 0
+        backend.close()
+
+    def test_failover(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            unused_url = "http://127.0.0.1:{}/v1/api".format(
+                sock.getsockname()[1])
+        client = oisp.Client([unused_url, self.server.api_url],
+                             backend=self.client.backend)
+        client.auth(USERNAME, PASSWORD)
+        self.assertEqual(client.response.status_code, 200)
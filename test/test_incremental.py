@@ -0,0 +1,105 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from oisp import Account, IncrementalQuery
+from oisp.data_query import QueryResponse
+
+
+class FakeAccount(Account):
+    """Account answering searches from a list of (ts, value) samples."""
+
+    def __init__(self):
+        super().__init__(None, "account", "account_id", Account.ROLE_ADMIN)
+        self.samples = []
+        self.queries = []
+
+    def search_data(self, query):
+        self.queries.append(query.json())
+        samples = [[ts, value] for ts, value in self.samples
+                   if query.from_ <= ts <= query.to]
+        return QueryResponse(self, {
+            "msgType": QueryResponse.ADVANCED_INQUIRY,
+            "accountId": self.account_id,
+            "startTimestamp": query.from_, "endTimestamp": query.to,
+            "data": [{"deviceId": "device", "components": [{
+                "componentId": "temp", "dataType": "number",
+                "samplesHeader": ["Timestamp", "Value"],
+                "samples": samples}]}]})
+
+
+class IncrementalQueryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.account = FakeAccount()
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_only_new_samples(self):
+        query = IncrementalQuery(self.account, lookback=50)
+        self.account.samples = [(10, 1), (100, 2)]
+        self.assertEqual([s.value for s in query.poll(to=100).samples],
+                         [1, 2])
+        # A second sample at the timestamp of a returned one is not a duplicate
+        self.account.samples += [(100, 3), (150, 4)]
+        self.assertEqual([s.value for s in query.poll(to=200).samples],
+                         [3, 4])
+        self.assertEqual([s.value for s in query.poll(to=300).samples], [])
+        self.assertEqual([q["from"] for q in self.account.queries],
+                         [0, 50, 150])
+
+    def test_state_file(self):
+        state_file = os.path.join(self.tmp_dir, "state.json")
+        self.account.samples = [(10, 1), (100, 2)]
+        IncrementalQuery(self.account, state_file=state_file).poll(to=100)
+        query = IncrementalQuery(self.account, state_file=state_file,
+                                 lookback=100)
+        self.assertEqual(query.seen, {("device", "temp"): {(100, "2")}})
+        self.assertEqual(query.seen_from, 100)
+        self.account.samples.append((101, 5))
+        self.assertEqual([s.value for s in query.poll(to=200).samples], [5])
+
+    def test_late_samples(self):
+        query = IncrementalQuery(self.account, lookback=100)
+        self.account.samples = [(10, 1), (150, 2)]
+        self.assertEqual([s.value for s in query.poll(to=200).samples],
+                         [1, 2])
+        # Submitted late, but within lookback of the last poll
+        self.account.samples += [(120, 3), (250, 4)]
+        self.assertEqual([s.value for s in query.poll(to=300).samples],
+                         [3, 4])
+        # Too late, the window was already searched for the last time
+        self.account.samples += [(190, 5)]
+        self.assertEqual([s.value for s in query.poll(to=400).samples], [])
+        self.assertEqual(query.seen_from, 300)
+        self.assertEqual(query.seen, {})
@@ -0,0 +1,110 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from oisp import loadgen
+from test.mock_server import MockServer
+
+USERNAME = "loadgen@testing.com"
+PASSWORD = "LoadgenTesting1"
+
+
+class LoadGeneratorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockServer().start()
+        self.server.add_user(USERNAME, PASSWORD)
+        self.directory = tempfile.TemporaryDirectory()
+        self.device_file = os.path.join(self.directory.name, "devices.json")
+
+    def tearDown(self):
+        self.server.stop()
+        self.directory.cleanup()
+
+    def run_main(self, *args):
+        output = os.path.join(self.directory.name, "report.json")
+        with contextlib.redirect_stdout(io.StringIO()), \
+                contextlib.redirect_stderr(io.StringIO()):
+            code = loadgen.main(["--api-url", self.server.api_url,
+                                 "--device-file", self.device_file,
+                                 "--output", output] + list(args))
+        with open(output, encoding="utf-8") as report:
+            return code, json.load(report)
+
+    def test_provision_and_run(self):
+        code, report = self.run_main(
+            "--username", USERNAME, "--password", PASSWORD,
+            "--devices", "4", "--components", "2", "--rate", "50",
+            "--batch", "5", "--duration", "0.5", "--processes", "1")
+        self.assertEqual(code, 0)
+        self.assertEqual(report["devices"], 4)
+        self.assertGreater(report["requests"], 4)
+        self.assertEqual(report["samples"], report["requests"] * 10)
+        self.assertEqual(report["errors"], {})
+        self.assertLessEqual(report["latency_ms"]["p50"],
+                             report["latency_ms"]["max"])
+        self.assertEqual(self.server.requests[
+            ("POST", "/v1/api/data/<device_id>")],
+                         report["requests"])
+        with open(self.device_file, encoding="utf-8") as device_file:
+            self.assertEqual(len(json.load(device_file)), 4)
+
+    def test_worker_processes(self):
+        _, report = self.run_main(
+            "--username", USERNAME, "--password", PASSWORD,
+            "--devices", "2", "--duration", "0.5", "--rate", "20",
+            "--processes", "2")
+        self.assertEqual(report["processes"], 2)
+        self.assertGreater(report["samples"], 0)
+
+    def test_errors(self):
+        self.run_main("--username", USERNAME, "--password", PASSWORD,
+                      "--devices", "2", "--duration", "0.1")
+        with open(self.device_file, encoding="utf-8") as device_file:
+            specs = json.load(device_file)
+        for spec in specs:
+            spec["deviceToken"] = "invalid"
+        with open(self.device_file, "w", encoding="utf-8") as device_file:
+            json.dump(specs, device_file)
+        code, report = self.run_main("--duration", "0.5", "--rate", "20",
+                                     "--processes", "1")
+        self.assertEqual(code, 1)
+        self.assertEqual(report["error_rate"], 1.0)
+        self.assertEqual(list(report["errors"]), ["HTTP 401"])
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(loadgen.percentile(values, .5), 50)
+        self.assertEqual(loadgen.percentile(values, .99), 99)
+        self.assertEqual(loadgen.percentile(values, 1.0), 100)
+        self.assertIsNone(loadgen.percentile([], .5))
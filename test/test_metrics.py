@@ -0,0 +1,141 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+import urllib.request
+
+import oisp
+from oisp.metrics import (OpenTelemetryHook, PrometheusExporter,
+                          endpoint_template)
+from test.mock_server import MockServer
+
+USERNAME = "metrics@testing.com"
+PASSWORD = "MetricsTesting1"
+
+
+class EndpointTemplateTestCase(unittest.TestCase):
+
+    def test_templates(self):
+        for endpoint, template in [
+                ("/health", "/health"),
+                ("/accounts/acc1/devices/dev1/components/c1",
+                 "/accounts/{id}/devices/{id}/components/{id}"),
+                ("/accounts/acc1/devices/tags", "/accounts/{id}/devices/tags"),
+                ("/accounts/acc1/data/search/advanced",
+                 "/accounts/{id}/data/search/advanced"),
+                ("/data/dev1", "/data/{id}"),
+                ("/accounts/acc1/cmpcatalog?full=true",
+                 "/accounts/{id}/cmpcatalog")]:
+            self.assertEqual(endpoint_template(endpoint), template)
+
+
+class FakeSpan:
+
+    def __init__(self, name, start_time, attributes):
+        self.name = name
+        self.start_time = start_time
+        self.attributes = attributes
+        self.end_time = None
+
+    def record_exception(self, exc):
+        self.attributes["exception"] = exc
+
+    def end(self, end_time):
+        self.end_time = end_time
+
+
+class FakeTracer:
+
+    def __init__(self):
+        self.spans = []
+
+    def start_span(self, name, start_time, attributes):
+        self.spans.append(FakeSpan(name, start_time, attributes))
+        return self.spans[-1]
+
+
+class RequestHookTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockServer().start()
+        self.server.add_user(USERNAME, PASSWORD)
+        self.metrics = []
+        self.client = oisp.Client(self.server.api_url,
+                                  request_hooks=[self.metrics.append])
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_metrics(self):
+        self.client.auth(USERNAME, PASSWORD)
+        self.assertEqual([(m.method, m.endpoint, m.status)
+                          for m in self.metrics],
+                         [("GET", "/health", 200),
+                          ("POST", "/auth/token", 200),
+                          ("GET", "/auth/tokenInfo", 200)])
+        token_request = self.metrics[1]
+        self.assertGreater(token_request.bytes_sent, 0)
+        self.assertGreater(token_request.bytes_received, 0)
+        self.assertGreater(token_request.network_time, 0)
+        self.assertEqual(token_request.retries, 0)
+
+    def test_failing_hook(self):
+        def hook(metrics):
+            raise RuntimeError("Failing hook")
+        self.client.add_request_hook(hook)
+        self.client.get_server_info()
+        self.client.remove_request_hook(hook)
+        self.assertEqual(len(self.metrics), 2)
+
+    def test_prometheus(self):
+        exporter = PrometheusExporter()
+        self.client.add_request_hook(exporter)
+        self.server.fail_next = [503]
+        with self.assertRaises(oisp.OICException):
+            self.client.get_server_info()
+        self.client.get_server_info()
+        port = exporter.serve(0, "127.0.0.1")
+        try:
+            url = "http://127.0.0.1:{}/metrics".format(port)
+            text = urllib.request.urlopen(url).read().decode("utf-8")
+        finally:
+            exporter.shutdown()
+        self.assertIn('oisp_client_requests_total{method="GET",'
+                      'endpoint="/health",status="503"} 1', text)
+        self.assertIn('oisp_client_request_duration_seconds_count{'
+                      'method="GET",endpoint="/health"} 2', text)
+        self.assertIn('oisp_client_api_root_requests_total{{api_root="{}",'
+                      'status="503"}} 1'.format(self.client.base_url), text)
+
+    def test_open_telemetry(self):
+        tracer = FakeTracer()
+        self.client.add_request_hook(OpenTelemetryHook(tracer))
+        self.client.get_server_info()
+        span = tracer.spans[0]
+        self.assertEqual(span.name, "GET /health")
+        self.assertEqual(span.attributes["http.status_code"], 200)
+        self.assertLessEqual(span.start_time, span.end_time)
@@ -0,0 +1,86 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import time
+import unittest
+
+import oisp
+from oisp import DataQuery, OICException
+from test.mock_server import MockServer
+
+USERNAME = "mock@testing.com"
+PASSWORD = "MockTesting1"
+
+
+class MockServerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockServer(seed=0).start()
+        self.data = self.server.populate(USERNAME, PASSWORD, num_devices=2,
+                                         num_components=2,
+                                         samples_per_component=1000)
+        self.client = oisp.Client(self.server.api_url)
+        self.client.auth(USERNAME, PASSWORD)
+        self.account = self.client.get_accounts()[0]
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_synthetic_data(self):
+        self.assertEqual(len(self.account.get_devices()), 2)
+        response = self.account.search_data(DataQuery())
+        self.assertEqual(len(response.samples), 4000)
+        device_id, token, cids = self.data["devices"][0]
+        start = response.samples[0].on
+        response = self.account.search_data(DataQuery(
+            component_ids=[cids[0]], component_row_limit=10))
+        self.assertEqual(len(response.samples), 10)
+        device = self.client.get_device(token, device_id)
+        device.add_sample(cids[0], 1.5)
+        device.submit_data()
+        response = self.account.search_data(DataQuery(
+            component_ids=[cids[0]]))
+        self.assertEqual(len(response.samples), 1001)
+        self.assertLessEqual(start, response.samples[0].on)
+
+    def test_error_injection(self):
+        self.server.fail_next = [429, 503]
+        for code in [429, 503]:
+            with self.assertRaises(OICException) as context:
+                self.account.get_devices()
+            self.assertEqual(context.exception.code, code)
+        self.assertEqual(len(self.account.get_devices()), 2)
+        self.server.error_rate = 1.0
+        with self.assertRaises(OICException):
+            self.account.get_devices()
+
+    def test_latency(self):
+        self.server.latency = 0.05
+        start = time.time()
+        self.client.get_server_info()
+        self.assertGreaterEqual(time.time() - start, 0.05)
+        self.assertEqual(self.server.requests[("GET", "/v1/api/health")], 2)
@@ -0,0 +1,154 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import json
+import time
+import unittest
+
+import oisp
+from oisp import DataQuery, mqtt
+from oisp.mqtt import MqttError, MqttTransport
+from test.mock_server import MockServer
+from test.mqtt_broker import MqttBroker
+
+USERNAME = "mqtt@testing.com"
+PASSWORD = "MqttTesting1"
+
+
+def wait_until(predicate, timeout=5):
+    end = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > end:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@unittest.skipIf(mqtt.paho is None, "paho-mqtt is not installed")
+class MqttTransportTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockServer().start()
+        state = self.server.state
+        data = self.server.populate(USERNAME, PASSWORD, num_devices=1,
+                                    num_components=1,
+                                    samples_per_component=0)
+        device_id, token, cids = data["devices"][0]
+        self.cid = cids[0]
+
+        def authenticate(username, password):
+            return state.device_tokens.get(password, (None, None))[1] == \
+                username
+
+        def on_message(topic, payload):
+            state.submit(topic.rsplit("/", 1)[1], json.loads(payload))
+
+        self.broker = MqttBroker(authenticate, on_message).start()
+        client = oisp.Client(self.server.api_url)
+        client.auth(USERNAME, PASSWORD)
+        self.account = client.get_accounts()[0]
+        self.device = client.get_device(token, device_id)
+        self.transports = []
+
+    def tearDown(self):
+        for transport in self.transports:
+            transport.close(timeout=0)
+        self.broker.stop()
+        self.server.stop()
+
+    def transport(self, **kwargs):
+        transport = MqttTransport(self.device, "127.0.0.1", self.broker.port,
+                                  tls=False, min_backoff=0.05,
+                                  max_backoff=0.2, **kwargs)
+        self.transports.append(transport)
+        self.device.transport = transport
+        return transport
+
+    def submit(self, count):
+        for i in range(count):
+            self.device.add_sample(self.cid, i, on=1577836800000 + i)
+            self.device.submit_data()
+
+    def test_submit(self):
+        transport = self.transport()
+        for i in range(10):
+            self.device.add_sample(self.cid, i, on=1577836800000 + i)
+        self.device.submit_data()
+        transport.flush(5)
+        self.assertEqual(self.device.unsent_data, [])
+        _, topic, payload, _ = self.broker.messages[0]
+        self.assertEqual(topic, "server/metric/{}/{}".format(
+            self.device.domain_id, self.device.device_id))
+        self.assertEqual(json.loads(payload)["did"], self.device.device_id)
+        response = self.account.search_data(DataQuery())
+        self.assertEqual(len(response.samples), 10)
+        self.assertEqual(self.server.requests[
+            ("POST", "/v1/api/data/<device_id>")], 0)
+
+    def test_inflight_window(self):
+        transport = self.transport(max_inflight=2)
+        transport.connect()
+        self.broker.hold_acks = True
+        self.submit(5)
+        self.assertTrue(wait_until(lambda: len(self.broker.messages) == 2))
+        time.sleep(0.1)
+        self.assertEqual(len(self.broker.messages), 2)
+        self.assertEqual(transport.pending, 5)
+        self.broker.release_acks()
+        transport.flush(5)
+        self.assertEqual(transport.acknowledged, 5)
+        self.assertEqual(len(self.broker.messages), 5)
+
+    def test_reconnect(self):
+        transport = self.transport()
+        transport.connect()
+        self.broker.drop_connections()
+        self.assertTrue(wait_until(lambda: not transport.connected))
+        self.submit(3)
+        transport.flush(5)
+        self.assertEqual(transport.connects, 2)
+        self.assertEqual({json.loads(payload)["data"][0]["value"]
+                          for _, _, payload, _ in self.broker.messages},
+                         {0, 1, 2})
+
+    def test_queue_full(self):
+        transport = self.transport(max_inflight=1, max_queued=1)
+        transport.connect()
+        self.broker.hold_acks = True
+        self.submit(1)
+        self.device.add_sample(self.cid, 1)
+        with self.assertRaises(MqttError):
+            self.device.submit_data()
+        self.assertEqual(len(self.device.unsent_data), 1)
+        self.broker.release_acks()
+        transport.flush(5)
+
+    def test_bad_credentials(self):
+        self.device.device_token = "invalid"
+        transport = self.transport()
+        with self.assertRaises(MqttError):
+            transport.connect(timeout=0.5)
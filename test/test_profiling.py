@@ -0,0 +1,101 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import tempfile
+import unittest
+
+import oisp
+from oisp import profiling
+from oisp.data_query import QueryResponse
+from test.test_query_response import make_response_dict
+
+
+class ProfilingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        profiling.reset()
+
+    def tearDown(self):
+        profiling.disable()
+        profiling.reset()
+
+    def test_disabled(self):
+        device = oisp.Device("dev0", client=object(), device_token="token")
+        device.add_sample("cid", 1)
+        self.assertEqual(profiling.stats(), {})
+
+    def test_nested_stages(self):
+        profiling.enable()
+
+        @profiling.profiled("outer")
+        def outer(depth):
+            with profiling.stage("inner"):
+                pass
+            if depth:
+                outer(depth - 1)
+
+        outer(1)
+        stats = profiling.stats()
+        self.assertEqual(stats["outer"][0], 2)
+        self.assertEqual(stats["inner"][0], 2)
+        # Recursive calls are only counted once in the total
+        self.assertLessEqual(stats["outer"][2], stats["outer"][1])
+        stacks = [line.rsplit(" ", 1)[0]
+                  for line in profiling.collapsed().splitlines()]
+        self.assertEqual(stacks, ["outer", "outer;inner", "outer;outer",
+                                  "outer;outer;inner"])
+
+    def test_sdk_stages(self):
+        profiling.enable()
+        device = oisp.Device("dev0", client=object(), device_token="token")
+        device.add_sample("cid", 1)
+        # pylint: disable=protected-access
+        device._update_with_json({"deviceId": "dev0", "gatewayId": "gw"})
+        account = oisp.Account(None, "account", "account_id",
+                               oisp.Account.ROLE_ADMIN)
+        response = QueryResponse(account, make_response_dict())
+        self.assertTrue(response.samples)
+        stats = profiling.stats()
+        for name in ["device.add_sample", "utils.timestamp_in_ms",
+                     "device.update_with_json", "utils.camel_to_underscore",
+                     "query.parse_samples"]:
+            self.assertIn(name, stats)
+        self.assertEqual(stats["utils.camel_to_underscore"][0], 2)
+        self.assertIn("device.add_sample;utils.timestamp_in_ms",
+                      profiling.collapsed())
+        self.assertIn("utils.camel_to_underscore", profiling.summary())
+
+    def test_write_collapsed(self):
+        profiling.enable()
+        with profiling.stage("stage"):
+            pass
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "oisp.folded")
+            profiling.write_collapsed(path)
+            with open(path, encoding="utf-8") as stacks_file:
+                self.assertTrue(stacks_file.read().startswith("stage "))
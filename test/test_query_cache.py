@@ -0,0 +1,139 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import shutil
+import tempfile
+import unittest
+
+import oisp
+from oisp import DataQuery, QueryCache
+from oisp.utils import timestamp_in_ms
+from test.mock_server import MockServer
+from test.test_query_response import make_response_dict
+
+# Window of the samples in make_response_dict
+FROM = 1577836800000
+TO = 1577836802000
+
+
+class QueryCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_exact_window(self):
+        cache = QueryCache()
+        payload = DataQuery(from_=FROM, to=TO).json()
+        self.assertIsNone(cache.get(payload))
+        self.assertTrue(cache.put(payload, make_response_dict()))
+        self.assertEqual(cache.get(DataQuery(from_=FROM, to=TO).json()),
+                         make_response_dict())
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_copies(self):
+        cache = QueryCache()
+        payload = DataQuery(from_=FROM, to=TO).json()
+        response = make_response_dict()
+        cache.put(payload, response)
+        response["data"][0]["components"][0]["samples"].clear()
+        cache.get(payload)["data"][0]["components"].clear()
+        self.assertEqual(cache.get(payload), make_response_dict())
+
+    def test_unsettled_window(self):
+        cache = QueryCache(settle_time=60000)
+        payload = DataQuery(from_=FROM, to=timestamp_in_ms()).json()
+        self.assertFalse(cache.put(payload, make_response_dict()))
+        self.assertIsNone(cache.get(payload))
+        self.assertFalse(cache.put(DataQuery().json(), make_response_dict()))
+
+    def test_sub_range(self):
+        cache = QueryCache()
+        cache.put(DataQuery(from_=FROM, to=TO,
+                            device_ids=["device1", "device0"]).json(),
+                  make_response_dict())
+        json_dict = cache.get(DataQuery(from_=FROM + 1, to=TO,
+                                        device_ids=["device0",
+                                                    "device1"]).json())
+        self.assertEqual(json_dict["startTimestamp"], FROM + 1)
+        samples = json_dict["data"][0]["components"][0]["samples"]
+        self.assertEqual(samples, [[1577836801000, "11.5"]])
+        self.assertIsNone(cache.get(DataQuery(from_=FROM, to=TO + 1).json()))
+
+    def test_no_sub_range_with_row_limit(self):
+        cache = QueryCache()
+        cache.put(DataQuery(from_=FROM, to=TO,
+                            component_row_limit=1).json(),
+                  make_response_dict())
+        self.assertIsNone(cache.get(DataQuery(from_=FROM + 1, to=TO,
+                                              component_row_limit=1).json()))
+
+    def test_lru(self):
+        cache = QueryCache(max_entries=2)
+        for to in [TO, TO + 1, TO + 2]:
+            cache.put(DataQuery(from_=FROM, to=to,
+                                component_row_limit=1).json(),
+                      make_response_dict())
+        self.assertIsNone(cache.get(DataQuery(from_=FROM, to=TO,
+                                              component_row_limit=1).json()))
+        self.assertIsNotNone(cache.get(DataQuery(
+            from_=FROM, to=TO + 2, component_row_limit=1).json()))
+
+    def test_directory(self):
+        payload = DataQuery(from_=FROM, to=TO).json()
+        QueryCache(directory=self.tmp_dir).put(payload, make_response_dict())
+        cache = QueryCache(directory=self.tmp_dir)
+        self.assertEqual(cache.get(payload), make_response_dict())
+        cache.clear()
+        self.assertIsNone(QueryCache(directory=self.tmp_dir).get(payload))
+
+    def test_binary_views(self):
+        with MockServer() as server:
+            data = server.populate("cache@testing.com", "CacheTesting1",
+                                   num_devices=1, num_components=0,
+                                   samples_per_component=0)
+            cache = QueryCache(settle_time=0)
+            client = oisp.Client(server.api_url, query_cache=cache,
+                                 binary_views=True)
+            client.auth("cache@testing.com", "CacheTesting1")
+            account = client.get_accounts()[0]
+            account.create_component_type("image", "1.0", "sensor",
+                                          "ByteArray", "boolean", "pixel",
+                                          "binaryDataRenderer")
+            device_id, token, _ = data["devices"][0]
+            device = client.get_device(token, device_id)
+            cid = device.add_component("img", "image.v1.0")["cid"]
+            device.add_sample(cid, b"\x00\x01", on=FROM)
+            device.submit_data()
+            query = DataQuery(from_=FROM, to=TO)
+            first = account.search_data(query)
+            second = account.search_data(query)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(bytes(first.samples[0].value), b"\x00\x01")
+        self.assertEqual(bytes(second.samples[0].value), b"\x00\x01")
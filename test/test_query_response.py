@@ -0,0 +1,176 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+
+from oisp import Account, data_query
+from oisp.data_query import Aggregate, QueryResponse
+from oisp.utils import ms_to_datetime
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+def make_response_dict(account_id="account_id"):
+    """Return a search response as sent by the service."""
+    return {
+        "msgType": QueryResponse.ADVANCED_INQUIRY,
+        "accountId": account_id,
+        "startTimestamp": 0,
+        "endTimestamp": 1577836802000,
+        "data": [{
+            "deviceId": "device0",
+            "components": [{
+                "componentId": "temp",
+                "dataType": "number",
+                "samplesHeader": ["Timestamp", "Value"],
+                "samples": [[1577836800000, "10"], [1577836801000, "11.5"]]
+            }, {
+                "componentId": "empty",
+                "dataType": "number",
+            }]
+        }, {
+            "deviceId": "device1",
+            "components": [{
+                "componentId": "state",
+                "dataType": "boolean",
+                "samplesHeader": ["Value", "Timestamp"],
+                "samples": [["1", 1577836802000]]
+            }]
+        }]
+    }
+
+
+class QueryResponseTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.account = Account(None, "account", "account_id",
+                               Account.ROLE_ADMIN)
+
+    def test_samples(self):
+        response = QueryResponse(self.account, make_response_dict())
+        self.assertEqual(len(response.samples), 3)
+        self.assertEqual([s.value for s in response.samples],
+                         [10.0, 11.5, "1"])
+        self.assertEqual(response.samples[2].device_id, "device1")
+        sample = response.samples[1]
+        self.assertEqual(sample.timestamp, 1577836801000)
+        self.assertEqual(sample.on, ms_to_datetime(1577836801000))
+        self.assertEqual(response.end_timestamp, 1577836802000)
+
+    @unittest.skipIf(pd is None, "pandas is not installed")
+    def test_to_pandas(self):
+        response = QueryResponse(self.account, make_response_dict())
+        frame = response.to_pandas()
+        self.assertEqual(list(frame.columns),
+                         ["device_id", "component_id", "on", "value"])
+        self.assertEqual(str(frame["on"].dtype), "datetime64[ms]")
+        self.assertEqual(list(frame["device_id"]),
+                         ["device0", "device0", "device1"])
+        self.assertEqual(list(frame["value"]), [10.0, 11.5, "1"])
+        frame = response.to_pandas(as_datetime=False)
+        self.assertEqual(list(frame["on"]),
+                         [1577836800000, 1577836801000, 1577836802000])
+
+    @unittest.skipIf(pd is None, "pandas is not installed")
+    def test_to_pandas_numeric(self):
+        json_dict = make_response_dict()
+        json_dict["data"].pop()
+        frame = QueryResponse(self.account, json_dict).to_pandas()
+        self.assertEqual(str(frame["value"].dtype), "float64")
+
+    @unittest.skipIf(pa is None, "pyarrow is not installed")
+    def test_to_arrow(self):
+        table = QueryResponse(self.account, make_response_dict()).to_arrow()
+        self.assertEqual(table.num_rows, 3)
+        self.assertEqual(str(table.schema.field("on").type), "timestamp[ms]")
+        self.assertEqual(table.column("value").to_pylist(),
+                         ["10.0", "11.5", "1"])
+
+
+class AggregateTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.account = Account(None, "account", "account_id",
+                               Account.ROLE_ADMIN)
+
+    def test_server_aggregates(self):
+        json_dict = make_response_dict()
+        component = json_dict["data"][0]["components"][1]
+        component.update({"count": 4, "min": "1", "max": 4, "average": 2.5,
+                          "std": 1.118, "summation": 10})
+        response = QueryResponse(self.account, json_dict)
+        self.assertTrue(response.has_server_aggregates())
+        self.assertEqual(response.aggregates[("device0", "empty")],
+                         Aggregate(4, 1.0, 4.0, 2.5, 1.118, 10.0))
+
+    def test_local_aggregates(self):
+        response = QueryResponse(self.account, make_response_dict())
+        self.assertFalse(response.has_server_aggregates())
+        self.assertEqual(list(response.aggregates), [("device0", "temp")])
+        aggregate = response.aggregates[("device0", "temp")]
+        self.assertEqual((aggregate.count, aggregate.min, aggregate.max,
+                          aggregate.average, aggregate.std),
+                         (2, 10.0, 11.5, 10.75, 0.75))
+
+    def test_downsample(self):
+        json_dict = make_response_dict()
+        json_dict["data"][0]["components"][0]["samples"] = [
+            [2500, "3"], [0, "1"], [999, "2"], [2000, "5"]]
+        response = QueryResponse(self.account, json_dict)
+        windows = response.downsample(1000)[("device0", "temp")]
+        self.assertEqual([(w.start, w.count, w.min, w.max, w.summation)
+                          for w in windows],
+                         [(0, 2, 1.0, 2.0, 3.0), (2000, 2, 3.0, 5.0, 8.0)])
+        numpy = data_query.np
+        try:
+            data_query.np = None
+            self.assertEqual(response.downsample(1000)[("device0", "temp")],
+                             windows)
+        finally:
+            data_query.np = numpy
+
+    def test_search_aggregates_fallback(self):
+        payloads = []
+
+        class NoAggregatesAccount(Account):
+            def search_data(self, query):
+                payloads.append(query)
+                return QueryResponse(self, make_response_dict())
+
+        account = NoAggregatesAccount(None, "account", "account_id",
+                                      Account.ROLE_ADMIN)
+        aggregates = account.search_aggregates()
+        self.assertEqual(aggregates[("device0", "temp")].count, 2)
+        self.assertEqual([p["aggregations"] for p in payloads],
+                         ["only", "exclude"])
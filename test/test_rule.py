@@ -0,0 +1,123 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import time
+import unittest
+
+import oisp
+from oisp import OICException, Rule
+from test.mock_server import MockServer
+from test.rule_test_server import RuleSink
+
+USERNAME = "rule@testing.com"
+PASSWORD = "RuleTesting1"
+
+
+class RuleTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockServer().start()
+        data = self.server.populate(USERNAME, PASSWORD, num_devices=1,
+                                    num_components=1,
+                                    samples_per_component=0)
+        device_id, token, cids = data["devices"][0]
+        self.cid = cids[0]
+        client = oisp.Client(self.server.api_url)
+        client.auth(USERNAME, PASSWORD)
+        self.account = client.get_accounts()[0]
+        self.device = client.get_device(token, device_id)
+        self.sink = RuleSink().start()
+
+    def tearDown(self):
+        self.sink.stop()
+        self.server.stop()
+
+    def rule(self, name="overheating", threshold=50):
+        return Rule(name, [Rule.condition("c0", ">", threshold)],
+                    [Rule.http_action(self.sink.url)],
+                    device_ids=[self.device.device_id])
+
+    def test_create_update(self):
+        rule = self.account.create_rule(self.rule())
+        self.assertIsNotNone(rule.rule_id)
+        self.assertIs(rule.account, self.account)
+        fetched = self.account.get_rule(rule.rule_id)
+        self.assertEqual(fetched.name, "overheating")
+        self.assertEqual(fetched.device_ids, [self.device.device_id])
+        self.assertEqual(fetched.conditions[0]["values"], ["50"])
+        rule.priority = Rule.PRIORITY_HIGH
+        rule.update()
+        self.assertEqual(self.account.get_rule(rule.rule_id).priority,
+                         Rule.PRIORITY_HIGH)
+        self.assertEqual(len(self.account.get_rules()), 1)
+
+    def test_status_and_delete(self):
+        rule = self.account.create_rule(self.rule())
+        rule.deactivate()
+        self.assertEqual(self.account.get_rule(rule.rule_id).status,
+                         Rule.STATUS_ON_HOLD)
+        rule.activate()
+        rule.delete()
+        self.assertEqual(self.account.get_rules(), [])
+        # Rule ids of active rules are deactivated as well
+        rule = self.account.create_rule(self.rule())
+        self.account.delete_rule(rule.rule_id)
+        self.assertEqual(self.account.get_rules(), [])
+        with self.assertRaises(OICException):
+            self.account.delete_rule(rule.rule_id)
+
+    def test_bulk(self):
+        rules = self.account.create_rules(
+            [self.rule("rule{}".format(i)) for i in range(20)])
+        self.assertEqual(len({rule.rule_id for rule in rules}), 20)
+        self.account.set_rules_status(rules[:10], Rule.STATUS_ON_HOLD)
+        self.assertEqual(sorted(rule.status for rule in
+                                self.account.get_rules()),
+                         [Rule.STATUS_ACTIVE] * 10 +
+                         [Rule.STATUS_ON_HOLD] * 10)
+        self.account.delete_rules([rule.rule_id for rule in rules])
+        self.assertEqual(self.account.get_rules(), [])
+
+    def test_action(self):
+        rule = self.account.create_rule(self.rule())
+        self.device.add_sample(self.cid, 10)
+        self.device.submit_data()
+        self.device.add_sample(self.cid, 60)
+        self.device.submit_data()
+        self.assertTrue(self.sink.wait(1, timeout=5))
+        time.sleep(0.1)
+        self.assertEqual(len(self.sink.received), 1)
+        alert = self.sink.received[0][1]
+        self.assertEqual(alert["ruleId"], rule.rule_id)
+        self.assertEqual(alert["deviceId"], self.device.device_id)
+        self.assertEqual([a.rule_id for a in self.account.get_alerts()],
+                         [rule.rule_id])
+        rule.deactivate()
+        self.device.add_sample(self.cid, 70)
+        self.device.submit_data()
+        time.sleep(0.1)
+        self.assertEqual(len(self.sink.received), 1)
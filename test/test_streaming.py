@@ -0,0 +1,124 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import json
+import unittest
+from unittest import mock
+
+import oisp
+from oisp import Account, DataQuery, streaming
+from test.mock_server import MockServer
+from test.test_query_response import make_response_dict
+
+USERNAME = "streaming@testing.com"
+PASSWORD = "StreamingTesting1"
+
+
+class FakeResponse:
+    """Response streaming a JSON body in small chunks."""
+
+    def __init__(self, json_dict):
+        self.body = json.dumps(json_dict).encode("utf-8")
+        self.headers = {"Content-Type": "application/json; charset=utf-8"}
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.body), 7):
+            yield self.body[start:start + 7]
+
+    def json(self):
+        return json.loads(self.body)
+
+    def close(self):
+        self.closed = True
+
+
+def rows(components):
+    return [row for component in components for row in component.rows()]
+
+
+class StreamingParserTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.account = Account(None, "account", "account_id",
+                               Account.ROLE_ADMIN)
+
+    def test_parse(self):
+        response = FakeResponse(make_response_dict())
+        components = list(streaming.iter_search_response(self.account,
+                                                         response))
+        self.assertTrue(response.closed)
+        self.assertEqual([(c.device_id, c.component_id, len(c))
+                          for c in components],
+                         [("device0", "temp", 2), ("device1", "state", 1)])
+        self.assertEqual(rows(components),
+                         [("device0", "temp", 1577836800000, 10.0),
+                          ("device0", "temp", 1577836801000, 11.5),
+                          ("device1", "state", 1577836802000, "1")])
+        self.assertEqual(components[0].samples[1].timestamp, 1577836801000)
+
+    def test_chunks(self):
+        for ijson in [streaming.ijson, None]:
+            with mock.patch.object(streaming, "ijson", ijson):
+                components = list(streaming.iter_search_response(
+                    self.account, FakeResponse(make_response_dict()),
+                    chunk_size=1))
+                self.assertEqual([len(c) for c in components], [1, 1, 1])
+                self.assertEqual(len(rows(components)), 3)
+
+    def test_key_order(self):
+        json_dict = make_response_dict()
+        # Samples before header and device id after components
+        json_dict["data"] = [
+            {"components": [{"samples": [[5, 1577836800000]],
+                             "samplesHeader": ["Value", "Timestamp"],
+                             "dataType": "number", "componentId": "c"}],
+             "deviceId": "d"}]
+        components = list(streaming.iter_search_response(
+            self.account, FakeResponse(json_dict), chunk_size=1))
+        self.assertEqual(rows(components), [("d", "c", 1577836800000, 5.0)])
+
+
+class StreamingSearchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockServer().start()
+        self.server.populate(USERNAME, PASSWORD, num_devices=2,
+                             num_components=2, samples_per_component=500)
+        client = oisp.Client(self.server.api_url)
+        client.auth(USERNAME, PASSWORD)
+        self.account = client.get_accounts()[0]
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_search_data_stream(self):
+        expected = list(self.account.search_data(DataQuery()).rows())
+        components = list(self.account.search_data_stream(DataQuery(),
+                                                          chunk_size=200))
+        self.assertEqual(len(components), 4 * 3)
+        self.assertEqual(rows(components), expected)
@@ -0,0 +1,235 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import asyncio
+import queue
+import time
+import unittest
+
+import oisp
+from oisp import subscription
+from oisp.subscription import Notification, SubscriptionClient
+from test.mock_server import MockServer
+from test.websocket_server import WebSocketServer
+
+USERNAME = "subscription@testing.com"
+PASSWORD = "SubscriptionTesting1"
+
+
+def wait_until(predicate, timeout=5):
+    end = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > end:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@unittest.skipIf(subscription.websocket is None,
+                 "websocket-client is not installed")
+class SubscriptionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockServer().start()
+        state = self.server.state
+        data = self.server.populate(USERNAME, PASSWORD, num_devices=1,
+                                    num_components=1,
+                                    samples_per_component=0)
+        device_id, token, _ = data["devices"][0]
+
+        def authenticate(kind, key, token):
+            if kind == "device":
+                return state.device_tokens.get(token, (None, None))[1] == key
+            info = state.tokens.get(token)
+            return info is not None and key in info["accounts"]
+
+        self.ws_server = WebSocketServer(authenticate).start()
+        client = oisp.Client(self.server.api_url)
+        client.auth(USERNAME, PASSWORD)
+        self.account = client.get_accounts()[0]
+        self.device = client.get_device(token, device_id)
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.close()
+        self.ws_server.stop()
+        self.server.stop()
+
+    def client(self, **kwargs):
+        client = SubscriptionClient(self.ws_server.url, min_backoff=0.05,
+                                    max_backoff=0.2, **kwargs)
+        self.clients.append(client)
+        return client
+
+    def subscribed(self, count=1):
+        return wait_until(lambda: sum(
+            self.ws_server.subscriptions.values()) == count)
+
+    def test_callbacks(self):
+        actuations, alerts = queue.Queue(), queue.Queue()
+        client = self.client(on_actuation=actuations.put,
+                             on_alert=alerts.put)
+        client.subscribe_device(self.device)
+        client.subscribe_alerts(self.account)
+        client.start(timeout=5)
+        self.assertTrue(self.subscribed(2))
+        self.ws_server.push_actuation(self.device.device_id, {
+            "deviceId": self.device.device_id, "command": "switch"})
+        self.ws_server.push_alert(self.account.account_id, {
+            "accountId": self.account.account_id, "alertId": 1})
+        actuation = actuations.get(timeout=5)
+        self.assertEqual(actuation.kind, Notification.ACTUATION)
+        self.assertEqual(actuation.device_id, self.device.device_id)
+        self.assertEqual(actuation.content["command"], "switch")
+        alert = alerts.get(timeout=5)
+        self.assertEqual(alert.kind, Notification.ALERT)
+        self.assertEqual(alert.account_id, self.account.account_id)
+        self.assertEqual(client.received, 2)
+
+    def test_iteration(self):
+        client = self.client()
+        client.subscribe_device(self.device)
+        client.start(timeout=5)
+        self.assertTrue(self.subscribed())
+        for i in range(3):
+            self.ws_server.push_actuation(self.device.device_id,
+                                          {"value": i})
+        values = []
+        for notification in client:
+            values.append(notification.content["value"])
+            if len(values) == 3:
+                break
+        self.assertEqual(values, [0, 1, 2])
+        client.close()
+        self.assertEqual(list(client), [])
+
+    def test_async_iteration(self):
+        client = self.client()
+        client.subscribe_alerts(self.account)
+        client.start(timeout=5)
+        self.assertTrue(self.subscribed())
+        self.ws_server.push_alert(self.account.account_id, {"alertId": 7})
+
+        async def receive():
+            async for notification in client:
+                client.close()
+                return notification
+            return None
+
+        notification = asyncio.run(receive())
+        self.assertEqual(notification.content, {"alertId": 7})
+
+    def test_async_cancel(self):
+        client = self.client()
+        client.subscribe_device(self.device)
+        client.start(timeout=5)
+        self.assertTrue(self.subscribed())
+
+        async def receive():
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(client.__anext__(), 0.1)
+            self.ws_server.push_actuation(self.device.device_id,
+                                          {"value": 1})
+            return await asyncio.wait_for(client.__anext__(), 5)
+
+        notification = asyncio.run(receive())
+        self.assertEqual(notification.content, {"value": 1})
+
+    def test_reconnect(self):
+        errors = []
+        client = self.client(on_error=errors.append)
+        client.subscribe_device(self.device)
+        client.start(timeout=5)
+        self.assertTrue(self.subscribed())
+        self.ws_server.drop_connections()
+        self.assertTrue(wait_until(lambda: client.connects == 2))
+        self.assertTrue(self.subscribed())
+        self.assertTrue(errors)
+        self.ws_server.push_actuation(self.device.device_id, {"value": 1})
+        self.assertEqual(next(iter(client)).content, {"value": 1})
+
+    def test_restart(self):
+        client = self.client()
+        client.subscribe_device(self.device)
+        client.start(timeout=5)
+        client.close()
+        client.start(timeout=5)
+        self.assertTrue(self.subscribed())
+        self.ws_server.push_actuation(self.device.device_id, {"value": 1})
+        self.assertEqual(next(iter(client)).content, {"value": 1})
+
+    def test_invalid_messages(self):
+        client = self.client()
+        client.subscribe_device(self.device)
+        client.start(timeout=5)
+        self.assertTrue(self.subscribed())
+        self.ws_server.push_actuation(self.device.device_id, "invalid")
+        self.ws_server.push_actuation(self.device.device_id, {"value": 1})
+        self.assertEqual(next(iter(client)).content, {"value": 1})
+        self.assertEqual(client.connects, 1)
+
+    def test_subscription_not_built(self):
+        errors = []
+        self.account.client.user_token = None
+        client = self.client(on_error=errors.append)
+        client.subscribe_alerts(self.account)
+        client.subscribe_device(self.device)
+        client.start(timeout=5)
+        self.assertTrue(self.subscribed())
+        self.assertIsInstance(errors[0], AttributeError)
+
+    def test_half_open_connection(self):
+        errors = []
+        client = self.client(on_error=errors.append, ping_interval=0.1)
+        client.subscribe_device(self.device)
+        client.start(timeout=5)
+        self.assertTrue(self.subscribed())
+        # Pings are answered while the connection works
+        time.sleep(0.5)
+        self.assertEqual(client.connects, 1)
+        self.ws_server.freeze_connections()
+        self.assertTrue(wait_until(lambda: client.connects == 2))
+        self.assertIsInstance(errors[0], ConnectionError)
+        self.assertTrue(self.subscribed())
+        self.ws_server.push_actuation(self.device.device_id, {"value": 1})
+        self.assertEqual(next(iter(client)).content, {"value": 1})
+
+    def test_subscribe_while_connected(self):
+        client = self.client()
+        client.start(timeout=5)
+        client.subscribe_device(self.device)
+        self.assertTrue(self.subscribed())
+
+    def test_unauthorized(self):
+        self.device.device_token = "invalid"
+        client = self.client()
+        client.subscribe_device(self.device)
+        client.start(timeout=5)
+        time.sleep(0.1)
+        self.assertEqual(self.ws_server.subscriptions, {})
+        self.assertTrue(client.connected)
@@ -0,0 +1,99 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from concurrent.futures import ThreadPoolExecutor
+import copy
+import threading
+import unittest
+
+import oisp
+from oisp import DataQuery, OICException
+from test.mock_server import MockServer
+
+USERNAME = "threads@testing.com"
+PASSWORD = "ThreadsTesting1"
+THREADS = 8
+SAMPLES_PER_THREAD = 200
+
+
+class ThreadSafetyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockServer().start()
+        data = self.server.populate(USERNAME, PASSWORD, num_devices=1,
+                                    num_components=1,
+                                    samples_per_component=0)
+        device_id, token, cids = data["devices"][0]
+        self.cid = cids[0]
+        self.client = oisp.Client(self.server.api_url)
+        self.client.auth(USERNAME, PASSWORD)
+        self.account = self.client.get_accounts()[0]
+        self.device = self.client.get_device(token, device_id)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_concurrent_producers(self):
+        def produce(thread):
+            for i in range(SAMPLES_PER_THREAD):
+                self.device.add_sample(
+                    self.cid, i, on=thread * SAMPLES_PER_THREAD + i + 1)
+                if i % 50 == 49:
+                    self.device.submit_data()
+
+        with ThreadPoolExecutor(THREADS) as executor:
+            list(executor.map(produce, range(THREADS)))
+        self.device.submit_data()
+        response = self.account.search_data(DataQuery())
+        self.assertEqual(len(response.samples), THREADS * SAMPLES_PER_THREAD)
+
+    def test_failed_submit(self):
+        self.device.add_sample(self.cid, 1, on=1)
+        self.server.fail_next = [500]
+        with self.assertRaises(OICException):
+            self.device.submit_data()
+        self.device.add_sample(self.cid, 2, on=2)
+        self.assertEqual([s["value"] for s in self.device.unsent_data],
+                         [1, 2])
+        self.device.submit_data()
+        self.assertEqual(self.device.unsent_data, [])
+
+    def test_response_per_thread(self):
+        self.client.get_server_info()
+        other = []
+        thread = threading.Thread(target=lambda: other.append(
+            self.client.response))
+        thread.start()
+        thread.join()
+        self.assertEqual(other, [None])
+        self.assertEqual(self.client.response.status_code, 200)
+
+    def test_copy_device(self):
+        device = copy.deepcopy(self.device)
+        device.add_sample(self.cid, 1)
+        self.assertEqual(len(device.unsent_data), 1)
+        self.assertEqual(self.device.unsent_data, [])
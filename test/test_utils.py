@@ -0,0 +1,83 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import datetime
+import time
+import unittest
+
+from oisp import utils
+
+
+# pylint: disable=protected-access
+# The uncached converters are the reference implementation
+class KeyConversionTestCase(unittest.TestCase):
+
+    def test_known_fields(self):
+        for key, converted in utils._TO_UNDERSCORE.items():
+            self.assertEqual(converted, utils._camel_to_underscore(key))
+        for key, converted in utils._TO_CAMEL.items():
+            self.assertEqual(converted, utils._underscore_to_camel(key))
+        self.assertEqual(utils.camel_to_underscore("deviceId"), "device_id")
+        self.assertEqual(utils.underscore_to_camel("from_"), "from")
+
+    def test_unknown_fields(self):
+        hits = utils._cached_camel_to_underscore.cache_info().hits
+        for _ in range(2):
+            self.assertEqual(utils.camel_to_underscore("someNewField2"),
+                             "some_new_field2")
+        self.assertEqual(utils._cached_camel_to_underscore.cache_info().hits,
+                         hits + 1)
+        self.assertEqual(utils.underscore_to_camel("some_new_field"),
+                         "someNewField")
+
+
+class TimestampTestCase(unittest.TestCase):
+
+    def test_timestamp_in_ms(self):
+        utc = datetime.timezone.utc
+        moment = datetime.datetime(2020, 1, 1, 0, 0, 1, 234567, tzinfo=utc)
+        self.assertEqual(utils.timestamp_in_ms(moment), 1577836801234)
+        self.assertEqual(utils.timestamp_in_ms(moment, dtype=float),
+                         1577836801234.567)
+        # Naive datetime objects are UTC
+        naive = moment.replace(tzinfo=None)
+        self.assertEqual(utils.timestamp_in_ms(naive), 1577836801234)
+        self.assertEqual(utils.timestamp_in_ms(1577836801234), 1577836801234)
+        now = utils.timestamp_in_ms()
+        self.assertIsInstance(now, int)
+        self.assertLessEqual(abs(now - time.time() * 1e3), 1000)
+
+    def test_ms_to_datetime(self):
+        utc = datetime.timezone.utc
+        self.assertEqual(utils.ms_to_datetime(1577836801234, utc),
+                         datetime.datetime(2020, 1, 1, 0, 0, 1, 234000,
+                                           tzinfo=utc))
+        self.assertEqual(utils.ms_to_datetime(1577836801234),
+                         datetime.datetime(2020, 1, 1, 0, 0, 1, 234000))
+        for timestamp in [0, 1577836801001, 1577836801999]:
+            self.assertEqual(utils.timestamp_in_ms(
+                utils.ms_to_datetime(timestamp)), timestamp)
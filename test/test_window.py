@@ -0,0 +1,107 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+from unittest import mock
+
+from oisp import Device, SampleFilter, WindowAggregator
+
+START = 1577836800000
+
+
+class WindowAggregatorTestCase(unittest.TestCase):
+
+    def test_windows(self):
+        aggregator = WindowAggregator(1000)
+        closed = [aggregator.add(value, START + i * 250)
+                  for i, value in enumerate([3, 1, 4, 1, 5, 9, 2, 6, 5])]
+        self.assertEqual(closed[:4], [None] * 4)
+        self.assertEqual(closed[4], (START, 4, 9, 1, 4))
+        self.assertEqual(closed[8], (START + 1000, 4, 22, 2, 9))
+        self.assertIsNone(aggregator.flush(START + 2999))
+        self.assertEqual(aggregator.flush(START + 3000),
+                         (START + 2000, 1, 5, 5, 5))
+        self.assertIsNone(aggregator.flush())
+
+    def test_samples(self):
+        aggregator = WindowAggregator(1000, statistics=["mean", "count"],
+                                      targets={"mean": "m", "count": "n"})
+        self.assertEqual(aggregator.samples("c0", (START, 4, 10.0, 1, 4)),
+                         [{"componentId": "m", "value": 2.5, "on": START},
+                          {"componentId": "n", "value": 4, "on": START}])
+        self.assertEqual(WindowAggregator(1000).target("c0", "max"),
+                         "c0-max")
+        with self.assertRaises(ValueError):
+            WindowAggregator(1000, statistics=["median"])
+
+    def test_late(self):
+        aggregator = WindowAggregator(1000)
+        aggregator.add(1, START + 1500)
+        aggregator.add(2, START + 500)
+        self.assertEqual(aggregator.late, 1)
+        self.assertEqual(aggregator.flush(), (START + 1000, 2, 3, 1, 2))
+
+    def test_device(self):
+        device = Device("device", client=object(), device_token="token")
+        device.aggregators["c0"] = WindowAggregator(
+            1000, statistics=["min", "max"])
+        for i in range(2500):
+            device.add_sample("c0", i % 100, on=START + i)
+        device.add_sample("c1", 7, on=START)
+        self.assertEqual(device.unsent_data, [
+            {"componentId": "c0-min", "value": 0, "on": START},
+            {"componentId": "c0-max", "value": 99, "on": START},
+            {"componentId": "c0-min", "value": 0, "on": START + 1000},
+            {"componentId": "c0-max", "value": 99, "on": START + 1000},
+            {"componentId": "c1", "value": 7, "on": START}])
+        device.flush_aggregators()
+        self.assertEqual(device.unsent_data[-1],
+                         {"componentId": "c0-max", "value": 99,
+                          "on": START + 2000})
+
+    def test_filter_and_forward_raw(self):
+        device = Device("device", client=object(), device_token="token")
+        device.filters["c0"] = SampleFilter(change_of_value=True)
+        device.aggregators["c0"] = WindowAggregator(
+            1000, statistics=["count"], forward_raw=True)
+        for i, value in enumerate([1, 1, 2, 2]):
+            device.add_sample("c0", value, on=START + i)
+        self.assertEqual(len(device.unsent_data), 2)
+        device.flush_aggregators()
+        self.assertEqual(device.unsent_data[-1],
+                         {"componentId": "c0-count", "value": 2,
+                          "on": START})
+
+    def test_submit_closes_ended_windows(self):
+        device = Device("device", client=mock.Mock(), device_token="token")
+        device.aggregators["c0"] = WindowAggregator(1000,
+                                                    statistics=["sum"])
+        device.add_sample("c0", 5, on=START)
+        device.submit_data()
+        payload = device.client.post.call_args[1]["data"]
+        self.assertEqual(payload["data"], [
+            {"componentId": "c0-sum", "value": 5, "on": START}])
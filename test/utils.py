@@ -29,6 +29,9 @@ import subprocess
 
 kubectl = ["kubectl", "-n", "oisp"]
 
+# MockServer used instead of kubernetes, set up by basecase
+mock_server = None
+
 
 def _run_in(cmd, deployment=None, pod=None, container=None):
     """Run command in kubernetes pod (or in random pod from deployment)."""
@@ -53,6 +56,9 @@ def clear_db():
 
     This clears all tables, but keeps system users.
     """
+    if mock_server is not None:
+        mock_server.reset()
+        return
     _run_in(cmd="node /app/admin resetKeycloakUsers",
             deployment="frontend", container="frontend")
     _run_in(cmd="node /app/admin resetDB",
@@ -68,5 +74,8 @@ def add_user(username, password, role):
     password: password for new user
     role: user role, see OISP documentation for details.
     """
+    if mock_server is not None:
+        mock_server.add_user(username, password, role)
+        return
     cmd = ["node", "/app/admin", "addUser", username, password]
     _run_in(cmd=cmd, deployment="frontend", container="frontend")
@@ -0,0 +1,267 @@
+# Copyright (c) 2020, Intel Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of Intel Corporation nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Minimal in-process WebSocket server standing in for OISP in tests.
+
+Implements the RFC 6455 handshake and text, ping and close frames,
+enough for SubscriptionClient. Clients subscribe to actuations of a
+device or alerts of an account, the test pushes notifications to them
+and can drop or freeze connections to test reconnects.
+"""
+
+import base64
+import hashlib
+import json
+import socketserver
+import struct
+import threading
+
+_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+TEXT, CLOSE, PING, PONG = 0x1, 0x8, 0x9, 0xA
+
+
+def _read_exact(sock, count):
+    data = b""
+    while len(data) < count:
+        chunk = sock.recv(count - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed")
+        data += chunk
+    return data
+
+
+def _read_frame(sock):
+    """Return (opcode, payload) of the next frame sent by a client."""
+    first, second = _read_exact(sock, 2)
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", _read_exact(sock, 2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", _read_exact(sock, 8))[0]
+    mask = _read_exact(sock, 4) if second & 0x80 else b"\0\0\0\0"
+    payload = _read_exact(sock, length)
+    return first & 0x0F, bytes(byte ^ mask[i % 4]
+                               for i, byte in enumerate(payload))
+
+
+def _frame(opcode, payload):
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    """Handles one client connection."""
+
+    def setup(self):
+        self.ws_server = self.server.ws_server
+        self.lock = threading.Lock()
+        # Set by freeze_connections, nothing is sent anymore
+        self.frozen = False
+
+    def handle(self):
+        sock = self.request
+        try:
+            if not self.handshake():
+                return
+            self.ws_server.add_connection(self)
+            while True:
+                opcode, payload = _read_frame(sock)
+                if opcode == TEXT:
+                    self.subscribe(json.loads(payload.decode("utf-8")))
+                elif opcode == PING and not self.frozen:
+                    self.send(payload, PONG)
+                elif opcode == CLOSE:
+                    self.send(payload[:2], CLOSE)
+                    return
+        except (ConnectionError, OSError, ValueError):
+            return
+        finally:
+            self.ws_server.remove_connection(self)
+
+    def handshake(self):
+        """Answer the HTTP upgrade request, return success."""
+        request = b""
+        while b"\r\n\r\n" not in request:
+            chunk = self.request.recv(4096)
+            if not chunk:
+                return False
+            request += chunk
+        headers = {}
+        for line in request.decode("latin-1").split("\r\n")[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        accept = base64.b64encode(hashlib.sha1(
+            (headers["sec-websocket-key"] + _GUID).encode()).digest())
+        self.request.sendall(b"HTTP/1.1 101 Switching Protocols\r\n"
+                             b"Upgrade: websocket\r\n"
+                             b"Connection: Upgrade\r\n"
+                             b"Sec-WebSocket-Accept: " + accept +
+                             b"\r\n\r\n")
+        return True
+
+    def send(self, payload, opcode=TEXT):
+        with self.lock:
+            if not self.frozen:
+                self.request.sendall(_frame(opcode, payload))
+
+    def send_json(self, message):
+        self.send(json.dumps(message).encode("utf-8"))
+
+    def subscribe(self, message):
+        if message.get("type") == "device":
+            key = ("device", message.get("deviceId"))
+            token = message.get("deviceToken")
+        elif message.get("type") == "user":
+            key = ("user", message.get("accountId"))
+            token = message.get("userToken")
+        else:
+            self.send_json({"code": 400, "content": "Unknown type"})
+            return
+        if not self.ws_server.authenticate(key[0], key[1], token):
+            self.send_json({"code": 401, "content": "Unauthorized"})
+            return
+        self.ws_server.add_subscription(key, self)
+        self.send_json({"code": 200, "content": "Subscribed"})
+
+
+class WebSocketServer:
+    """In-process WebSocket server listening on localhost.
+
+    Attributes:
+    ----------
+    url: URL to connect to.
+    subscriptions: Dictionary of (type, id) to number of subscribed
+    connections, type is "device" or "user".
+    """
+
+    def __init__(self, authenticate=None, port=0):
+        """Create server, port 0 selects a free port.
+
+        authenticate(type, id, token) returns whether a subscription is
+        allowed.
+        """
+        self.authenticate = authenticate or (lambda kind, key, token: True)
+        self.lock = threading.Lock()
+        self._connections = set()
+        self._subscriptions = {}
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", port),
+                                                       _Handler)
+        self._server.daemon_threads = True
+        self._server.ws_server = self
+        self.url = "ws://127.0.0.1:{}/".format(self._server.server_address[1])
+        self._thread = None
+
+    def start(self):
+        """Start serving in a daemon thread, return self."""
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and close all connections."""
+        self._server.shutdown()
+        self._server.server_close()
+        self.drop_connections()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def subscriptions(self):
+        with self.lock:
+            return {key: len(handlers)
+                    for key, handlers in self._subscriptions.items()
+                    if handlers}
+
+    def add_connection(self, handler):
+        with self.lock:
+            self._connections.add(handler)
+
+    def remove_connection(self, handler):
+        with self.lock:
+            self._connections.discard(handler)
+            for handlers in self._subscriptions.values():
+                handlers.discard(handler)
+
+    def add_subscription(self, key, handler):
+        with self.lock:
+            self._subscriptions.setdefault(key, set()).add(handler)
+
+    def _push(self, key, message):
+        with self.lock:
+            handlers = list(self._subscriptions.get(key, ()))
+        for handler in handlers:
+            try:
+                handler.send_json(message)
+            except OSError:
+                pass
+        return len(handlers)
+
+    def push_actuation(self, device_id, content):
+        """Send an actuation to subscribers of device_id.
+
+        Returns the number of connections it was sent to.
+        """
+        return self._push(("device", device_id),
+                          {"code": 1024, "content": content})
+
+    def push_alert(self, account_id, content):
+        """Send an alert to subscribers of account_id."""
+        return self._push(("user", account_id),
+                          {"code": 1025, "content": content})
+
+    def freeze_connections(self):
+        """Stop answering on all connections without closing them.
+
+        Behaves like a half-open connection, e.g. after the server host
+        vanished or a NAT dropped the connection.
+        """
+        with self.lock:
+            for handler in self._connections:
+                handler.frozen = True
+
+    def drop_connections(self):
+        """Close all client connections, e.g. to test reconnects."""
+        with self.lock:
+            handlers = list(self._connections)
+        for handler in handlers:
+            try:
+                handler.request.shutdown(2)
+            except OSError:
+                pass